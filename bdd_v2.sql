@@ -29,6 +29,7 @@ CREATE TABLE `chauffe_eaux` (
   `client_id` int DEFAULT NULL,
   `capacite_litres` int DEFAULT NULL,
   `puissance_kw` decimal(5,2) DEFAULT NULL,
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (`chauffe_eau_id`),
   KEY `client_id` (`client_id`),
   CONSTRAINT `chauffe_eaux_ibfk_1` FOREIGN KEY (`client_id`) REFERENCES `clients` (`client_id`)
@@ -55,9 +56,12 @@ CREATE TABLE `clients` (
   `longitude` decimal(11,8) DEFAULT NULL,
   `tilt` decimal(8,2) DEFAULT NULL,
   `azimuth` decimal(8,2) DEFAULT NULL,
+  `peak_power_kw` decimal(6,2) DEFAULT NULL,
+  `weather_providers` json DEFAULT NULL,
   `router_id` varchar(50) DEFAULT NULL,
     `pwd` varchar(50) DEFAULT NULL, 
-  PRIMARY KEY (`client_id`)
+  PRIMARY KEY (`client_id`),
+  UNIQUE KEY `router_id` (`router_id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=13 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -84,6 +88,7 @@ CREATE TABLE `configuration_prediction` (
   `surface_m2` decimal(8,2) DEFAULT NULL,
   `panel_efficiency` decimal(4,3) DEFAULT NULL,
   `system_efficiency` decimal(4,3) DEFAULT NULL,
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (`config_id`),
   KEY `chauffe_eau_id` (`chauffe_eau_id`),
   CONSTRAINT `configuration_prediction_ibfk_1` FOREIGN KEY (`chauffe_eau_id`) REFERENCES `chauffe_eaux` (`chauffe_eau_id`)
@@ -107,9 +112,14 @@ CREATE TABLE `decision` (
   `chauffe_eau_id` int DEFAULT NULL,
   `statut` text,
   `heure_decision` datetime DEFAULT NULL,
+  `step_min` smallint DEFAULT NULL,
+  `nb_creneaux` smallint DEFAULT NULL,
+  `planning` varbinary(255) DEFAULT NULL,
   `timestamp_creation` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`id_decision`),
   KEY `chauffe_eau_id` (`chauffe_eau_id`),
+  KEY `ce_heure_decision` (`chauffe_eau_id`, `heure_decision`),
+  KEY `heure_decision` (`heure_decision`),
   CONSTRAINT `decision_ibfk_1` FOREIGN KEY (`chauffe_eau_id`) REFERENCES `chauffe_eaux` (`chauffe_eau_id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=21 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -166,6 +176,8 @@ CREATE TABLE `donnees_meteo` (
   `irradiance` int DEFAULT NULL,
   PRIMARY KEY (`meteo_id`),
   KEY `client_id` (`client_id`),
+  KEY `client_heure_debut` (`client_id`, `heure_debut`),
+  KEY `timestamp_acquisition` (`timestamp_acquisition`),
   CONSTRAINT `donnees_meteo_ibfk_1` FOREIGN KEY (`client_id`) REFERENCES `clients` (`client_id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=11 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -189,6 +201,8 @@ CREATE TABLE `previsions_production` (
   `timestamp_creation` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`prevision_id`),
   KEY `client_id` (`client_id`),
+  KEY `client_heure_prevision` (`client_id`, `heure_prevision`),
+  KEY `timestamp_creation` (`timestamp_creation`),
   CONSTRAINT `previsions_production_ibfk_1` FOREIGN KEY (`client_id`) REFERENCES `clients` (`client_id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=3820 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -211,6 +225,8 @@ CREATE TABLE `production_reelle` (
   `timestamp_mesure` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`production_id`),
   KEY `client_id` (`client_id`),
+  KEY `client_heure_production` (`client_id`, `heure_production`),
+  KEY `heure_production` (`heure_production`),
   CONSTRAINT `production_reelle_ibfk_1` FOREIGN KEY (`client_id`) REFERENCES `clients` (`client_id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=5 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -242,6 +258,7 @@ CREATE TABLE `system_configuration` (
   `hot_water_draws` json DEFAULT NULL,
   `off_peak_hours` json DEFAULT NULL,
   `sell_tariffs` json DEFAULT NULL,
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (`config_id`),
   KEY `client_id` (`client_id`),
   CONSTRAINT `system_configuration_ibfk_1` FOREIGN KEY (`client_id`) REFERENCES `clients` (`client_id`)
@@ -267,6 +284,8 @@ CREATE TABLE `temperatures_reelles` (
   `timestamp_mesure` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`mesure_id`),
   KEY `chauffe_eau_id` (`chauffe_eau_id`),
+  KEY `ce_timestamp_mesure` (`chauffe_eau_id`, `timestamp_mesure`),
+  KEY `timestamp_mesure` (`timestamp_mesure`),
   CONSTRAINT `temperatures_reelles_ibfk_1` FOREIGN KEY (`chauffe_eau_id`) REFERENCES `chauffe_eaux` (`chauffe_eau_id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=16 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -276,3 +295,49 @@ CREATE TABLE `temperatures_reelles` (
 --
 
 
+--
+-- Table structure for table `temperatures_agregees`
+-- (agrégats min/moy/max par step_min des mesures anciennes, cf. data/maintenance.py)
+--
+
+DROP TABLE IF EXISTS `temperatures_agregees`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `temperatures_agregees` (
+  `agregat_id` int NOT NULL AUTO_INCREMENT,
+  `chauffe_eau_id` int DEFAULT NULL,
+  `debut_periode` datetime NOT NULL,
+  `step_min` smallint NOT NULL,
+  `temperature_min` decimal(5,2) DEFAULT NULL,
+  `temperature_moy` decimal(5,2) DEFAULT NULL,
+  `temperature_max` decimal(5,2) DEFAULT NULL,
+  `nb_mesures` int DEFAULT NULL,
+  PRIMARY KEY (`agregat_id`),
+  UNIQUE KEY `ce_periode` (`chauffe_eau_id`, `debut_periode`, `step_min`),
+  CONSTRAINT `temperatures_agregees_ibfk_1` FOREIGN KEY (`chauffe_eau_id`) REFERENCES `chauffe_eaux` (`chauffe_eau_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `production_agregee`
+--
+
+DROP TABLE IF EXISTS `production_agregee`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `production_agregee` (
+  `agregat_id` int NOT NULL AUTO_INCREMENT,
+  `client_id` int DEFAULT NULL,
+  `debut_periode` datetime NOT NULL,
+  `step_min` smallint NOT NULL,
+  `puissance_min_kw` decimal(8,2) DEFAULT NULL,
+  `puissance_moy_kw` decimal(8,2) DEFAULT NULL,
+  `puissance_max_kw` decimal(8,2) DEFAULT NULL,
+  `nb_mesures` int DEFAULT NULL,
+  PRIMARY KEY (`agregat_id`),
+  UNIQUE KEY `client_periode` (`client_id`, `debut_periode`, `step_min`),
+  CONSTRAINT `production_agregee_ibfk_1` FOREIGN KEY (`client_id`) REFERENCES `clients` (`client_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+
@@ -53,3 +53,54 @@ def config_weather_loader(config_dir: Union[str, Path]) -> int:
 
     # No frequency found
     raise ValueError(f"No 'frequency' entry found in {cfg_path}")
+
+
+FETCH_DEFAULTS = {
+    "max_workers": 16,
+    "request_timeout": 10,
+    "fetch_deadline": 600,
+    "grid_cell_m": 500,
+    "batch_size": 50,
+    "default_providers": "open_meteo",
+    "breaker_failures": 5,
+    "breaker_reset_s": 300,
+    "slow_call_s": 30,
+    "refresh_tick_s": 60,
+    "rate_limits": "open_meteo:500",
+    "forecast_cache_ttl": 10800,
+    "forecast_cache_max_mb": 200,
+}
+
+
+def load_weather_fetch_config(config_dir: Union[str, Path]) -> dict:
+    """
+    Read the settings of the parallel fetch stage from ``weather_frequency.txt``.
+
+    Recognised keys are those of ``FETCH_DEFAULTS`` (integers, except the
+    comma-separated ``default_providers`` and ``rate_limits``); missing
+    keys keep their default value, other lines are ignored.
+
+    Raises
+    ------
+    ValueError
+        If a recognised key has a non-integer value.
+    """
+    config = dict(FETCH_DEFAULTS)
+    cfg_path = Path(config_dir) / "weather_frequency.txt"
+    if not cfg_path.is_file():
+        return config
+
+    for raw_line in cfg_path.read_text(encoding="utf-8").splitlines():
+        line = raw_line.strip()
+        if not line or line.startswith("#") or "=" not in line:
+            continue
+        key, value = (tok.strip() for tok in line.split("=", 1))
+        key = key.lower()
+        if key in FETCH_DEFAULTS and isinstance(FETCH_DEFAULTS[key], str):
+            config[key] = value
+        elif key in FETCH_DEFAULTS:
+            try:
+                config[key] = int(value)
+            except ValueError:
+                raise ValueError(f"Malformed '{key}' line in {cfg_path}: {raw_line!r}")
+    return config
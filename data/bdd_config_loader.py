@@ -10,11 +10,17 @@ import os
 from typing import Dict
 
 REQUIRED_KEYS = {"host", "user","password","database"}
+SQLITE_REQUIRED_KEYS = {"path"}
+BACKENDS = {"mysql", "sqlite"}
 
 def load_bdd_config(filename: str = "bdd_config.txt") -> Dict[str, str]:
     """
     Reads and parses the BDD figuration file.
 
+    The optional ``backend`` key selects the database: ``mysql`` (default,
+    needs host/user/password/database) or ``sqlite`` (needs ``path``, relative
+    to the project root).
+
     Raises:
         FileNotFoundError: If the file doesn't exist.
         ValueError: If a required key is missing or malformed.
@@ -41,8 +47,14 @@ def load_bdd_config(filename: str = "bdd_config.txt") -> Dict[str, str]:
     except Exception as e:
         raise ValueError(f"Error while reading BDD config: {e}")
 
+    backend = config.setdefault("backend", "mysql").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown BDD backend '{backend}' (expected one of: {', '.join(sorted(BACKENDS))})")
+    config["backend"] = backend
+
     # vérifie que toute les clés sont présentes
-    missing_keys = REQUIRED_KEYS - config.keys()
+    required = SQLITE_REQUIRED_KEYS if backend == "sqlite" else REQUIRED_KEYS
+    missing_keys = required - config.keys()
     if missing_keys:
         raise ValueError(f"Missing required config keys: {', '.join(missing_keys)}")
 
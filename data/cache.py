@@ -0,0 +1,148 @@
+"""
+cache.py
+
+Cache mémoire borné (LRU) avec durée de vie (TTL), invalidation explicite
+et statistiques de hits. Prévu pour les données qui changent rarement
+(configurations clients, chauffe-eaux...).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+_NEGATIVE = object()   # résultat None d'un chargement, gardé negative_ttl secondes
+
+
+class TTLCache:
+    """
+    Cache clé -> valeur thread-safe.
+
+    - maxsize : nombre maximum d'entrées (les moins récemment utilisées sont évincées)
+    - ttl     : durée de vie d'une entrée en secondes (None = pas d'expiration)
+    - negative_ttl : si fourni, un chargement qui retourne None est aussi mis
+      en cache, pour cette durée : une clé sans donnée ne relance pas une
+      requête BDD à chaque lecture
+
+    Chaque entrée peut porter un jeton de version : si `get_or_load` reçoit une
+    fonction `version`, le jeton courant est comparé à celui stocké et l'entrée
+    est rechargée s'ils diffèrent.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300.0, negative_ttl=None):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be > 0")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data = OrderedDict()   # key -> (value, expires_at, version)
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stale = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key, default=None, count=True):
+        """Retourne la valeur en cache (ou `default` si absente / expirée)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return default
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                if count:
+                    self.expired += 1
+                    self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            if count:
+                self.hits += 1
+            return None if value is _NEGATIVE else value
+
+    def set(self, key, value, version=None, ttl=_MISSING):
+        with self._lock:
+            ttl = self.ttl if ttl is _MISSING else ttl
+            expires_at = time.monotonic() + ttl if ttl is not None else None
+            self._data[key] = (value, expires_at, version)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader, version=None):
+        """
+        Lecture « read-through » : retourne la valeur en cache ou appelle
+        loader(key), stocke le résultat et le retourne (None seulement si
+        negative_ttl est fourni).
+
+        version : callable(key) -> jeton ; si fourni, une entrée dont le jeton
+        ne correspond plus est considérée périmée.
+        """
+        current_version = version(key) if version is not None else None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at, stored_version = entry
+                if expires_at is not None and expires_at <= time.monotonic():
+                    del self._data[key]
+                    self.expired += 1
+                elif version is not None and stored_version != current_version:
+                    del self._data[key]
+                    self.stale += 1
+                else:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return None if value is _NEGATIVE else value
+            self.misses += 1
+
+        # Chargement hors verrou : une requête BDD ne doit pas bloquer les autres lectures
+        value = loader(key)
+        if value is not None:
+            self.set(key, value, version=current_version)
+        elif self.negative_ttl is not None:
+            self.set(key, _NEGATIVE, version=current_version, ttl=self.negative_ttl)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_where(self, predicate):
+        """Invalide toutes les entrées pour lesquelles predicate(key, value) est vrai (value None : absence mise en cache)."""
+        with self._lock:
+            keys = [k for k, (v, _, _) in self._data.items() if predicate(k, None if v is _NEGATIVE else v)]
+            for k in keys:
+                del self._data[k]
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -1,15 +1,23 @@
 """
 Ce module contient toutes les fonctions utiles pour communiquer avec la base de données MySQL.
+Le backend est choisi par la clé `backend` de config/bdd_config.txt : mysql (défaut)
+ou sqlite (fichier local, cf. data/sqlite_backend.py) ; les fonctions sont identiques.
 
 Liste des fonctions disponibles :
 
 # Connexion
 get_connection
 
+# Invalidation des caches
+register_change_hook
+
 # Clients
 add_client
 get_client
 get_client_ids
+get_clients_locations
+get_ids_by_router
+register_router
 count_clients
 
 # Chauffe-eaux
@@ -19,8 +27,10 @@ get_CE_by_client
 
 # Températures réelles
 add_temperature
+add_temperatures
 get_latest_temperature_by_client
 get_temperatures_by_chauffe_eau
+iter_temperatures_by_chauffe_eau
 
 # Données météo
 add_meteo
@@ -28,8 +38,13 @@ get_meteo
 
 # Production
 add_production
+add_productions
 get_production_by_client
+iter_production_by_client
 add_prevision_production
+add_previsions_production
+get_forecast_status
+get_latest_previsions
 get_previsions_by_client
 
 # Configuration système
@@ -37,59 +52,213 @@ add_system_configuration
 get_system_configuration_by_client
 add_configuration_prediction
 get_configuration_prediction_by_chauffe_eau
+get_configuration_version
 
 # Décisions
 add_prediction_temperature
 get_prediction_temperature_by_chauffe_eau
 add_decision
 get_decision_by_CE
+get_latest_decision
+get_latest_decisions
+get_max_decision_id
+get_decisions_since
+purge_old_decisions
 """
 
-import pymysql
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import json
+import sqlite3
 from .bdd_config_loader import load_bdd_config
+from .decision_codec import Schedule
 
 
 DB_CONFIG = load_bdd_config()
+BACKEND = DB_CONFIG.pop("backend")
+SQLITE_PATH = DB_CONFIG.pop("path", None)
+
+if BACKEND == "mysql":
+    import pymysql
+    import pymysql.cursors
+    _DB_ERRORS = (pymysql.MySQLError,)
+    _INTEGRITY_ERRORS = (pymysql.IntegrityError,)
+else:
+    from . import sqlite_backend
+    _DB_ERRORS = (sqlite3.Error,)
+    _INTEGRITY_ERRORS = (sqlite3.IntegrityError,)
 
 # ==========================
 # ======= CONNEXION ========
 # ==========================
 def get_connection():
-    """Crée et retourne une connexion MySQL."""
+    """Crée et retourne une connexion à la base (MySQL ou SQLite selon BACKEND)."""
     try:
+        if BACKEND == "sqlite":
+            return sqlite_backend.connect(SQLITE_PATH)
         conn = pymysql.connect(**DB_CONFIG)
         return conn
-    except pymysql.MySQLError as e:
-        print(" Erreur MySQL :", e)
+    except _DB_ERRORS as e:
+        print(f" Erreur {BACKEND} :", e)
         return None
     except Exception as e:
         print(" Erreur inattendue :", type(e).__name__, "-", e)
         return None
 
 
+# ==========================
+# ===== INVALIDATION =======
+# ==========================
+_CHANGE_HOOKS = []
+
+
+def register_change_hook(hook):
+    """
+    Enregistre une fonction appelée après chaque écriture par les add_* :
+    hook(table, client_id=..., chauffe_eau_id=...). Utilisé par les caches
+    en mémoire pour invalider leurs entrées.
+    """
+    if hook not in _CHANGE_HOOKS:
+        _CHANGE_HOOKS.append(hook)
+
+
+def _notify_change(table, **keys):
+    for hook in list(_CHANGE_HOOKS):
+        try:
+            hook(table, **keys)
+        except Exception as e:
+            print(f" Erreur hook d'invalidation ({table}) :", e)
+
+
+# ==========================
+# ===== LECTURE EN FLUX ====
+# ==========================
+def _projection(columns, allowed):
+    """Valide une liste de colonnes (liste blanche : elles sont insérées dans le SQL)."""
+    columns = tuple(columns)
+    unknown = [c for c in columns if c not in allowed]
+    if not columns or unknown:
+        raise ValueError(f"Colonnes invalides {unknown or columns} (autorisées : {', '.join(allowed)})")
+    return columns
+
+
+def _stream_chunks(sql, params, chunk_size):
+    """
+    Exécute `sql` avec un curseur côté serveur (SSCursor) et produit les lignes
+    par paquets de `chunk_size` : la mémoire utilisée ne dépend pas du nombre
+    de lignes. La connexion est fermée quand le générateur est épuisé ou fermé.
+    """
+    conn = get_connection()
+    if conn is None:
+        return
+    cur = conn.cursor(pymysql.cursors.SSCursor) if BACKEND == "mysql" else conn.cursor()
+    try:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Colonnes lues en datetime64 par _rows_to_arrays (les autres en float64)
+_DATETIME_COLUMNS = frozenset(("timestamp_mesure", "heure_production"))
+
+
+def _rows_to_arrays(rows, columns):
+    """
+    Paquet de lignes -> {colonne: np.ndarray}. Le dtype dépend du nom de la
+    colonne et non des valeurs : datetime64[s] (NaT pour NULL) pour les dates,
+    float64 (NaN pour NULL) sinon, identique d'un paquet à l'autre.
+    """
+    import numpy as np
+    arrays = {}
+    for i, name in enumerate(columns):
+        values = [row[i] for row in rows]
+        if name in _DATETIME_COLUMNS:
+            arrays[name] = np.array(values, dtype="datetime64[s]")
+        else:
+            arrays[name] = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+    return arrays
+
+
+def _iter_history(table, key_column, key, time_column, allowed, columns, start, end, chunk_size, as_arrays):
+    columns = _projection(columns, allowed)
+    sql = f"SELECT {', '.join(columns)} FROM {table} WHERE {key_column} = %s"
+    params = [key]
+    if start:
+        sql += f" AND {time_column} >= %s"
+        params.append(start)
+    if end:
+        sql += f" AND {time_column} <= %s"
+        params.append(end)
+    sql += f" ORDER BY {time_column} ASC"
+    for rows in _stream_chunks(sql, params, chunk_size):
+        if as_arrays:
+            yield _rows_to_arrays(rows, columns)
+        else:
+            yield from rows
+
+
 # ==========================
 # ======= CLIENTS ==========
 # ==========================
 
-def add_client(nom=None, email=None, latitude=None, longitude=None, tilt=None, azimuth=None, router_id=None,pwd=None):
+def add_client(nom=None, email=None, latitude=None, longitude=None, tilt=None, azimuth=None, router_id=None,pwd=None,
+               peak_power_kw=None):
     conn = get_connection()
     if conn is None:
         return None
     cur = conn.cursor()
     sql = """
-        INSERT INTO clients (nom, email, latitude, longitude, tilt, azimuth, router_id,pwd)
-        VALUES (%s, %s, %s, %s, %s, %s, %s,%s)
+        INSERT INTO clients (nom, email, latitude, longitude, tilt, azimuth, router_id,pwd, peak_power_kw)
+        VALUES (%s, %s, %s, %s, %s, %s, %s,%s, %s)
     """
-    cur.execute(sql, (nom, email, latitude, longitude, tilt, azimuth, router_id,pwd))
+    cur.execute(sql, (nom, email, latitude, longitude, tilt, azimuth, router_id,pwd, peak_power_kw))
     conn.commit()
     client_id = cur.lastrowid
     conn.close()
+    _notify_change("clients", client_id=client_id, router_id=router_id)
     return client_id
 
 
+def register_router(router_id, pwd=None):
+    """
+    Enregistrement idempotent d'un routeur : retourne (client_id, created).
+    Un router_id déjà connu renvoie son client sans rien écrire ; l'index unique
+    sur clients.router_id garantit un seul client si deux enregistrements se croisent.
+    """
+    if not router_id:
+        raise ValueError("router_id manquant")
+    conn = get_connection()
+    if conn is None:
+        return None, False
+    cur = conn.cursor()
+    select = "SELECT client_id FROM clients WHERE router_id = %s"
+    try:
+        cur.execute(select, (router_id,))
+        row = cur.fetchone()
+        if row:
+            return row[0], False
+        try:
+            cur.execute("INSERT INTO clients (router_id, pwd) VALUES (%s, %s)", (router_id, pwd))
+            conn.commit()
+        except _INTEGRITY_ERRORS:
+            # Créé entre-temps par un autre récepteur
+            conn.rollback()
+            cur.execute(select, (router_id,))
+            row = cur.fetchone()
+            return (row[0] if row else None), False
+        client_id = cur.lastrowid
+    finally:
+        conn.close()
+    _notify_change("clients", client_id=client_id, router_id=router_id)
+    return client_id, True
+
+
 def get_client(client_id):
     conn = get_connection()
     if conn is None:
@@ -117,6 +286,62 @@ def get_client_ids():
     return ids
 
 
+def get_clients_locations(client_ids=None):
+    """
+    Position, orientation, puissance crête et fournisseurs météo des clients en une requête :
+    liste de dicts {client_id, latitude, longitude, tilt, azimuth, peak_power_kw, weather_providers}.
+    """
+    conn = get_connection()
+    if conn is None:
+        return []
+    cur = conn.cursor()
+    sql = "SELECT client_id, latitude, longitude, tilt, azimuth, peak_power_kw, weather_providers FROM clients"
+    params = None
+    if client_ids is not None:
+        client_ids = list(client_ids)
+        if not client_ids:
+            conn.close()
+            return []
+        sql += " WHERE client_id IN (" + ", ".join(["%s"] * len(client_ids)) + ")"
+        params = client_ids
+    cur.execute(sql, params)
+    columns = [desc[0] for desc in cur.description]
+    rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+    conn.close()
+    return rows
+
+
+def get_ids_by_router(router_ids=None):
+    """
+    Résout des router_id en une requête : {router_id: (client_id, chauffe_eau_id)}
+    (chauffe_eau_id None si le client n'a pas de chauffe-eau ; premier chauffe-eau sinon).
+    router_ids None : tous les routeurs (chargement en bloc du cache data/router_map.py).
+    """
+    if router_ids is None:
+        where, params = "c.router_id IS NOT NULL AND c.router_id <> ''", []
+    else:
+        params = list(router_ids)
+        if not params:
+            return {}
+        where = "c.router_id IN (" + ", ".join(["%s"] * len(params)) + ")"
+    conn = get_connection()
+    if conn is None:
+        return {}
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT c.router_id, c.client_id, MIN(ce.chauffe_eau_id)
+        FROM clients c
+        LEFT JOIN chauffe_eaux ce ON ce.client_id = c.client_id
+        WHERE """ + where + """
+        GROUP BY c.router_id, c.client_id
+    """, params)
+    ids = {}
+    for router_id, client_id, ce_id in cur.fetchall():
+        ids.setdefault(router_id, (client_id, ce_id))
+    conn.close()
+    return ids
+
+
 def count_clients():
     conn = get_connection()
     if conn is None:
@@ -143,6 +368,7 @@ def add_chauffe_eau(client_id, capacite_litres, puissance_kw):
     conn.commit()
     ce_id = cur.lastrowid
     conn.close()
+    _notify_change("chauffe_eaux", client_id=client_id, chauffe_eau_id=ce_id)
     return ce_id
 
 
@@ -198,6 +424,27 @@ def add_temperature(chauffe_eau_id, temperature, timestamp=None):
     return mesure_id
 
 
+def add_temperatures(rows):
+    """
+    Insère plusieurs mesures en une transaction.
+    rows : itérable de (chauffe_eau_id, temperature, timestamp_mesure). Retourne le nombre de lignes.
+    """
+    rows = [tuple(row) for row in rows]
+    if not rows:
+        return 0
+    conn = get_connection()
+    if conn is None:
+        return 0
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT INTO temperatures_reelles (chauffe_eau_id, temperature, timestamp_mesure)
+        VALUES (%s, %s, %s)
+    """, rows)
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+
 def get_latest_temperature_by_client(client_id):
     conn = get_connection()
     cur = conn.cursor()
@@ -233,6 +480,23 @@ def get_temperatures_by_chauffe_eau(chauffe_eau_id, start=None, end=None):
     return rows
 
 
+_TEMPERATURE_COLUMNS = ("mesure_id", "chauffe_eau_id", "temperature", "timestamp_mesure")
+
+
+def iter_temperatures_by_chauffe_eau(chauffe_eau_id, start=None, end=None,
+                                     columns=("timestamp_mesure", "temperature"),
+                                     chunk_size=10_000, as_arrays=False):
+    """
+    Variante en flux de get_temperatures_by_chauffe_eau (curseur serveur).
+
+    - columns   : colonnes à lire (projection, parmi _TEMPERATURE_COLUMNS)
+    - as_arrays : False -> itère sur les tuples ligne par ligne
+                  True  -> produit un dict {colonne: np.ndarray} par paquet de chunk_size lignes
+    """
+    return _iter_history("temperatures_reelles", "chauffe_eau_id", chauffe_eau_id, "timestamp_mesure",
+                         _TEMPERATURE_COLUMNS, columns, start, end, chunk_size, as_arrays)
+
+
 # ==========================
 # ===== DONNÉES MÉTÉO =====
 # ==========================
@@ -282,9 +546,37 @@ def add_production(client_id, puissance_kw, heure_production=None):
     conn.commit()
     prod_id = cur.lastrowid
     conn.close()
+    _notify_change("production_reelle", client_id=client_id, puissance_kw=puissance_kw, heure_production=ts)
     return prod_id
 
 
+def add_productions(rows):
+    """
+    Insère plusieurs mesures de production en une transaction.
+    rows : itérable de (client_id, puissance_kw, heure_production). Retourne le nombre de lignes.
+    """
+    rows = [tuple(row) for row in rows]
+    if not rows:
+        return 0
+    conn = get_connection()
+    if conn is None:
+        return 0
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT INTO production_reelle (client_id, puissance_produite_kw, heure_production)
+        VALUES (%s, %s, %s)
+    """, rows)
+    conn.commit()
+    conn.close()
+    # Une notification par client et par lot (et non par ligne) : [(heure_production, puissance_kw), ...]
+    by_client = {}
+    for client_id, puissance_kw, heure_production in rows:
+        by_client.setdefault(client_id, []).append((heure_production, puissance_kw))
+    for client_id, productions in by_client.items():
+        _notify_change("production_reelle", client_id=client_id, productions=productions)
+    return len(rows)
+
+
 def get_production_by_client(client_id, start=None, end=None):
     conn = get_connection()
     cur = conn.cursor()
@@ -303,6 +595,20 @@ def get_production_by_client(client_id, start=None, end=None):
     return rows
 
 
+_PRODUCTION_COLUMNS = ("production_id", "client_id", "puissance_produite_kw", "heure_production", "timestamp_mesure")
+
+
+def iter_production_by_client(client_id, start=None, end=None,
+                              columns=("heure_production", "puissance_produite_kw"),
+                              chunk_size=10_000, as_arrays=False):
+    """
+    Variante en flux de get_production_by_client (curseur serveur).
+    Mêmes options que iter_temperatures_by_chauffe_eau (colonnes parmi _PRODUCTION_COLUMNS).
+    """
+    return _iter_history("production_reelle", "client_id", client_id, "heure_production",
+                         _PRODUCTION_COLUMNS, columns, start, end, chunk_size, as_arrays)
+
+
 def add_prevision_production(client_id, puissance_kw, heure_prevision=None):
     conn = get_connection()
     cur = conn.cursor()
@@ -318,6 +624,81 @@ def add_prevision_production(client_id, puissance_kw, heure_prevision=None):
     return prev_id
 
 
+def add_previsions_production(client_id, previsions):
+    """
+    Insère plusieurs prévisions en une transaction.
+    previsions : itérable de (heure_prevision, puissance_kw). Retourne le nombre de lignes.
+    """
+    rows = [(client_id, puissance_kw, heure_prevision) for heure_prevision, puissance_kw in previsions]
+    if not rows:
+        return 0
+    conn = get_connection()
+    if conn is None:
+        return 0
+    cur = conn.cursor()
+    sql = """
+        INSERT INTO previsions_production (client_id, puissance_prevue_kw, heure_prevision)
+        VALUES (%s, %s, %s)
+    """
+    cur.executemany(sql, rows)
+    conn.commit()
+    conn.close()
+    _notify_change("previsions_production", client_id=client_id,
+                   previsions=[(heure_prevision, puissance_kw) for _, puissance_kw, heure_prevision in rows])
+    return len(rows)
+
+
+def get_forecast_status():
+    """
+    Fraîcheur des prévisions de production, en une requête :
+    {client_id: (dernière création, dernière heure prévue)}.
+    """
+    conn = get_connection()
+    if conn is None:
+        return {}
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT client_id, MAX(timestamp_creation), MAX(heure_prevision)
+        FROM previsions_production
+        GROUP BY client_id
+    """)
+    status = {
+        client_id: tuple(datetime.fromisoformat(v) if isinstance(v, str) else v for v in (created, until))
+        for client_id, created, until in cur.fetchall()
+    }
+    conn.close()
+    return status
+
+
+def get_latest_previsions(client_id, start=None):
+    """
+    Dernière prévision connue pour chaque heure_prevision >= start (toutes si None) :
+    liste de (heure_prevision, puissance_prevue_kw) triée par heure.
+    Les rafraîchissements successifs s'ajoutent à la table ; seule la ligne la plus
+    récente (prevision_id max) de chaque heure est retenue.
+    """
+    conn = get_connection()
+    if conn is None:
+        return []
+    cur = conn.cursor()
+    where, params = "client_id = %s", [client_id]
+    if start is not None:
+        where += " AND heure_prevision >= %s"
+        params.append(start)
+    cur.execute(f"""
+        SELECT p.heure_prevision, p.puissance_prevue_kw
+        FROM previsions_production p
+        JOIN (SELECT MAX(prevision_id) AS prevision_id
+              FROM previsions_production
+              WHERE {where}
+              GROUP BY heure_prevision) latest ON latest.prevision_id = p.prevision_id
+        ORDER BY p.heure_prevision
+    """, params)
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+
 def get_previsions_by_client(client_id):
     conn = get_connection()
     cur = conn.cursor()
@@ -350,6 +731,7 @@ def add_system_configuration(client_id, cold_water_temp, min_comfort_enabled, mi
     conn.commit()
     cfg_id = cur.lastrowid
     conn.close()
+    _notify_change("system_configuration", client_id=client_id)
     return cfg_id
 
 def get_system_configuration_by_client(client_id):
@@ -379,6 +761,7 @@ def add_configuration_prediction(chauffe_eau_id, intervalle_min, horizon_h, seui
     conn.commit()
     cfg_id = cur.lastrowid
     conn.close()
+    _notify_change("configuration_prediction", chauffe_eau_id=chauffe_eau_id)
     return cfg_id
 
 
@@ -391,6 +774,35 @@ def get_configuration_prediction_by_chauffe_eau(chauffe_eau_id):
     return rows
 
 
+def get_configuration_version(client_id):
+    """
+    Jeton de version des configurations d'un client : (MAX id, MAX updated_at)
+    de chauffe_eaux, system_configuration et configuration_prediction.
+    Change dès qu'une ligne est ajoutée ou modifiée, même par un autre processus.
+    """
+    conn = get_connection()
+    if conn is None:
+        return None
+    cur = conn.cursor()
+    sql = """
+        SELECT
+            (SELECT MAX(chauffe_eau_id) FROM chauffe_eaux WHERE client_id = %s),
+            (SELECT MAX(updated_at) FROM chauffe_eaux WHERE client_id = %s),
+            (SELECT MAX(config_id) FROM system_configuration WHERE client_id = %s),
+            (SELECT MAX(updated_at) FROM system_configuration WHERE client_id = %s),
+            (SELECT MAX(cp.config_id) FROM configuration_prediction cp
+                JOIN chauffe_eaux ce ON cp.chauffe_eau_id = ce.chauffe_eau_id
+                WHERE ce.client_id = %s),
+            (SELECT MAX(cp.updated_at) FROM configuration_prediction cp
+                JOIN chauffe_eaux ce ON cp.chauffe_eau_id = ce.chauffe_eau_id
+                WHERE ce.client_id = %s)
+    """
+    cur.execute(sql, (client_id,) * 6)
+    row = cur.fetchone()
+    conn.close()
+    return tuple(row) if row else None
+
+
 # ==========================
 # ===== DÉCISIONS ==========
 # ==========================
@@ -417,9 +829,13 @@ def get_prediction_temperature_by_chauffe_eau(chauffe_eau_id):
     conn.close()
     return rows
 
+_DECISION_COLUMNS = "id_decision, heure_decision, step_min, nb_creneaux, planning, statut"
+
+
 def add_decision(chauffe_eau_id, liste, step_min, heure_debut=None, conn=None):
     """
-    Ajoute une décision avec métadonnées de timing
+    Ajoute une décision avec métadonnées de timing.
+    Le planning 0/1 est stocké en bits (colonne planning, cf. decision_codec).
     """
     should_close = False
     if conn is None:
@@ -431,37 +847,169 @@ def add_decision(chauffe_eau_id, liste, step_min, heure_debut=None, conn=None):
         
     cur = conn.cursor()
     
-    # Heure de début de la séquence de décisions
+    # Heure de début de la séquence de décisions (DATETIME : à la seconde près)
     if heure_debut is None:
         heure_debut = datetime.now()
-    
-    # Préparer les données structurées
-    decision_data = {
-        "start_time": heure_debut.strftime("%Y-%m-%d %H:%M:%S"),
-        "step_min": step_min,
-        "decisions": liste
-    }
-    
-    sql = "INSERT INTO decision (chauffe_eau_id, statut, heure_decision) VALUES (%s, %s, %s)"
-    cur.execute(sql, (chauffe_eau_id, json.dumps(decision_data), heure_debut))
+    heure_debut = heure_debut.replace(microsecond=0)
+
+    schedule = Schedule.from_list(chauffe_eau_id, heure_debut, step_min, liste)
+
+    sql = """
+        INSERT INTO decision (chauffe_eau_id, heure_decision, step_min, nb_creneaux, planning)
+        VALUES (%s, %s, %s, %s, %s)
+    """
+    cur.execute(sql, (chauffe_eau_id, heure_debut, schedule.step_min, schedule.n_slots, schedule.bits))
     conn.commit()
     decision_id = cur.lastrowid
+    schedule.id_decision = decision_id
     
     if should_close:
         conn.close()
-        
+
+    _notify_change("decision", chauffe_eau_id=chauffe_eau_id, schedule=schedule)
     return decision_id
 
 def get_decision_by_CE(ce_id):
+    """Historique des décisions d'un chauffe-eau (JSON au format de `statut`), plus récente d'abord."""
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT statut FROM decision WHERE chauffe_eau_id = %s ORDER BY timestamp_creation DESC", (ce_id,))
+    cur.execute(f"SELECT {_DECISION_COLUMNS} FROM decision WHERE chauffe_eau_id = %s "
+                "ORDER BY timestamp_creation DESC", (ce_id,))
     rows = cur.fetchall()
     
     decisions = []
     for row in rows:
-        if row and row[0]:  # Vérifier que la ligne et la valeur existent
-            decisions.append(row[0]) 
+        schedule = Schedule.from_row(ce_id, *row)
+        if schedule is not None:
+            decisions.append(json.dumps(schedule.to_dict()))
     
     conn.close()
     return decisions
+
+
+def get_latest_decision(ce_id):
+    """Dernier planning (Schedule) d'un chauffe-eau, ou None."""
+    conn = get_connection()
+    if conn is None:
+        return None
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT {_DECISION_COLUMNS}
+        FROM decision
+        WHERE chauffe_eau_id = %s
+        ORDER BY heure_decision DESC, id_decision DESC
+        LIMIT 1
+    """, (ce_id,))
+    row = cur.fetchone()
+    conn.close()
+    if not row:
+        return None
+    return Schedule.from_row(ce_id, *row)
+
+
+def get_latest_decisions(ce_ids=None):
+    """
+    Derniers plannings de plusieurs chauffe-eaux en une requête.
+    Retourne {chauffe_eau_id: Schedule} (tous les chauffe-eaux si ce_ids est None).
+    """
+    conn = get_connection()
+    if conn is None:
+        return {}
+    cur = conn.cursor()
+    sql = """
+        SELECT d.chauffe_eau_id, d.id_decision, d.heure_decision, d.step_min,
+               d.nb_creneaux, d.planning, d.statut
+        FROM decision d
+        JOIN (SELECT chauffe_eau_id, MAX(id_decision) AS id_decision
+              FROM decision GROUP BY chauffe_eau_id) last
+          ON last.id_decision = d.id_decision
+    """
+    params = []
+    if ce_ids is not None:
+        ce_ids = list(ce_ids)
+        if not ce_ids:
+            conn.close()
+            return {}
+        sql += " WHERE d.chauffe_eau_id IN (" + ", ".join(["%s"] * len(ce_ids)) + ")"
+        params = ce_ids
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    conn.close()
+    schedules = {}
+    for ce_id, *row in rows:
+        schedule = Schedule.from_row(ce_id, *row)
+        if schedule is not None:
+            schedules[ce_id] = schedule
+    return schedules
+
+
+def get_max_decision_id():
+    """Plus grand id_decision (0 si la table est vide) : point de départ du suivi des nouvelles décisions."""
+    conn = get_connection()
+    if conn is None:
+        return None
+    cur = conn.cursor()
+    cur.execute("SELECT MAX(id_decision) FROM decision")
+    row = cur.fetchone()
+    conn.close()
+    return (row[0] if row else None) or 0
+
+
+def get_decisions_since(last_id, limit=1000):
+    """
+    Décisions d'id_decision > last_id, par id croissant (au plus `limit`).
+    Retourne (plus grand id_decision lu, liste de Schedule) ; id_decision est la clé
+    primaire auto-incrémentée : la requête suit l'index quel que soit le volume de la table.
+    """
+    conn = get_connection()
+    if conn is None:
+        return last_id, []
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT chauffe_eau_id, {_DECISION_COLUMNS}
+        FROM decision
+        WHERE id_decision > %s
+        ORDER BY id_decision
+        LIMIT %s
+    """, (last_id, limit))
+    rows = cur.fetchall()
+    conn.close()
+    schedules = []
+    for ce_id, *row in rows:
+        last_id = max(last_id, row[0])
+        schedule = Schedule.from_row(ce_id, *row)
+        if schedule is not None:
+            schedules.append(schedule)
+    return last_id, schedules
+
+
+def purge_old_decisions(retention_days=7, batch_size=1000):
+    """
+    Politique de rétention : supprime les décisions plus vieilles que
+    `retention_days`, en gardant toujours la dernière de chaque chauffe-eau.
+    Suppression par lots pour ne pas verrouiller la table longtemps.
+    Retourne le nombre de lignes supprimées.
+    """
+    conn = get_connection()
+    if conn is None:
+        return 0
+    cur = conn.cursor()
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        cur.execute("""
+            SELECT d.id_decision
+            FROM decision d
+            WHERE d.heure_decision < %s
+              AND d.id_decision < (SELECT MAX(d2.id_decision) FROM decision d2
+                                   WHERE d2.chauffe_eau_id = d.chauffe_eau_id)
+            LIMIT %s
+        """, (cutoff, batch_size))
+        ids = [row[0] for row in cur.fetchall()]
+        if not ids:
+            break
+        cur.execute("DELETE FROM decision WHERE id_decision IN (" + ", ".join(["%s"] * len(ids)) + ")", ids)
+        conn.commit()
+        deleted += len(ids)
+    conn.close()
+    return deleted
@@ -0,0 +1,133 @@
+"""
+decision_codec.py
+
+Représentation compacte des décisions de chauffe.
+
+Un planning 0/1 de N créneaux est stocké dans la colonne `decision.planning`
+sous forme de bits (1 bit par créneau, bit de poids fort en premier), avec
+`heure_decision` (début), `step_min` et `nb_creneaux` en métadonnées :
+96 créneaux de 15 min tiennent en 12 octets au lieu d'un JSON de ~350 octets.
+
+Le même format sert au planning complet poussé aux routeurs (topic
+<router_id>/SCHEDULE, cf. mqtt_send/sender.py), en binaire big-endian :
+
+    version (u8) | début, epoch s (u32) | step_min (u16) | nb_creneaux (u16) | bits
+
+soit 21 octets pour 96 créneaux.
+"""
+
+import json
+import struct
+from datetime import datetime, timedelta
+
+PAYLOAD_VERSION = 1
+_PAYLOAD_HEADER = struct.Struct(">BIHH")
+
+
+def pack_schedule(values):
+    """[0, 1, 1, 0, ...] -> bytes (MSB first, dernier octet complété par des 0)."""
+    out = bytearray((len(values) + 7) // 8)
+    for i, v in enumerate(values):
+        if v:
+            out[i >> 3] |= 0x80 >> (i & 7)
+    return bytes(out)
+
+
+def unpack_schedule(blob, n_slots):
+    """Inverse de pack_schedule : bytes -> liste de n_slots entiers 0/1."""
+    return [(blob[i >> 3] >> (7 - (i & 7))) & 1 for i in range(n_slots)]
+
+
+class Schedule:
+    """Planning d'un chauffe-eau : début, pas de temps et bits de commande."""
+
+    __slots__ = ("chauffe_eau_id", "id_decision", "start_time", "step_min", "n_slots", "bits")
+
+    def __init__(self, chauffe_eau_id, start_time, step_min, bits, n_slots, id_decision=None):
+        self.chauffe_eau_id = chauffe_eau_id
+        self.id_decision = id_decision
+        self.start_time = start_time
+        self.step_min = int(step_min)
+        self.n_slots = int(n_slots)
+        self.bits = bytes(bits)
+
+    @classmethod
+    def from_list(cls, chauffe_eau_id, start_time, step_min, values, id_decision=None):
+        return cls(chauffe_eau_id, start_time, step_min, pack_schedule(values), len(values), id_decision)
+
+    @classmethod
+    def from_row(cls, chauffe_eau_id, id_decision, heure_decision, step_min, n_slots, planning, statut=None):
+        """
+        Construit un Schedule depuis une ligne de `decision`.
+        Les anciennes lignes (planning NULL) sont relues depuis le JSON de `statut`.
+        """
+        if planning is not None:
+            return cls(chauffe_eau_id, heure_decision, step_min, planning, n_slots, id_decision)
+        if not statut:
+            return None
+        data = json.loads(statut)
+        start_time = datetime.strptime(data["start_time"], "%Y-%m-%d %H:%M:%S")
+        return cls.from_list(chauffe_eau_id, start_time, data["step_min"], data["decisions"], id_decision)
+
+    @classmethod
+    def from_payload(cls, chauffe_eau_id, payload):
+        """Inverse de to_payload ; ValueError si le message est invalide."""
+        if len(payload) < _PAYLOAD_HEADER.size:
+            raise ValueError("payload de planning trop court")
+        version, start, step_min, n_slots = _PAYLOAD_HEADER.unpack_from(payload)
+        if version != PAYLOAD_VERSION:
+            raise ValueError(f"version de planning inconnue {version}")
+        bits = payload[_PAYLOAD_HEADER.size:]
+        if len(bits) != (n_slots + 7) // 8:
+            raise ValueError("taille du planning incohérente")
+        return cls(chauffe_eau_id, datetime.fromtimestamp(start), step_min, bits, n_slots)
+
+    def to_payload(self):
+        """Message binaire du planning complet pour les routeurs (format en tête de module)."""
+        return _PAYLOAD_HEADER.pack(PAYLOAD_VERSION, int(self.start_time.timestamp()), self.step_min,
+                                    self.n_slots) + self.bits
+
+    @property
+    def end_time(self):
+        return self.start_time + timedelta(minutes=self.step_min * self.n_slots)
+
+    def index_at(self, when=None):
+        """Index du créneau contenant `when` (peut être hors de [0, n_slots[)."""
+        when = when or datetime.now()
+        return int((when - self.start_time).total_seconds() // (self.step_min * 60))
+
+    def value(self, index):
+        """Décision du créneau `index`, ou None hors de l'horizon."""
+        if 0 <= index < self.n_slots:
+            return (self.bits[index >> 3] >> (7 - (index & 7))) & 1
+        return None
+
+    def value_at(self, when=None):
+        return self.value(self.index_at(when))
+
+    def time_of(self, index):
+        """Début du créneau `index`."""
+        return self.start_time + timedelta(minutes=self.step_min * index)
+
+    def next_change(self, index):
+        """Premier créneau après `index` dont la décision diffère de celle de `index` (None si aucun)."""
+        current = self.value(index)
+        for i in range(max(index + 1, 0), self.n_slots):
+            if self.value(i) != current:
+                return i
+        return None
+
+    def to_list(self):
+        return unpack_schedule(self.bits, self.n_slots)
+
+    def to_dict(self):
+        """Format historique de `decision.statut`."""
+        return {
+            "start_time": self.start_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "step_min": self.step_min,
+            "decisions": self.to_list(),
+        }
+
+    def __repr__(self):
+        return (f"Schedule(ce={self.chauffe_eau_id}, start={self.start_time:%Y-%m-%d %H:%M}, "
+                f"step={self.step_min}min, n={self.n_slots})")
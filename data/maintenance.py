@@ -0,0 +1,307 @@
+"""
+maintenance.py
+
+Tâche de maintenance des tables de télémétrie (à lancer une fois par jour) :
+
+1. agrégation : les mesures brutes de temperatures_reelles et production_reelle
+   plus vieilles que `rollup_after_days` sont résumées par créneau de
+   `rollup_step_min` minutes (min / moyenne / max / nombre) dans
+   temperatures_agregees et production_agregee ; les `rollup_lookback_days`
+   derniers jours déjà agrégés sont recalculés à chaque passage pour intégrer
+   les mesures arrivées en retard ;
+2. rétention : les lignes brutes au-delà de leur durée de conservation sont
+   supprimées par lots de `batch_size` (verrous courts) ; une mesure n'est
+   jamais supprimée tant que son créneau peut encore être recalculé ;
+3. rapport : nombre de lignes et taille (données + index) de chaque table.
+
+Paramètres lus dans config/maintenance_config.txt.
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Dict
+
+from .com_bdd import BACKEND, get_connection, purge_old_decisions
+
+DEFAULTS = {
+    "rollup_after_days": 7,
+    "rollup_step_min": 15,
+    "rollup_lookback_days": 2,
+    "temperatures_retention_days": 30,
+    "production_retention_days": 30,
+    "meteo_retention_days": 30,
+    "previsions_retention_days": 7,
+    "decision_retention_days": 7,
+    "batch_size": 5000,
+    "run_at": "03:00",
+}
+
+# Agrégations : table brute -> (table agrégée, clé, colonne temps, valeur, colonnes min/moy/max)
+ROLLUPS = {
+    "temperatures_reelles": ("temperatures_agregees", "chauffe_eau_id", "timestamp_mesure", "temperature",
+                             ("temperature_min", "temperature_moy", "temperature_max")),
+    "production_reelle": ("production_agregee", "client_id", "heure_production", "puissance_produite_kw",
+                          ("puissance_min_kw", "puissance_moy_kw", "puissance_max_kw")),
+}
+
+# Rétention : table -> (clé primaire, colonne temps, clé de config)
+RETENTION = {
+    "temperatures_reelles": ("mesure_id", "timestamp_mesure", "temperatures_retention_days"),
+    "production_reelle": ("production_id", "heure_production", "production_retention_days"),
+    "donnees_meteo": ("meteo_id", "timestamp_acquisition", "meteo_retention_days"),
+    "previsions_production": ("prevision_id", "timestamp_creation", "previsions_retention_days"),
+}
+
+ROLLUP_WINDOW = timedelta(days=1)  # une requête d'agrégation couvre au plus une journée
+
+
+def load_maintenance_config(filename: str = "maintenance_config.txt") -> Dict:
+    """
+    Lit config/maintenance_config.txt ; les clés absentes prennent leur valeur par défaut.
+
+    Raises:
+        ValueError: si une valeur numérique est mal formée.
+    """
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    full_path = os.path.join(base_dir, "config", filename)
+
+    config = dict(DEFAULTS)
+    if not os.path.isfile(full_path):
+        return config
+
+    with open(full_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                key, value = line.split("=", 1)
+                config[key.strip()] = value.strip()
+
+    for key, default in DEFAULTS.items():
+        if isinstance(default, int):
+            try:
+                config[key] = int(config[key])
+            except ValueError:
+                raise ValueError(f"Invalid maintenance value for '{key}': {config[key]!r}")
+    return config
+
+
+def _align(dt, step_min):
+    """Arrondit `dt` au début de son créneau de step_min minutes."""
+    dt = dt.replace(second=0, microsecond=0)
+    return dt - timedelta(minutes=(dt.hour * 60 + dt.minute) % step_min)
+
+
+def _as_datetime(value):
+    """MIN()/MAX() perdent le type déclaré avec SQLite : la valeur revient en texte."""
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _bucket_expr(column, step_min):
+    """Expression SQL du début de créneau contenant `column`."""
+    seconds = step_min * 60
+    if BACKEND == "sqlite":
+        return f"datetime(CAST(strftime('%%s', {column}) AS INTEGER) / {seconds} * {seconds}, 'unixepoch')"
+    return f"FROM_UNIXTIME(UNIX_TIMESTAMP({column}) DIV {seconds} * {seconds})"
+
+
+def _upsert_clause(key, columns):
+    """Clause d'upsert : un créneau déjà agrégé est recalculé au lieu d'être dupliqué."""
+    if BACKEND == "sqlite":
+        return (f"ON CONFLICT ({key}, debut_periode, step_min) DO UPDATE SET "
+                + ", ".join(f"{c} = excluded.{c}" for c in columns))
+    return "ON DUPLICATE KEY UPDATE " + ", ".join(f"{c} = VALUES({c})" for c in columns)
+
+
+def rollup_resume_point(table, step_min, lookback, conn):
+    """
+    Début de la prochaine fenêtre d'agrégation de `table` : fin du dernier créneau
+    agrégé (filigrane) moins `lookback`, ou None si rien n'a encore été agrégé.
+    Les lignes brutes postérieures peuvent encore être ré-agrégées : elles ne doivent pas être purgées.
+    """
+    agg_table = ROLLUPS[table][0]
+    cur = conn.cursor()
+    cur.execute(f"SELECT MAX(debut_periode) FROM {agg_table} WHERE step_min = %s", (step_min,))
+    last_bucket = _as_datetime(cur.fetchone()[0])
+    if last_bucket is None:
+        return None
+    return last_bucket + timedelta(minutes=step_min) - lookback
+
+
+def rollup_table(table, step_min, older_than, lookback=timedelta(0), conn=None):
+    """
+    Agrège par créneau les lignes de `table` antérieures à `older_than`.
+
+    Reprend au filigrane (dernier créneau agrégé) moins `lookback` : les créneaux
+    de cette fenêtre sont recalculés (upsert), ce qui intègre les mesures arrivées
+    en retard avec un horodatage ancien (rejeu du spill d'ingestion, routeur resté
+    hors ligne). Relancer la tâche ne crée pas de doublons.
+    Retourne (nombre de créneaux écrits, début de la prochaine fenêtre d'agrégation).
+    """
+    agg_table, key, time_col, value_col, (min_col, avg_col, max_col) = ROLLUPS[table]
+    should_close = conn is None
+    conn = conn or get_connection()
+    if conn is None:
+        return 0, None
+    cur = conn.cursor()
+
+    end = _align(older_than, step_min)
+    start = rollup_resume_point(table, step_min, lookback, conn)
+    if start is not None:
+        start = _align(start, step_min)
+    else:
+        cur.execute(f"SELECT MIN({time_col}) FROM {table}")
+        first = _as_datetime(cur.fetchone()[0])
+        if first is None:
+            if should_close:
+                conn.close()
+            return 0, None
+        start = _align(first, step_min)
+
+    written = 0
+    window_start = start
+    bucket = _bucket_expr(time_col, step_min)
+    upsert = _upsert_clause(key, (min_col, avg_col, max_col, "nb_mesures"))
+    while window_start < end:
+        window_end = min(window_start + ROLLUP_WINDOW, end)
+        cur.execute(f"""
+            INSERT INTO {agg_table}
+                ({key}, debut_periode, step_min, {min_col}, {avg_col}, {max_col}, nb_mesures)
+            SELECT {key}, {bucket} AS periode, %s, MIN({value_col}), AVG({value_col}), MAX({value_col}), COUNT(*)
+            FROM {table}
+            WHERE {time_col} >= %s AND {time_col} < %s
+            GROUP BY {key}, periode
+            {upsert}
+        """, (step_min, window_start, window_end))
+        conn.commit()
+        written += max(cur.rowcount, 0)
+        window_start = window_end
+
+    resume = rollup_resume_point(table, step_min, lookback, conn)
+    if should_close:
+        conn.close()
+    return written, resume
+
+
+def purge_table(table, id_col, time_col, cutoff, batch_size, conn=None):
+    """
+    Supprime les lignes de `table` dont `time_col` < cutoff, par lots de batch_size
+    (SELECT des ids puis DELETE par clé primaire, une transaction courte par lot).
+    Retourne le nombre de lignes supprimées.
+    """
+    should_close = conn is None
+    conn = conn or get_connection()
+    if conn is None:
+        return 0
+    cur = conn.cursor()
+    deleted = 0
+    while True:
+        cur.execute(f"SELECT {id_col} FROM {table} WHERE {time_col} < %s LIMIT %s", (cutoff, batch_size))
+        ids = [row[0] for row in cur.fetchall()]
+        if not ids:
+            break
+        cur.execute(f"DELETE FROM {table} WHERE {id_col} IN (" + ", ".join(["%s"] * len(ids)) + ")", ids)
+        conn.commit()
+        deleted += len(ids)
+    if should_close:
+        conn.close()
+    return deleted
+
+
+def table_sizes(conn=None):
+    """
+    Retourne {table: {"rows": ..., "data_bytes": ..., "index_bytes": ...}}
+    (estimations InnoDB ; avec SQLite, nombre exact de lignes et octets si dbstat est disponible).
+    """
+    should_close = conn is None
+    conn = conn or get_connection()
+    if conn is None:
+        return {}
+    cur = conn.cursor()
+    if BACKEND == "sqlite":
+        sizes = _sqlite_table_sizes(cur)
+        if should_close:
+            conn.close()
+        return sizes
+    cur.execute("""
+        SELECT table_name, table_rows, data_length, index_length
+        FROM information_schema.tables
+        WHERE table_schema = DATABASE()
+        ORDER BY table_name
+    """)
+    sizes = {
+        name: {"rows": int(rows or 0), "data_bytes": int(data or 0), "index_bytes": int(index or 0)}
+        for name, rows, data, index in cur.fetchall()
+    }
+    if should_close:
+        conn.close()
+    return sizes
+
+
+def _sqlite_table_sizes(cur):
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%%' ORDER BY name", ())
+    tables = [row[0] for row in cur.fetchall()]
+    bytes_by_name = {}
+    try:
+        cur.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+        bytes_by_name = {name: int(size or 0) for name, size in cur.fetchall()}
+    except Exception:
+        pass  # SQLite compilé sans SQLITE_ENABLE_DBSTAT_VTAB
+    cur.execute("SELECT tbl_name, name FROM sqlite_master WHERE type = 'index'")
+    index_bytes = {}
+    for table, index in cur.fetchall():
+        index_bytes[table] = index_bytes.get(table, 0) + bytes_by_name.get(index, 0)
+    sizes = {}
+    for name in tables:
+        cur.execute(f"SELECT COUNT(*) FROM {name}")
+        (rows,) = cur.fetchone()
+        sizes[name] = {"rows": rows, "data_bytes": bytes_by_name.get(name, 0), "index_bytes": index_bytes.get(name, 0)}
+    return sizes
+
+
+def run_maintenance(config=None, now=None):
+    """Enchaîne agrégation, rétention et rapport ; retourne un résumé."""
+    config = config or load_maintenance_config()
+    now = now or datetime.now()
+    step_min = config["rollup_step_min"]
+    report = {"rollup": {}, "purge": {}, "sizes": {}}
+
+    conn = get_connection()
+    if conn is None:
+        print("[Maintenance] Connexion BDD impossible")
+        return report
+
+    try:
+        rolled_until = {}
+        lookback = timedelta(days=config["rollup_lookback_days"])
+        for table in ROLLUPS:
+            written, resume = rollup_table(table, step_min, now - timedelta(days=config["rollup_after_days"]),
+                                           lookback, conn)
+            report["rollup"][table] = written
+            rolled_until[table] = resume
+
+        for table, (id_col, time_col, retention_key) in RETENTION.items():
+            cutoff = now - timedelta(days=config[retention_key])
+            if table in ROLLUPS:
+                # Ne jamais supprimer une mesure dont le créneau sera encore recalculé
+                watermark = rolled_until.get(table)
+                if watermark is None:
+                    continue
+                cutoff = min(cutoff, watermark)
+            report["purge"][table] = purge_table(table, id_col, time_col, cutoff, config["batch_size"], conn)
+
+        report["sizes"] = table_sizes(conn)
+    finally:
+        conn.close()
+
+    report["purge"]["decision"] = purge_old_decisions(config["decision_retention_days"], config["batch_size"])
+
+    print(f"[Maintenance] Agrégats écrits : {report['rollup']}")
+    print(f"[Maintenance] Lignes supprimées : {report['purge']}")
+    for name, size in report["sizes"].items():
+        print(f"[Maintenance] {name:<28} {size['rows']:>10} lignes "
+              f"{(size['data_bytes'] + size['index_bytes']) / 1_048_576:>8.1f} Mo")
+    return report
+
+
+if __name__ == "__main__":
+    run_maintenance()
@@ -0,0 +1,190 @@
+"""
+router_map.py
+
+Correspondance router_id -> (client_id, chauffe_eau_id) en mémoire.
+
+Les topics MQTT sont préfixés par le router_id : chaque message de télémétrie
+doit retrouver son client et son chauffe-eau, et chaque commande envoyée doit
+retrouver le routeur de son chauffe-eau. La table entière est chargée en une
+requête au démarrage (get_ids_by_router()), rechargée au plus une fois toutes
+les NEGATIVE_TTL_S secondes quand un client ou un chauffe-eau est introuvable
+(créé par un autre processus), et tenue à jour :
+
+- par register, enregistrement idempotent d'un routeur (topic `creation`) ;
+- par les hooks de data.com_bdd (ajout d'un client ou d'un chauffe-eau) ;
+- par resolve, qui va chercher en BDD les routeurs encore inconnus, en un lot,
+  et retient les absents NEGATIVE_TTL_S secondes pour ne pas interroger la BDD
+  à chaque message d'un routeur non enregistré. Un routeur connu sans
+  chauffe-eau (enregistré par `creation`, chauffe-eau créé par un autre
+  processus) est relu au plus une fois toutes les NEGATIVE_TTL_S secondes.
+"""
+
+import threading
+import time
+
+from data.com_bdd import get_ids_by_router, register_change_hook, register_router
+
+NEGATIVE_TTL_S = 60
+
+
+class RouterMap:
+    def __init__(self, negative_ttl_s=NEGATIVE_TTL_S):
+        self.negative_ttl_s = negative_ttl_s
+        self._by_router = {}        # router_id -> (client_id, chauffe_eau_id)
+        self._by_client = {}        # client_id -> router_id
+        self._by_ce = {}            # chauffe_eau_id -> router_id
+        self._unknown = {}          # router_id -> instant (monotonic) de la dernière recherche vaine
+        self._no_ce = {}            # router_id connu sans chauffe-eau -> instant de la dernière lecture
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.loaded_at = None
+        self.hits = 0
+        self.misses = 0
+        self.lookups = 0
+
+    def __len__(self):
+        return len(self._by_router)
+
+    def _set(self, router_id, client_id, ce_id):
+        previous = self._by_router.get(router_id)
+        if previous is not None:
+            self._by_client.pop(previous[0], None)
+            self._by_ce.pop(previous[1], None)
+        self._by_router[router_id] = (client_id, ce_id)
+        self._by_client[client_id] = router_id
+        if ce_id is not None:
+            self._by_ce[ce_id] = router_id
+            self._no_ce.pop(router_id, None)
+        else:
+            self._no_ce[router_id] = time.monotonic()
+        self._unknown.pop(router_id, None)
+
+    def load(self):
+        """Charge tous les routeurs en une requête ; retourne leur nombre."""
+        ids = get_ids_by_router()
+        with self._lock:
+            self._by_router.clear()
+            self._by_client.clear()
+            self._by_ce.clear()
+            self._unknown.clear()
+            self._no_ce.clear()
+            for router_id, (client_id, ce_id) in ids.items():
+                self._set(router_id, client_id, ce_id)
+            self.loaded = True
+            self.loaded_at = time.monotonic()
+        return len(ids)
+
+    def resolve(self, router_ids):
+        """{router_id: (client_id, chauffe_eau_id)} des routeurs connus (BDD lue pour les seuls manquants)."""
+        if not self.loaded:
+            self.load()
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for router_id in router_ids:
+                ids = self._by_router.get(router_id)
+                if ids is not None:
+                    found[router_id] = ids
+                    self.hits += 1
+                    if ids[1] is None and now - self._no_ce.get(router_id, now) >= self.negative_ttl_s:
+                        # Chauffe-eau peut-être créé depuis par un autre processus
+                        self._no_ce[router_id] = now
+                        missing.append(router_id)
+                elif now - self._unknown.get(router_id, -self.negative_ttl_s) >= self.negative_ttl_s:
+                    missing.append(router_id)
+                    self.misses += 1
+        if missing:
+            self.lookups += 1
+            fetched = get_ids_by_router(missing)
+            with self._lock:
+                for router_id in missing:
+                    ids = fetched.get(router_id)
+                    if ids is None:
+                        if router_id not in self._by_router:
+                            self._unknown[router_id] = now
+                    else:
+                        self._set(router_id, *ids)
+                        found[router_id] = ids
+        return found
+
+    def get(self, router_id):
+        return self.resolve((router_id,)).get(router_id)
+
+    def _reload_if_stale(self):
+        """Rechargement complet après un échec du cache, au plus une fois toutes les negative_ttl_s secondes."""
+        if time.monotonic() - self.loaded_at < self.negative_ttl_s:
+            return False
+        self.load()
+        return True
+
+    def router_of_client(self, client_id):
+        if not self.loaded:
+            self.load()
+        router_id = self._by_client.get(client_id)
+        if router_id is None and self._reload_if_stale():
+            router_id = self._by_client.get(client_id)
+        return router_id
+
+    def resolve_clients(self, client_ids):
+        """
+        {client_id: (router_id, chauffe_eau_id)} des clients connus, en une passe sur le cache.
+        Des clients inconnus (créés par un autre processus) provoquent au plus un rechargement
+        complet toutes les negative_ttl_s secondes.
+        """
+        if not self.loaded:
+            self.load()
+        for attempt in range(2):
+            found, missing = {}, False
+            with self._lock:
+                for client_id in client_ids:
+                    router_id = self._by_client.get(client_id)
+                    if router_id is None:
+                        missing = True
+                    else:
+                        found[client_id] = (router_id, self._by_router[router_id][1])
+            if not missing or attempt or not self._reload_if_stale():
+                return found
+        return found
+
+    def router_of_ce(self, chauffe_eau_id):
+        """Routeur d'un chauffe-eau ; un chauffe-eau inconnu (créé par un autre processus) recharge la table."""
+        if not self.loaded:
+            self.load()
+        router_id = self._by_ce.get(chauffe_eau_id)
+        if router_id is None and self._reload_if_stale():
+            router_id = self._by_ce.get(chauffe_eau_id)
+        return router_id
+
+    def register(self, router_id, pwd=None):
+        """Enregistrement idempotent (topic `creation`) : retourne (client_id, created)."""
+        with self._lock:
+            ids = self._by_router.get(router_id)
+        if ids is not None:
+            return ids[0], False
+        client_id, created = register_router(router_id, pwd)
+        if client_id is not None and not created:
+            # Routeur déjà en BDD mais pas encore dans le cache : récupérer aussi son chauffe-eau
+            ids = get_ids_by_router((router_id,)).get(router_id, (client_id, None))
+            with self._lock:
+                self._set(router_id, *ids)
+        return client_id, created
+
+    def stats(self):
+        with self._lock:
+            return {"routers": len(self._by_router), "unknown": len(self._unknown), "hits": self.hits,
+                    "misses": self.misses, "db_lookups": self.lookups}
+
+    def _on_change(self, table, client_id=None, chauffe_eau_id=None, router_id=None, **_):
+        if table == "clients" and router_id and client_id is not None:
+            with self._lock:
+                if router_id not in self._by_router:
+                    self._set(router_id, client_id, None)
+        elif table == "chauffe_eaux" and client_id is not None and chauffe_eau_id is not None:
+            with self._lock:
+                router_id = self._by_client.get(client_id)
+                if router_id is not None and self._by_router[router_id][1] is None:
+                    self._set(router_id, client_id, chauffe_eau_id)
+
+
+ROUTER_MAP = RouterMap()
+register_change_hook(ROUTER_MAP._on_change)
@@ -0,0 +1,230 @@
+"""
+router_state.py
+
+Dernier état connu de chaque routeur, en mémoire, pour tout le processus.
+
+Le récepteur MQTT (mqtt_receive/ingestion.py) met à jour l'état à chaque lot
+inséré ; l'optimiseur (logic/client_processor.py) y lit la température du
+ballon et la production PV courante sans requête BDD ni lecture de fichier.
+
+Un enregistrement par routeur (__slots__), indexé par router_id et par
+client_id. Une mesure plus ancienne que celle déjà connue est ignorée (lots
+rejoués depuis le spill, messages retenus).
+
+L'état est sauvegardé périodiquement dans un seul fichier binaire (écriture
+dans un fichier temporaire puis os.replace : le fichier est toujours complet)
+et rechargé au démarrage pour repartir à chaud.
+"""
+
+import math
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+SNAPSHOT_MAGIC = b"ORS1"
+_HEADER = struct.Struct("<4sId")           # magic, nombre d'enregistrements, date de sauvegarde
+_RECORD = struct.Struct("<qqdddddH")       # ids, mesures, horodatages, longueur du router_id
+_NO_ID = -1
+MAX_FUTURE_S = 86400   # mesure datée de plus d'un jour après sa réception : ignorée au rechargement
+
+
+class RouterState:
+    """Dernières mesures d'un routeur (horodatages en secondes epoch, None si inconnues)."""
+
+    __slots__ = ("router_id", "client_id", "chauffe_eau_id", "temperature", "temperature_at",
+                 "pv_power_kw", "pv_at", "received_at")
+
+    def __init__(self, router_id, client_id=None, chauffe_eau_id=None):
+        self.router_id = router_id
+        self.client_id = client_id
+        self.chauffe_eau_id = chauffe_eau_id
+        self.temperature = None
+        self.temperature_at = None
+        self.pv_power_kw = None
+        self.pv_at = None
+        self.received_at = None
+
+    def __repr__(self):
+        return (f"RouterState({self.router_id!r}, client_id={self.client_id}, "
+                f"temperature={self.temperature}, pv_power_kw={self.pv_power_kw})")
+
+
+def _pack_float(value):
+    return math.nan if value is None else float(value)
+
+
+def _unpack_float(value):
+    return None if math.isnan(value) else value
+
+
+class RouterStateStore:
+    def __init__(self):
+        self._by_router = {}
+        self._by_client = {}
+        self._lock = threading.Lock()
+        self._snapshot_thread = None
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return len(self._by_router)
+
+    def update(self, router_id, client_id, chauffe_eau_id, measured_at, temperature=None, pv_power_kw=None,
+               received_at=None):
+        """Intègre une mesure (measured_at en secondes epoch)."""
+        with self._lock:
+            state = self._by_router.get(router_id)
+            if state is None:
+                state = self._by_router[router_id] = RouterState(router_id)
+            if client_id is not None and state.client_id != client_id:
+                if state.client_id is not None:
+                    self._by_client.pop(state.client_id, None)
+                state.client_id = client_id
+                self._by_client[client_id] = state
+            if chauffe_eau_id is not None:
+                state.chauffe_eau_id = chauffe_eau_id
+            if temperature is not None and (state.temperature_at is None or measured_at >= state.temperature_at):
+                state.temperature = temperature
+                state.temperature_at = measured_at
+            if pv_power_kw is not None and (state.pv_at is None or measured_at >= state.pv_at):
+                state.pv_power_kw = pv_power_kw
+                state.pv_at = measured_at
+            state.received_at = max(state.received_at or 0.0, received_at or time.time())
+
+    def get(self, router_id):
+        return self._by_router.get(router_id)
+
+    def by_client(self, client_id):
+        return self._by_client.get(client_id)
+
+    def latest_temperature(self, client_id):
+        """(température, datetime de la mesure) du client, ou None."""
+        state = self._by_client.get(client_id)
+        if state is None or state.temperature is None:
+            return None
+        return state.temperature, datetime.fromtimestamp(state.temperature_at)
+
+    def latest_pv(self, client_id):
+        """(puissance PV en kW, datetime de la mesure) du client, ou None."""
+        state = self._by_client.get(client_id)
+        if state is None or state.pv_power_kw is None:
+            return None
+        return state.pv_power_kw, datetime.fromtimestamp(state.pv_at)
+
+    def changed_since(self, since):
+        """
+        États reçus après `since` (secondes epoch), sous forme de tuples transmissibles
+        entre processus : (router_id, client_id, chauffe_eau_id, temperature,
+        temperature_at, pv_power_kw, pv_at, received_at).
+        """
+        with self._lock:
+            return [(s.router_id, s.client_id, s.chauffe_eau_id, s.temperature, s.temperature_at,
+                     s.pv_power_kw, s.pv_at, s.received_at)
+                    for s in self._by_router.values() if s.received_at is not None and s.received_at > since]
+
+    def merge(self, records):
+        """Intègre des états produits par changed_since (d'un autre processus)."""
+        for router_id, client_id, ce_id, temperature, temperature_at, pv_kw, pv_at, received_at in records:
+            if temperature is not None:
+                self.update(router_id, client_id, ce_id, temperature_at, temperature=temperature,
+                            received_at=received_at)
+            if pv_kw is not None:
+                self.update(router_id, client_id, ce_id, pv_at, pv_power_kw=pv_kw, received_at=received_at)
+            if temperature is None and pv_kw is None:
+                self.update(router_id, client_id, ce_id, None, received_at=received_at)
+
+    def clear(self):
+        with self._lock:
+            self._by_router.clear()
+            self._by_client.clear()
+
+    # --- snapshots -------------------------------------------------------------
+
+    def save(self, path):
+        """Écrit l'état dans path de façon atomique ; retourne le nombre d'enregistrements."""
+        with self._lock:
+            states = list(self._by_router.values())
+            chunks = [_HEADER.pack(SNAPSHOT_MAGIC, len(states), time.time())]
+            for s in states:
+                router_id = s.router_id.encode("utf-8")
+                chunks.append(_RECORD.pack(
+                    _NO_ID if s.client_id is None else s.client_id,
+                    _NO_ID if s.chauffe_eau_id is None else s.chauffe_eau_id,
+                    _pack_float(s.temperature), _pack_float(s.temperature_at),
+                    _pack_float(s.pv_power_kw), _pack_float(s.pv_at),
+                    _pack_float(s.received_at), len(router_id)))
+                chunks.append(router_id)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(chunks))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return len(states)
+
+    def load(self, path):
+        """
+        Recharge un snapshot. Les mesures déjà en mémoire plus récentes sont conservées.
+        Retourne le nombre d'enregistrements lus (0 si le fichier est absent).
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        magic, count, _ = _HEADER.unpack_from(data, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a router state snapshot")
+        offset = _HEADER.size
+        for _ in range(count):
+            (client_id, ce_id, temperature, temperature_at, pv_kw, pv_at, received_at,
+             length) = _RECORD.unpack_from(data, offset)
+            offset += _RECORD.size
+            router_id = data[offset:offset + length].decode("utf-8")
+            offset += length
+            client_id = None if client_id == _NO_ID else client_id
+            ce_id = None if ce_id == _NO_ID else ce_id
+            received_at = _unpack_float(received_at)
+            temperature, temperature_at = _unpack_float(temperature), _unpack_float(temperature_at)
+            pv_kw, pv_at = _unpack_float(pv_kw), _unpack_float(pv_at)
+            if received_at is not None:
+                # Snapshots écrits avant la borne du décodeur sur l'horodatage
+                if temperature_at is not None and temperature_at > received_at + MAX_FUTURE_S:
+                    temperature = None
+                if pv_at is not None and pv_at > received_at + MAX_FUTURE_S:
+                    pv_kw = None
+            self.merge([(router_id, client_id, ce_id, temperature, temperature_at, pv_kw, pv_at, received_at)])
+        return count
+
+    def start_snapshots(self, path, interval_s):
+        """Sauvegarde l'état toutes les interval_s secondes dans un thread de fond."""
+        if self._snapshot_thread is not None or not interval_s:
+            return
+
+        def run():
+            while not self._stop.wait(interval_s):
+                try:
+                    self.save(path)
+                except OSError as e:
+                    print(f"[ERROR] Router state snapshot failed: {e}")
+
+        self._stop.clear()
+        self._snapshot_thread = threading.Thread(target=run, name="router-state-snapshot", daemon=True)
+        self._snapshot_thread.start()
+
+    def stop_snapshots(self, path=None):
+        """Arrête les sauvegardes périodiques (et sauvegarde une dernière fois si path est donné)."""
+        self._stop.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+        if path:
+            self.save(path)
+
+
+ROUTER_STATE = RouterStateStore()
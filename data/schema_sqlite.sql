@@ -0,0 +1,192 @@
+-- Schéma SQLite équivalent à bdd_v2.sql (mêmes tables, colonnes et index).
+-- Appliqué automatiquement par data/sqlite_backend.py à la première connexion.
+-- À garder synchronisé avec bdd_v2.sql.
+--
+-- Différences avec MySQL :
+--   * AUTO_INCREMENT -> INTEGER PRIMARY KEY AUTOINCREMENT
+--   * ENUM / JSON    -> TEXT (+ CHECK pour les ENUM)
+--   * DEFAULT CURRENT_TIMESTAMP -> heure locale, comme le TIMESTAMP MySQL
+--   * ON UPDATE CURRENT_TIMESTAMP -> triggers *_updated_at
+
+CREATE TABLE IF NOT EXISTS `clients` (
+  `client_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `nom` VARCHAR(100) DEFAULT NULL,
+  `email` VARCHAR(150) DEFAULT NULL,
+  `latitude` DECIMAL(10,8) DEFAULT NULL,
+  `longitude` DECIMAL(11,8) DEFAULT NULL,
+  `tilt` DECIMAL(8,2) DEFAULT NULL,
+  `azimuth` DECIMAL(8,2) DEFAULT NULL,
+  `peak_power_kw` DECIMAL(6,2) DEFAULT NULL,
+  `weather_providers` TEXT DEFAULT NULL,
+  `router_id` VARCHAR(50) DEFAULT NULL,
+  `pwd` VARCHAR(50) DEFAULT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS `clients_router_id` ON `clients` (`router_id`);
+
+CREATE TABLE IF NOT EXISTS `chauffe_eaux` (
+  `chauffe_eau_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `client_id` INTEGER DEFAULT NULL REFERENCES `clients` (`client_id`),
+  `capacite_litres` INTEGER DEFAULT NULL,
+  `puissance_kw` DECIMAL(5,2) DEFAULT NULL,
+  `updated_at` TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS `chauffe_eaux_client_id` ON `chauffe_eaux` (`client_id`);
+
+CREATE TABLE IF NOT EXISTS `configuration_prediction` (
+  `config_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `chauffe_eau_id` INTEGER DEFAULT NULL REFERENCES `chauffe_eaux` (`chauffe_eau_id`),
+  `step_min` INTEGER DEFAULT NULL,
+  `horizon_prediction_heures` INTEGER DEFAULT NULL,
+  `seuil_alerte_basse` DECIMAL(5,2) DEFAULT NULL,
+  `seuil_alerte_haute` DECIMAL(5,2) DEFAULT NULL,
+  `processor` TEXT DEFAULT 'default' CHECK (`processor` IN ('custom', 'default')),
+  `surface_m2` DECIMAL(8,2) DEFAULT NULL,
+  `panel_efficiency` DECIMAL(4,3) DEFAULT NULL,
+  `system_efficiency` DECIMAL(4,3) DEFAULT NULL,
+  `updated_at` TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS `configuration_prediction_chauffe_eau_id` ON `configuration_prediction` (`chauffe_eau_id`);
+
+CREATE TABLE IF NOT EXISTS `decision` (
+  `id_decision` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `chauffe_eau_id` INTEGER DEFAULT NULL REFERENCES `chauffe_eaux` (`chauffe_eau_id`),
+  `statut` TEXT,
+  `heure_decision` DATETIME DEFAULT NULL,
+  `step_min` SMALLINT DEFAULT NULL,
+  `nb_creneaux` SMALLINT DEFAULT NULL,
+  `planning` BLOB DEFAULT NULL,
+  `timestamp_creation` TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS `decision_chauffe_eau_id` ON `decision` (`chauffe_eau_id`);
+CREATE INDEX IF NOT EXISTS `decision_ce_heure_decision` ON `decision` (`chauffe_eau_id`, `heure_decision`);
+CREATE INDEX IF NOT EXISTS `decision_heure_decision` ON `decision` (`heure_decision`);
+
+CREATE TABLE IF NOT EXISTS `decisions_temperature` (
+  `prevision_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `chauffe_eau_id` INTEGER DEFAULT NULL REFERENCES `chauffe_eaux` (`chauffe_eau_id`),
+  `temperature_predite` DECIMAL(5,2) DEFAULT NULL,
+  `heure_prevision` DATETIME DEFAULT NULL,
+  `confidence` DECIMAL(4,3) DEFAULT NULL,
+  `timestamp_creation` TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+  `modele_utilise` VARCHAR(100) DEFAULT NULL
+);
+CREATE INDEX IF NOT EXISTS `decisions_temperature_chauffe_eau_id` ON `decisions_temperature` (`chauffe_eau_id`);
+
+CREATE TABLE IF NOT EXISTS `donnees_meteo` (
+  `meteo_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `client_id` INTEGER DEFAULT NULL REFERENCES `clients` (`client_id`),
+  `temperature_ext` DECIMAL(5,2) DEFAULT NULL,
+  `humidity` DECIMAL(5,2) DEFAULT NULL,
+  `wind_speed` DECIMAL(5,2) DEFAULT NULL,
+  `precipitation` DECIMAL(5,2) DEFAULT NULL,
+  `cloud_cover` INTEGER DEFAULT NULL,
+  `weather_code` VARCHAR(50) DEFAULT NULL,
+  `heure_debut` DATETIME DEFAULT NULL,
+  `heure_fin` DATETIME DEFAULT NULL,
+  `source_meteo` VARCHAR(50) DEFAULT NULL,
+  `timestamp_acquisition` TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+  `irradiance` INTEGER DEFAULT NULL
+);
+CREATE INDEX IF NOT EXISTS `donnees_meteo_client_id` ON `donnees_meteo` (`client_id`);
+CREATE INDEX IF NOT EXISTS `donnees_meteo_client_heure_debut` ON `donnees_meteo` (`client_id`, `heure_debut`);
+CREATE INDEX IF NOT EXISTS `donnees_meteo_timestamp_acquisition` ON `donnees_meteo` (`timestamp_acquisition`);
+
+CREATE TABLE IF NOT EXISTS `previsions_production` (
+  `prevision_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `client_id` INTEGER DEFAULT NULL REFERENCES `clients` (`client_id`),
+  `puissance_prevue_kw` DECIMAL(8,2) DEFAULT NULL,
+  `heure_prevision` DATETIME DEFAULT NULL,
+  `timestamp_creation` TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS `previsions_production_client_id` ON `previsions_production` (`client_id`);
+CREATE INDEX IF NOT EXISTS `previsions_production_client_heure_prevision` ON `previsions_production` (`client_id`, `heure_prevision`);
+CREATE INDEX IF NOT EXISTS `previsions_production_timestamp_creation` ON `previsions_production` (`timestamp_creation`);
+
+CREATE TABLE IF NOT EXISTS `production_reelle` (
+  `production_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `client_id` INTEGER DEFAULT NULL REFERENCES `clients` (`client_id`),
+  `puissance_produite_kw` DECIMAL(8,2) DEFAULT NULL,
+  `heure_production` DATETIME DEFAULT NULL,
+  `timestamp_mesure` TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS `production_reelle_client_id` ON `production_reelle` (`client_id`);
+CREATE INDEX IF NOT EXISTS `production_reelle_client_heure_production` ON `production_reelle` (`client_id`, `heure_production`);
+CREATE INDEX IF NOT EXISTS `production_reelle_heure_production` ON `production_reelle` (`heure_production`);
+
+CREATE TABLE IF NOT EXISTS `system_configuration` (
+  `config_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `client_id` INTEGER DEFAULT NULL REFERENCES `clients` (`client_id`),
+  `water_consumption` TEXT DEFAULT NULL,
+  `cold_water_temperature` DECIMAL(4,1) DEFAULT NULL,
+  `minimum_comfort_temperature_enabled` BOOLEAN DEFAULT FALSE,
+  `minimum_comfort_temperature` DECIMAL(4,1) DEFAULT NULL,
+  `contract_type` TEXT DEFAULT NULL CHECK (`contract_type` IN ('base', 'heures_creuses', 'tempo')),
+  `base_tariff` DECIMAL(6,4) DEFAULT NULL,
+  `hp_tariff` DECIMAL(6,4) DEFAULT NULL,
+  `hc_tariff` DECIMAL(6,4) DEFAULT NULL,
+  `comfort_schedule` TEXT DEFAULT NULL,
+  `hot_water_draws` TEXT DEFAULT NULL,
+  `off_peak_hours` TEXT DEFAULT NULL,
+  `sell_tariffs` TEXT DEFAULT NULL,
+  `updated_at` TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS `system_configuration_client_id` ON `system_configuration` (`client_id`);
+
+CREATE TABLE IF NOT EXISTS `temperatures_reelles` (
+  `mesure_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `chauffe_eau_id` INTEGER DEFAULT NULL REFERENCES `chauffe_eaux` (`chauffe_eau_id`),
+  `temperature` DECIMAL(5,2) DEFAULT NULL,
+  `timestamp_mesure` TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS `temperatures_reelles_chauffe_eau_id` ON `temperatures_reelles` (`chauffe_eau_id`);
+CREATE INDEX IF NOT EXISTS `temperatures_reelles_ce_timestamp_mesure` ON `temperatures_reelles` (`chauffe_eau_id`, `timestamp_mesure`);
+CREATE INDEX IF NOT EXISTS `temperatures_reelles_timestamp_mesure` ON `temperatures_reelles` (`timestamp_mesure`);
+
+CREATE TABLE IF NOT EXISTS `temperatures_agregees` (
+  `agregat_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `chauffe_eau_id` INTEGER DEFAULT NULL REFERENCES `chauffe_eaux` (`chauffe_eau_id`),
+  `debut_periode` DATETIME NOT NULL,
+  `step_min` SMALLINT NOT NULL,
+  `temperature_min` DECIMAL(5,2) DEFAULT NULL,
+  `temperature_moy` DECIMAL(5,2) DEFAULT NULL,
+  `temperature_max` DECIMAL(5,2) DEFAULT NULL,
+  `nb_mesures` INTEGER DEFAULT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS `temperatures_agregees_ce_periode` ON `temperatures_agregees` (`chauffe_eau_id`, `debut_periode`, `step_min`);
+
+CREATE TABLE IF NOT EXISTS `production_agregee` (
+  `agregat_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `client_id` INTEGER DEFAULT NULL REFERENCES `clients` (`client_id`),
+  `debut_periode` DATETIME NOT NULL,
+  `step_min` SMALLINT NOT NULL,
+  `puissance_min_kw` DECIMAL(8,2) DEFAULT NULL,
+  `puissance_moy_kw` DECIMAL(8,2) DEFAULT NULL,
+  `puissance_max_kw` DECIMAL(8,2) DEFAULT NULL,
+  `nb_mesures` INTEGER DEFAULT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS `production_agregee_client_periode` ON `production_agregee` (`client_id`, `debut_periode`, `step_min`);
+
+-- Équivalent de ON UPDATE CURRENT_TIMESTAMP (utilisé par get_configuration_version)
+CREATE TRIGGER IF NOT EXISTS `chauffe_eaux_updated_at` AFTER UPDATE ON `chauffe_eaux`
+WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN
+  UPDATE `chauffe_eaux` SET `updated_at` = datetime('now', 'localtime') WHERE `chauffe_eau_id` = NEW.`chauffe_eau_id`;
+END;
+
+CREATE TRIGGER IF NOT EXISTS `configuration_prediction_updated_at` AFTER UPDATE ON `configuration_prediction`
+WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN
+  UPDATE `configuration_prediction` SET `updated_at` = datetime('now', 'localtime') WHERE `config_id` = NEW.`config_id`;
+END;
+
+CREATE TRIGGER IF NOT EXISTS `system_configuration_updated_at` AFTER UPDATE ON `system_configuration`
+WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN
+  UPDATE `system_configuration` SET `updated_at` = datetime('now', 'localtime') WHERE `config_id` = NEW.`config_id`;
+END;
+
+INSERT OR IGNORE INTO `clients`
+(`client_id`, `nom`, `email`, `latitude`, `longitude`, `tilt`, `azimuth`, `router_id`, `pwd`)
+VALUES
+(1, 'Admin', '', 0, 0, 0.00, 0.00, '',
+'$2b$12$YUs0XL4wLsQk79JLhaJmLuvQZrIkzXdc7vjyZNDINpGFR4gxCUBMy');
@@ -0,0 +1,136 @@
+"""
+sqlite_backend.py
+
+Backend SQLite embarqué pour data.com_bdd (déploiements mono-machine, tests
+hors ligne). Expose une connexion compatible avec l'usage qu'en fait com_bdd
+(DB-API pymysql) :
+
+- paramètres `%s` traduits en `?` (et `%%` en `%`, comme pymysql) ;
+- DATETIME / TIMESTAMP relus en datetime, Decimal écrits en float ;
+- conn.cursor(SSCursor) accepté : un curseur SQLite lit déjà en flux ;
+- mode WAL, clés étrangères actives, schéma data/schema_sqlite.sql appliqué
+  à la première connexion (mêmes tables et index que bdd_v2.sql).
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema_sqlite.sql")
+BUSY_TIMEOUT_S = 10.0
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def _convert_datetime(value):
+    text = value.decode()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+sqlite3.register_adapter(datetime, lambda dt: dt.isoformat(" "))
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter("DATETIME", _convert_datetime)
+sqlite3.register_converter("TIMESTAMP", _convert_datetime)
+
+
+def _translate(sql, params):
+    """Style de paramètres pymysql (%s) -> style SQLite (?)."""
+    if params is None:
+        return sql
+    return sql.replace("%%", "\0").replace("%s", "?").replace("\0", "%")
+
+
+class SQLiteCursor:
+    """Curseur au comportement de pymysql.cursors.Cursor (le sous-ensemble utilisé)."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=None):
+        if params is None:
+            self._cursor.execute(sql)
+        else:
+            self._cursor.execute(_translate(sql, params), tuple(params))
+        return self._cursor.rowcount
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(_translate(sql, ()), [tuple(p) for p in seq_of_params])
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size) if size else self._cursor.fetchmany()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+
+class SQLiteConnection:
+    """Connexion SQLite présentant l'interface pymysql utilisée par com_bdd."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, cursor_class=None):
+        return SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+def init_schema(conn):
+    with open(SCHEMA_FILE, "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+    conn.commit()
+
+
+def connect(path):
+    """Ouvre (et initialise au besoin) la base SQLite `path`."""
+    if not os.path.isabs(path):
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        path = os.path.join(base_dir, path)
+
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_S, detect_types=sqlite3.PARSE_DECLTYPES,
+                           check_same_thread=False)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA synchronous = NORMAL")
+
+    if path not in _initialized:
+        with _init_lock:
+            if path not in _initialized:
+                conn.execute("PRAGMA journal_mode = WAL")  # persistant : une fois suffit
+                init_schema(conn)
+                _initialized.add(path)
+    return SQLiteConnection(conn)
@@ -0,0 +1,128 @@
+#client_config.py
+"""
+Cache « read-through » des configurations clients déjà parsées.
+
+Les lignes chauffe_eaux / system_configuration / configuration_prediction ne
+changent presque jamais : on les lit et on les convertit (parse_comfort_schedule,
+load_water_consumption, tarifs...) une seule fois, puis on sert la version en
+mémoire jusqu'à expiration du TTL ou invalidation par un add_* de data.com_bdd.
+
+Avec VERSION_CHECK = True, chaque lecture compare en plus le jeton de version
+(colonnes updated_at / ids) pour détecter les modifications faites par un
+autre processus.
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from data.cache import TTLCache
+from data.com_bdd import (get_CE_by_client, get_chauffe_eau, get_client,
+                          get_system_configuration_by_client,
+                          get_configuration_prediction_by_chauffe_eau,
+                          get_configuration_version, register_change_hook)
+from logic.utils import load_water_consumption, parse_comfort_schedule
+
+CONFIG_CACHE_TTL_S = 600        # 10 min
+CONFIG_CACHE_MAXSIZE = 10_000   # nombre max de clients gardés en mémoire
+CONFIG_CACHE_NEGATIVE_TTL_S = 60  # client inconnu ou sans chauffe-eau
+VERSION_CHECK = False
+
+CONFIG_CACHE = TTLCache(maxsize=CONFIG_CACHE_MAXSIZE, ttl=CONFIG_CACHE_TTL_S,
+                        negative_ttl=CONFIG_CACHE_NEGATIVE_TTL_S)
+
+
+def load_client_config(client_id):
+    """
+    Lit et convertit la configuration complète d'un client (sans cache).
+    Retourne None si le client n'a pas de chauffe-eau (absence gardée CONFIG_CACHE_NEGATIVE_TTL_S secondes).
+    """
+    id_CE = get_CE_by_client(client_id)
+    if not id_CE:
+        return None
+    data = {"id_CE": id_CE}
+
+    client_row = get_client(client_id)
+    data["router_id"] = client_row.get("router_id") if client_row else None
+
+    system_config = get_system_configuration_by_client(client_id)
+
+    config_prevision = get_configuration_prediction_by_chauffe_eau(id_CE)
+    if config_prevision:
+        data["step_min"] = int(config_prevision[0][2])
+    else:
+        data["step_min"] = 15  # Valeur par défaut
+
+    N = 24 * 60 // data["step_min"]
+
+    if system_config:
+        data.update(system_config)
+        data['minimum_comfort_temperature'] = float(data.get('minimum_comfort_temperature', 50.0))
+        data['cold_water_temperature'] = float(data.get('cold_water_temperature', 12.0))
+        data["tariffs"] = {
+            "contract_type": system_config.get("contract_type", "base"),
+            "tariffs_eur_per_kwh": {
+                "base": float(system_config.get("base_tariff", 0.18)),
+                "hp": float(system_config.get("hp_tariff", 0.18)),
+                "hc": float(system_config.get("hc_tariff", 0.18)),
+                "sell_tariff": float(system_config.get("sell_tariff", 0.1))
+            },
+            "off_peak_hours": system_config.get("off_peak_hours", [])
+        }
+        data['water_consumption'] = load_water_consumption(system_config, data['step_min'])
+        data["comfort_schedule"] = parse_comfort_schedule(system_config, N)
+    else:
+        data["tariffs"] = {
+            "contract_type": "base",
+            "tariffs_eur_per_kwh": {"base": 0.18, "hp": 0.18, "hc": 0.18, "sell_tariff": 0.10},
+            "off_peak_hours": []
+        }
+        data["comfort_schedule"] = [50.0] * N
+        data['water_consumption'] = [0] * N
+
+    data["minimum_comfort_temperature_enabled"] = system_config.get("minimum_comfort_temperature_enabled", False) if system_config else False
+
+    water_heater_data = get_chauffe_eau(id_CE)
+    if water_heater_data:
+        water_heater_data['puissance_kw'] = float(water_heater_data['puissance_kw'])
+        water_heater_data['capacite_litres'] = int(water_heater_data['capacite_litres'])
+        data["water_heater"] = water_heater_data
+
+    return data
+
+
+def get_client_config(client_id, version_check=None):
+    """
+    Retourne la configuration parsée d'un client depuis le cache.
+    Le dictionnaire retourné est partagé : le copier avant de le modifier.
+    """
+    if version_check is None:
+        version_check = VERSION_CHECK
+    return CONFIG_CACHE.get_or_load(
+        int(client_id),
+        load_client_config,
+        version=get_configuration_version if version_check else None,
+    )
+
+
+def invalidate_client_config(client_id=None):
+    """Invalide la configuration d'un client (ou de tous si client_id est None)."""
+    if client_id is None:
+        CONFIG_CACHE.clear()
+    else:
+        CONFIG_CACHE.invalidate(int(client_id))
+
+
+def config_cache_stats():
+    return CONFIG_CACHE.stats()
+
+
+def _on_change(table, client_id=None, chauffe_eau_id=None, **_):
+    if table not in ("clients", "chauffe_eaux", "system_configuration", "configuration_prediction"):
+        return
+    if client_id is not None:
+        CONFIG_CACHE.invalidate(int(client_id))
+    elif chauffe_eau_id is not None:
+        CONFIG_CACHE.invalidate_where(lambda _, cfg: cfg is not None and cfg.get("id_CE") == chauffe_eau_id)
+
+
+register_change_hook(_on_change)
@@ -2,89 +2,41 @@
 
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from data.com_bdd import ( get_connection,get_CE_by_client, get_chauffe_eau,
-                         get_system_configuration_by_client, get_latest_temperature_by_client,
-                         get_configuration_prediction_by_chauffe_eau, get_previsions_by_client, add_decision)
+from data.com_bdd import get_latest_temperature_by_client, add_decision
+from logic.client_config import get_client_config
+from logic.pv_series import get_pv_slice
+from logic.nowcast import apply_nowcast
 from logic.optimizer.milp_solver import milp_analysis
-import json
-from datetime import datetime
-from utils import load_water_consumption, distribution_to_series, parse_comfort_schedule, verif
+from data.router_state import ROUTER_STATE
+from datetime import datetime, timedelta
 
 class Client:
     def __init__(self, client_id):
         self.client_id = client_id
-        self.data = {}
-        self.id_CE = get_CE_by_client(client_id)
-        system_config = get_system_configuration_by_client(client_id)
+        # Configuration parsée servie par le cache (copie : self.data est enrichi par la suite)
+        self.data = dict(get_client_config(client_id) or {})
+        self.id_CE = self.data.pop("id_CE", None)
 
-   
-        config_prevision = get_configuration_prediction_by_chauffe_eau(self.id_CE)
-        if config_prevision:
-            self.config = config_prevision
-            config = config_prevision[0]
-            self.data["step_min"] = int(config[2])
-        else:
-            self.data["step_min"] = 15  # Valeur par défaut
-
-        if system_config:
-            self.data.update(system_config)
-            self.data['minimum_comfort_temperature'] = float(self.data.get('minimum_comfort_temperature', 50.0))
-            self.data['cold_water_temperature'] = float(self.data.get('cold_water_temperature', 12.0))
-            self.data["tariffs"] = {
-                "contract_type": system_config.get("contract_type", "base"),
-                "tariffs_eur_per_kwh": {
-                    "base": float(system_config.get("base_tariff", 0.18)),
-                    "hp": float(system_config.get("hp_tariff", 0.18)),
-                    "hc": float(system_config.get("hc_tariff", 0.18)),
-                    "sell_tariff": float(system_config.get("sell_tariff", 0.1))
-                },
-                "off_peak_hours": system_config.get("off_peak_hours", [])
-            }
-
-       
-            water_consumption = load_water_consumption(system_config, self.data['step_min'])
-            self.data['water_consumption'] = water_consumption
-
-      
-            N = 24 * 60 // self.data["step_min"]
-            self.data["comfort_schedule"] = parse_comfort_schedule(system_config, N)
-        else:
-            self.data["tariffs"] = {
-                "contract_type": "base",
-                "tariffs_eur_per_kwh": {"base": 0.18, "hp": 0.18, "hc": 0.18, "sell_tariff": 0.10},
-                "off_peak_hours": []
-            }
-         
-            N = 24 * 60 // self.data["step_min"]
-            self.data["comfort_schedule"] = [50.0] * N
-            self.data['water_consumption'] = [0] * N
-
-        self.data["minimum_comfort_temperature_enabled"] = system_config.get("minimum_comfort_temperature_enabled", False) if system_config else False
-
-        water_heater_data = get_chauffe_eau(self.id_CE)
-        if water_heater_data:
-            water_heater_data['puissance_kw'] = float(water_heater_data['puissance_kw'])
-            water_heater_data['capacite_litres'] = int(water_heater_data['capacite_litres'])
-            self.data["water_heater"] = water_heater_data
-
-        temp_data = get_latest_temperature_by_client(client_id)
+        # Dernières mesures du routeur tenues par le récepteur MQTT (cf. data/router_state.py) ;
+        # la BDD n'est lue que si ce processus n'a encore rien reçu pour ce client
+        temp_data = ROUTER_STATE.latest_temperature(client_id) or get_latest_temperature_by_client(client_id)
         self.data["t0"] = float(temp_data[0]) if temp_data else 50.0
+        self.pv_now = ROUTER_STATE.latest_pv(client_id)
 
     def _load_pv_production(self, start_time):
-        pv_previsions = get_previsions_by_client(self.client_id)
-        N = 24 * 60 // self.data["step_min"]
-        
-        if pv_previsions:
-            
-            start_hour = start_time.hour
-            start_index = start_hour * (60 // self.data["step_min"])
-            
-            pv_series = [float(p[2]) for p in pv_previsions]
-            
-            aligned_pv = pv_series[start_index:] + pv_series[:start_index]
-            self.data["pv_production"] = aligned_pv[:N]
-        else:
-            self.data["pv_production"] = [0.0] * N
+        """
+        Tranche alignée de la série PV déjà rééchantillonnée à step_min (cf. logic/pv_series.py),
+        corrigée par les mesures récentes de production (cf. logic/nowcast.py).
+        Le créneau en cours prend la puissance mesurée si elle date de moins d'un créneau.
+        """
+        step_min = self.data["step_min"]
+        N = 24 * 60 // step_min
+        pv_production = get_pv_slice(self.client_id, start_time, N, step_min)
+        measured_at = self.pv_now[1] if self.pv_now else None
+        pv_production = apply_nowcast(self.client_id, start_time, pv_production, step_min, measured_at)
+        if measured_at is not None and start_time - measured_at <= timedelta(minutes=step_min):
+            pv_production[0] = max(0.0, float(self.pv_now[0]))
+        self.data["pv_production"] = pv_production
 
 def process_client(client_id) -> None:
     try:
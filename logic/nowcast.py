@@ -0,0 +1,152 @@
+#nowcast.py
+"""
+Correction intrajournalière (nowcast) des prévisions PV à partir de production_reelle.
+
+Les prévisions ne sont rafraîchies que toutes les `frequency` heures alors que
+la production mesurée arrive en continu. Pour chaque client on tient, en O(1)
+par mesure, deux moyennes mobiles exponentielles de l'écart mesure / prévision :
+
+- scale : rapport mesure / prévision (quand la prévision est significative) ;
+- bias  : écart restant mesure - scale * prévision (kW).
+
+Avant chaque résolution, la correction est appliquée aux créneaux restants
+avec un poids qui décroît avec l'échéance (exp(-échéance / TAU)) : l'erreur
+observée renseigne surtout sur les prochaines heures. Aucune donnée météo
+n'est re-téléchargée.
+
+Les mesures arrivent par le hook de add_production / add_productions (même
+processus, un appel par client et par lot inséré) ou, à défaut, sont relues
+en BDD à partir de la dernière mesure déjà intégrée.
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import math
+import threading
+from datetime import datetime, timedelta
+
+from data.com_bdd import iter_production_by_client, register_change_hook
+from logic.client_config import get_client_config
+from logic.pv_series import get_pv_series
+
+ALPHA = 0.2                     # poids d'une nouvelle mesure dans les moyennes
+MIN_FORECAST_KW = 0.05          # en dessous, la mesure ne renseigne pas le rapport
+SCALE_BOUNDS = (0.2, 2.0)
+TAU = timedelta(hours=2)        # décroissance de la correction avec l'échéance
+MAX_AGE = timedelta(hours=1)    # plus de correction si la dernière mesure est plus ancienne
+WARMUP = timedelta(hours=2)     # historique relu en BDD pour un client encore inconnu
+
+
+class NowcastState:
+    __slots__ = ("scale", "bias", "last_time", "n")
+
+    def __init__(self):
+        self.scale = 1.0
+        self.bias = 0.0
+        self.last_time = None
+        self.n = 0
+
+    def update(self, forecast_kw, measured_kw):
+        """Intègre une mesure (O(1))."""
+        if forecast_kw >= MIN_FORECAST_KW:
+            ratio = min(max(measured_kw / forecast_kw, SCALE_BOUNDS[0]), SCALE_BOUNDS[1])
+            self.scale += ALPHA * (ratio - self.scale)
+        self.bias += ALPHA * (measured_kw - self.scale * forecast_kw - self.bias)
+        self.n += 1
+
+
+_states = {}
+_lock = threading.Lock()
+
+
+def _as_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _step_min(client_id):
+    config = get_client_config(client_id)
+    return int(config["step_min"]) if config else 15
+
+
+def observe(client_id, measured_at, measured_kw, step_min=None):
+    """Intègre une mesure de production ; ignorée si déjà vue ou hors prévision."""
+    observe_many(client_id, [(measured_at, measured_kw)], step_min)
+
+
+def observe_many(client_id, measures, step_min=None):
+    """
+    Intègre un lot de mesures [(instant, kW), ...] d'un client : une seule lecture
+    de la série de prévision pour tout le lot. Les mesures déjà vues sont ignorées.
+    """
+    measures = sorted((_as_datetime(t), kw) for t, kw in measures if kw is not None)
+    if not measures:
+        return
+    series = get_pv_series(client_id, step_min or _step_min(client_id))
+    with _lock:
+        state = _states.setdefault(int(client_id), NowcastState())
+        for measured_at, measured_kw in measures:
+            if state.last_time is not None and measured_at <= state.last_time:
+                continue
+            state.last_time = measured_at
+            forecast = series.value_at(measured_at) if series is not None else None
+            if forecast is not None:
+                state.update(forecast, float(measured_kw))
+
+
+def catch_up(client_id, now=None, step_min=None):
+    """Relit en BDD les mesures postérieures à la dernière intégrée (écrites par un autre processus)."""
+    now = now or datetime.now()
+    with _lock:
+        state = _states.get(int(client_id))
+        since = state.last_time if state is not None and state.last_time is not None else now - WARMUP
+    observe_many(client_id, iter_production_by_client(client_id, start=since), step_min)
+
+
+def apply_nowcast(client_id, start_time, pv_production, step_min, latest_measure=None):
+    """
+    Corrige la série pv_production (créneaux de step_min à partir de start_time).
+    Retourne la série inchangée sans mesure récente.
+
+    latest_measure : instant de la dernière mesure connue (état routeur) ; si elle est
+    déjà intégrée, la relecture en BDD est inutile.
+    """
+    with _lock:
+        state = _states.get(int(client_id))
+        up_to_date = (latest_measure is not None and state is not None and state.last_time is not None
+                      and state.last_time >= latest_measure)
+    if not up_to_date:
+        catch_up(client_id, start_time, step_min)
+    with _lock:
+        state = _states.get(int(client_id))
+        if state is None or state.n == 0 or state.last_time is None or start_time - state.last_time > MAX_AGE:
+            return pv_production
+        scale, bias = state.scale, state.bias
+
+    decay = math.exp(-step_min * 60 / TAU.total_seconds())
+    weight = 1.0
+    corrected = []
+    for forecast in pv_production:
+        correction = (scale - 1.0) * forecast + (bias if forecast > 0 else 0.0)
+        corrected.append(max(0.0, forecast + weight * correction))
+        weight *= decay
+    return corrected
+
+
+def nowcast_state(client_id):
+    """(scale, bias, dernière mesure, nombre de mesures) ou None."""
+    with _lock:
+        state = _states.get(int(client_id))
+        return None if state is None else (state.scale, state.bias, state.last_time, state.n)
+
+
+def _on_change(table, client_id=None, puissance_kw=None, heure_production=None, productions=None, **_):
+    if table != "production_reelle" or client_id is None:
+        return
+    if productions is not None:
+        observe_many(client_id, productions)
+    elif puissance_kw is not None:
+        observe(client_id, heure_production, puissance_kw)
+
+
+register_change_hook(_on_change)
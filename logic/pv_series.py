@@ -0,0 +1,123 @@
+#pv_series.py
+"""
+Séries de production PV prêtes pour l'optimiseur.
+
+Les prévisions de previsions_production sont rééchantillonnées une seule
+fois sur la grille step_min du client (tableau float32 compact, début
+aligné sur un créneau) :
+
+- à l'ingestion : add_previsions_production notifie les nouvelles lignes et
+  la série du client est reconstruite immédiatement (même processus) ;
+- sinon à la première lecture, depuis la BDD (dernière prévision par heure).
+
+Chaque résolution ne fait plus qu'extraire une tranche [début, début + N[.
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from data.cache import TTLCache
+from data.com_bdd import get_latest_previsions, register_change_hook
+from logic.client_config import get_client_config
+
+PV_CACHE_TTL_S = 900            # 15 min : borne la latence si la météo tourne dans un autre processus
+PV_CACHE_MAXSIZE = 10_000
+PV_CACHE_NEGATIVE_TTL_S = 60    # client sans prévision : pas de relecture BDD à chaque mesure
+HISTORY = timedelta(days=1)     # prévisions relues en BDD avant l'instant courant
+
+PV_CACHE = TTLCache(maxsize=PV_CACHE_MAXSIZE, ttl=PV_CACHE_TTL_S, negative_ttl=PV_CACHE_NEGATIVE_TTL_S)
+
+
+class PVSeries:
+    """Production prévue (kW) par créneau de step_min à partir de `start`."""
+
+    __slots__ = ("start", "step_min", "values")
+
+    def __init__(self, start, step_min, values):
+        self.start = start          # datetime64[s], aligné sur un créneau
+        self.step_min = step_min
+        self.values = values        # np.float32, un point par créneau
+
+    def slice(self, start_time, n_slots):
+        """Tranche de n_slots valeurs à partir du créneau de start_time (0 hors prévision)."""
+        first = int((np.datetime64(align_to_slot(start_time, self.step_min), "s") - self.start)
+                    // np.timedelta64(self.step_min * 60, "s"))
+        out = np.zeros(n_slots, dtype=np.float32)
+        lo, hi = max(first, 0), min(first + n_slots, len(self.values))
+        if lo < hi:
+            out[lo - first:hi - first] = self.values[lo:hi]
+        return out
+
+    def value_at(self, dt):
+        """Valeur interpolée à l'instant dt, None hors prévision."""
+        position = (np.datetime64(dt, "s") - self.start) / np.timedelta64(self.step_min * 60, "s")
+        if position < 0 or position > len(self.values) - 1:
+            return None
+        i = int(position)
+        if i == len(self.values) - 1:
+            return float(self.values[i])
+        frac = position - i
+        return float(self.values[i] * (1 - frac) + self.values[i + 1] * frac)
+
+
+def align_to_slot(dt, step_min):
+    """Début du créneau de step_min contenant dt (même arrondi que milp_analysis)."""
+    dt = dt.replace(second=0, microsecond=0)
+    return dt - timedelta(minutes=dt.minute % step_min)
+
+
+def build_pv_series(previsions, step_min):
+    """
+    [(heure_prevision, kW), ...] (datetime ou texte ISO, triés) -> PVSeries sur la grille step_min
+    (interpolation linéaire entre deux prévisions). Retourne None sans prévision.
+    """
+    if not previsions:
+        return None
+    times = np.array([t for t, _ in previsions], dtype="datetime64[s]")
+    kw = np.array([float(v) for _, v in previsions])
+    order = np.argsort(times, kind="stable")
+    times, kw = times[order], kw[order]
+
+    step = np.timedelta64(step_min * 60, "s")
+    start = np.datetime64(align_to_slot(times[0].astype(datetime), step_min), "s")
+    grid = np.arange(start, times[-1] + np.timedelta64(1, "s"), step)
+    values = np.interp(grid.astype(np.int64), times.astype(np.int64), kw).astype(np.float32)
+    return PVSeries(start, step_min, values)
+
+
+def _client_step(client_id):
+    config = get_client_config(client_id)
+    return int(config["step_min"]) if config else 15
+
+
+def get_pv_series(client_id, step_min):
+    """Série du client sur la grille step_min (cache, sinon relue en BDD)."""
+    def load(_key):
+        since = (datetime.now() - HISTORY).strftime("%Y-%m-%d %H:%M:%S")
+        return build_pv_series(get_latest_previsions(client_id, since), step_min)
+
+    return PV_CACHE.get_or_load((int(client_id), int(step_min)), load)
+
+
+def get_pv_slice(client_id, start_time, n_slots, step_min):
+    """Production prévue (liste de kW) des n_slots créneaux à partir de start_time."""
+    series = get_pv_series(client_id, step_min)
+    if series is None:
+        return [0.0] * n_slots
+    return series.slice(start_time, n_slots).tolist()
+
+
+def _on_change(table, client_id=None, previsions=None, **_):
+    if table != "previsions_production" or client_id is None:
+        return
+    PV_CACHE.invalidate_where(lambda key, _: key[0] == int(client_id))
+    if previsions:
+        step_min = _client_step(client_id)
+        PV_CACHE.set((int(client_id), step_min), build_pv_series(previsions, step_min))
+
+
+register_change_hook(_on_change)
@@ -109,7 +109,6 @@ def parse_comfort_schedule(system_config, N):
     return comfort_schedule
 
 import json
-import matplotlib.pyplot as plt
 import numpy as np
 def verif(data, metrics,T_values, u_values=None,):
     """
@@ -118,6 +117,7 @@ def verif(data, metrics,T_values, u_values=None,):
     metrics : dictionnaire retourné par calculate_detailed_metrics
     u_values : liste des décisions (0/1) du MILP (optionnel si dans metrics)
     """
+    import matplotlib.pyplot as plt  # import local : inutile hors débogage
 
 
 
@@ -9,26 +9,35 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from data.com_bdd import get_client_ids
+from data.maintenance import load_maintenance_config, run_maintenance
 from mqtt_receive.main_receive import receive as mqtt_receive_main
 from mqtt_send.main_send import send as mqtt_send_main
 from weather.weather_main import main_weather
+from weather.refresh_scheduler import RefreshScheduler
 from logic.decision_engine import process_all_clients
 
-from config_weather_loader import config_weather_loader
+from config_weather_loader import config_weather_loader, load_weather_fetch_config
 from optimizer_config_loader import config_optimizer_loader
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 FREQ_SECONDS = config_weather_loader(BASE_DIR / "config")
 STEP_MINUTES = config_optimizer_loader(BASE_DIR / "config")
+MAINTENANCE_CONFIG = load_maintenance_config()
+REFRESH_TICK_S = load_weather_fetch_config(BASE_DIR / "config")["refresh_tick_s"]
+WEATHER_SCHEDULER = RefreshScheduler(FREQ_SECONDS, REFRESH_TICK_S)
 
 def start_mqtt_services():
     threading.Thread(target=mqtt_receive_main, name="MQTT-RX", daemon=True).start()
     threading.Thread(target=mqtt_send_main, name="MQTT-TX", daemon=True).start()
 
-def weather_job():
-    print(f"[{time.strftime('%H:%M:%S')}] Début tâche météo")
-    main_weather()
+def weather_tick_job():
+    """Rafraîchit la tranche de clients due à ce tick (cf. weather/refresh_scheduler.py)."""
+    client_ids = WEATHER_SCHEDULER.select()
+    if not client_ids:
+        return
+    print(f"[{time.strftime('%H:%M:%S')}] Début tâche météo ({len(client_ids)} clients)")
+    main_weather(client_ids, deadline=WEATHER_SCHEDULER.tick_s)
     print(f"[{time.strftime('%H:%M:%S')}] Fin tâche météo")
 
 def optimization_job():
@@ -36,17 +45,23 @@ def optimization_job():
     process_all_clients()
     print(f"[{time.strftime('%H:%M:%S')}] Fin optimisation clients")
 
+def maintenance_job():
+    print(f"[{time.strftime('%H:%M:%S')}] Début maintenance BDD")
+    run_maintenance(MAINTENANCE_CONFIG)
+    print(f"[{time.strftime('%H:%M:%S')}] Fin maintenance BDD")
+
 def setup_schedule():
-    schedule.every(FREQ_SECONDS).seconds.do(weather_job)
+    schedule.every(REFRESH_TICK_S).seconds.do(weather_tick_job)
     schedule.every(STEP_MINUTES).minutes.do(optimization_job)
+    schedule.every().day.at(MAINTENANCE_CONFIG["run_at"]).do(maintenance_job)
     
     print("Lancement initial des tâches...")
-    weather_job()
+    weather_tick_job()
     optimization_job()
 
 def main():
     print("Démarrage du système OptimaSol...")
-    print(f"Configuration: Météo={FREQ_SECONDS}s, Optimisation={STEP_MINUTES}min")
+    print(f"Configuration: Météo={FREQ_SECONDS}s (tick {REFRESH_TICK_S}s), Optimisation={STEP_MINUTES}min")
     
     start_mqtt_services()
     setup_schedule()
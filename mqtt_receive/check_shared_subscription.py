@@ -0,0 +1,143 @@
+"""
+check_shared_subscription.py
+
+End-to-end check of the multi-consumer receiver against a real broker with
+MQTT v5 shared subscriptions (mosquitto >= 1.6):
+
+    mosquitto -p 1883 &
+    python -m mqtt_receive.check_shared_subscription --host localhost --consumers 3 --messages 600
+
+Starts ``consumers`` processes that subscribe through the receiver's own
+``start_mqtt_client`` on ``$share/<group>/+/DATA``. Each one counts the DATA
+messages it gets instead of ingesting them. The check then publishes
+``messages`` DATA messages from ``routers`` distinct routers. It verifies
+that every message was delivered exactly once and that the broker spread
+them over several consumers.
+
+Exit code: 0 on success, 1 on failure, 2 when no broker is reachable
+(the check is skipped).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import sys
+import time
+from collections import Counter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import paho.mqtt.client as mqtt
+
+from mqtt_receive.mqtt_client import start_mqtt_client
+
+READY_TIMEOUT_S = 10
+
+
+class _CountingSink:
+    """Stands in for the ingestion pipeline: records the sequence number of each DATA message."""
+
+    def __init__(self):
+        self.seen = Counter()
+
+    def submit(self, router_id, payload):
+        self.seen[json.loads(payload)["seq"]] += 1
+
+
+def _consumer(config, index, group, events, stop):
+    sink = _CountingSink()
+    client = start_mqtt_client(config, sink, shared_group=group, client_id=f"{group}-{index}")
+    client.on_subscribe = lambda *args: events.put(("ready", index))
+    client.loop_start()
+    stop.wait()
+    client.loop_stop()
+    client.disconnect()
+    events.put(("seen", index, dict(sink.seen)))
+
+
+def _broker_reachable(host, port):
+    try:
+        socket.create_connection((host, port), timeout=2).close()
+        return True
+    except OSError:
+        return False
+
+
+def run_check(host="localhost", port=1883, consumers=3, messages=600, routers=50, group="optimasol-check",
+              settle_s=2.0):
+    """Returns True if every message reached exactly one consumer and several consumers got some."""
+    config = {"host": host, "port": port}
+    events = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    processes = [multiprocessing.Process(target=_consumer, args=(config, i, group, events, stop), daemon=True)
+                 for i in range(consumers)]
+    for process in processes:
+        process.start()
+    try:
+        ready = set()
+        deadline = time.monotonic() + READY_TIMEOUT_S
+        while len(ready) < consumers:
+            try:
+                ready.add(events.get(timeout=max(0.0, deadline - time.monotonic()))[1])
+            except queue.Empty:
+                print(f"[CHECK] Only {len(ready)}/{consumers} consumers subscribed")
+                return False
+
+        publisher = mqtt.Client(client_id=f"{group}-publisher")
+        publisher.connect(host, port)
+        publisher.loop_start()
+        infos = [publisher.publish(f"CHECK{seq % routers:04d}/DATA",
+                                   json.dumps({"seq": seq, "temperature": 50.0, "timestamp": time.time()}), qos=1)
+                 for seq in range(messages)]
+        for info in infos:
+            info.wait_for_publish()
+        publisher.loop_stop()
+        publisher.disconnect()
+        time.sleep(settle_s)
+    finally:
+        stop.set()
+
+    per_consumer, total = {}, Counter()
+    for _ in range(consumers):
+        try:
+            _, index, seen = events.get(timeout=READY_TIMEOUT_S)
+        except queue.Empty:
+            break
+        per_consumer[index] = sum(seen.values())
+        total.update(seen)
+    for process in processes:
+        process.join(5)
+
+    missing = [seq for seq in range(messages) if seq not in total]
+    duplicated = [seq for seq, count in total.items() if count > 1]
+    active = sum(1 for count in per_consumer.values() if count)
+    print(f"[CHECK] messages per consumer: {dict(sorted(per_consumer.items()))}")
+    print(f"[CHECK] {messages} published, {len(missing)} missing, {len(duplicated)} delivered more than once")
+    ok = not missing and not duplicated and (active > 1 or consumers == 1)
+    if active <= 1 < consumers:
+        print("[CHECK] The broker did not split the messages: shared subscriptions not supported?")
+    print(f"[CHECK] {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--consumers", type=int, default=3)
+    parser.add_argument("--messages", type=int, default=600)
+    parser.add_argument("--routers", type=int, default=50)
+    parser.add_argument("--group", default="optimasol-check")
+    args = parser.parse_args()
+    if not _broker_reachable(args.host, args.port):
+        print(f"[CHECK] No MQTT broker at {args.host}:{args.port}, check skipped")
+        sys.exit(2)
+    ok = run_check(args.host, args.port, args.consumers, args.messages, args.routers, args.group)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""
+ingestion.py
+
+Buffered telemetry ingestion for the MQTT receiver.
+
+paho's ``on_message`` runs on the network thread: any slow work there delays
+keep-alives and the broker eventually drops the connection. The callback
+therefore only calls ``IngestionPipeline.submit``, which puts the raw
+payload on a bounded in-memory queue and returns immediately. Worker
+threads drain the queue, decode the payloads (mqtt_receive/decoder.py),
+resolve their routers from the in-memory map (data/router_map.py) and
+insert them in batches into ``temperatures_reelles`` and
+``production_reelle`` every ``batch_size`` messages or ``flush_ms``
+milliseconds, whichever comes first.
+
+When the queue is full, ``overflow_policy`` decides what happens:
+
+- ``drop_oldest``: discard the oldest queued message (freshest data wins);
+- ``drop_newest``: discard the incoming message;
+- ``spill``: append the message to a file in ``spill_dir``; spilled files
+  are replayed by the workers when the queue is idle.
+
+Each table is inserted on its own. When an insert fails (database down,
+no connection), the rows of that table are written to ``spill_dir`` too
+and retried every ``SPILL_RETRY_S`` seconds while the queue is idle,
+whatever the overflow policy. A message that cannot be converted is
+counted and skipped, and errors never stop a worker.
+
+Each decoded message also updates the latest-state store
+(data/router_state.py) read by the optimizer.
+
+Backpressure metrics (queue depth, drops, spills, flush latency...) are
+available from ``stats()`` and logged every ``report_s`` seconds.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from data.com_bdd import add_productions, add_temperatures
+from data.router_map import ROUTER_MAP, RouterMap
+from data.router_state import ROUTER_STATE, RouterStateStore
+from mqtt_receive.decoder import PayloadError, decode_payload
+
+DEFAULTS = {
+    "queue_size": 100_000,
+    "batch_size": 500,
+    "flush_ms": 200,
+    "workers": 2,
+    "overflow_policy": "drop_oldest",
+    "spill_dir": "cache/spill",
+    "report_s": 60,
+}
+POLICIES = ("drop_oldest", "drop_newest", "spill")
+SPILL_SUFFIX = ".jsonl"
+CLAIM_SUFFIX = ".replaying"
+SPILL_RETRY_S = 5  # idle delay between two looks at spill_dir when nothing was left to replay
+
+# (router_id, raw payload, reception time)
+Message = Tuple[str, bytes, float]
+
+
+class IngestionPipeline:
+    def __init__(self, queue_size: int = DEFAULTS["queue_size"], batch_size: int = DEFAULTS["batch_size"],
+                 flush_ms: int = DEFAULTS["flush_ms"], workers: int = DEFAULTS["workers"],
+                 overflow_policy: str = DEFAULTS["overflow_policy"], spill_dir: str = DEFAULTS["spill_dir"],
+                 report_s: float = DEFAULTS["report_s"], name: str = "ingest",
+                 state: RouterStateStore = ROUTER_STATE, router_map: RouterMap = ROUTER_MAP,
+                 reporter: Optional[Callable[[Dict[str, Any]], None]] = None):
+        if overflow_policy not in POLICIES:
+            raise ValueError(f"Invalid overflow_policy {overflow_policy!r} (expected one of {POLICIES})")
+        self.queue: "queue.Queue[Message]" = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_s = flush_ms / 1000
+        self.n_workers = workers
+        self.overflow_policy = overflow_policy
+        self.spill_dir = spill_dir
+        self.report_s = report_s
+        self.name = name
+        self.state = state
+        self.router_map = router_map
+        self.reporter = reporter
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._spill_lock = threading.Lock()
+        self._spill_file = None
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys((
+            "received", "dropped", "spilled", "replayed", "parse_errors", "unknown_routers", "unknown_heaters",
+            "temperatures", "productions", "batches", "db_errors", "rows_spilled", "rows_retried",
+            "message_errors", "worker_errors"), 0)
+        self._malformed = Counter()
+        self._max_depth = 0
+        self._flush_time_s = 0.0
+        self._started_at = time.monotonic()
+        self._inserters = {"temperatures": add_temperatures, "productions": add_productions}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], name: str = "ingest", **kwargs) -> "IngestionPipeline":
+        """Build a pipeline from the receiver config (missing keys take DEFAULTS)."""
+        options = {}
+        for key, default in DEFAULTS.items():
+            value = config.get(key, default)
+            try:
+                options[key] = type(default)(value) if value != "" else default
+            except ValueError:
+                raise ValueError(f"Invalid value for '{key}': {value!r}")
+        return cls(name=name, **options, **kwargs)
+
+    # --- producer side (paho network thread) ---------------------------------
+
+    def submit(self, router_id: str, payload: bytes) -> None:
+        """Queue a message without blocking; applies the overflow policy when full."""
+        message = (router_id, payload, time.time())
+        self._count("received")
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self._overflow(message)
+        depth = self.queue.qsize()
+        if depth > self._max_depth:
+            self._max_depth = depth
+
+    def _overflow(self, message: Message) -> None:
+        if self.overflow_policy == "spill":
+            self._spill(message)
+            return
+        if self.overflow_policy == "drop_oldest":
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(message)
+            except queue.Full:
+                pass
+        self._count("dropped")
+
+    def _spill(self, message: Message) -> None:
+        router_id, payload, received_at = message
+        self._spill_line(json.dumps({"r": router_id, "p": payload.decode("utf-8", "replace"), "t": received_at}))
+        self._count("spilled")
+
+    def _spill_rows(self, table: str, rows: List[tuple]) -> None:
+        """Keep the rows of a failed insert for a later retry (same files as spilled messages)."""
+        try:
+            self._spill_line(json.dumps({"k": table, "rows": rows}))
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[ERROR] {len(rows)} {table} rows lost, could not spill them: {e}")
+            return
+        self._count("rows_spilled", len(rows))
+
+    def _spill_line(self, line: str) -> None:
+        with self._spill_lock:
+            if self._spill_file is None:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                path = os.path.join(self.spill_dir, f"{self.name}-{os.getpid()}-{int(time.time())}{SPILL_SUFFIX}")
+                self._spill_file = open(path, "a", encoding="utf-8")
+            self._spill_file.write(line + "\n")
+
+    # --- consumer side ---------------------------------------------------------
+
+    def start(self) -> "IngestionPipeline":
+        self._recover_claims()
+        for i in range(self.n_workers):
+            thread = threading.Thread(target=self._run, args=(i,), name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Flush what is queued, then stop the workers."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self._spill_lock:
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+
+    def _run(self, worker: int) -> None:
+        batch: List[Message] = []
+        deadline = time.monotonic() + self.flush_s
+        next_report = time.monotonic() + self.report_s
+        next_replay = time.monotonic()
+        while not (self._stop.is_set() and self.queue.empty()):
+            try:
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    pass
+                now = time.monotonic()
+                if len(batch) >= self.batch_size or now >= deadline:
+                    if batch:
+                        batch, pending = [], batch
+                        self.flush(pending)
+                    elif now >= next_replay:
+                        # Idle: replay right away while files are left, otherwise look again later
+                        next_replay = now if self._replay_spill() else now + SPILL_RETRY_S
+                    deadline = time.monotonic() + self.flush_s
+                if worker == 0 and self.report_s and now >= next_report:
+                    self._report()
+                    next_report = now + self.report_s
+            except Exception as e:
+                # Never let one bad batch kill the worker: the queue would stall
+                self._count("worker_errors")
+                print(f"[ERROR] Ingestion worker {self.name}-{worker}: {e!r}")
+                deadline = time.monotonic() + self.flush_s
+        if batch:
+            self.flush(batch)
+
+    def flush(self, batch: List[Message]) -> None:
+        """Decode a batch and insert it with one statement per table."""
+        started = time.monotonic()
+        parsed = []
+        for router_id, payload, received_at in batch:
+            try:
+                parsed.append((router_id, decode_payload(payload, received_at)))
+            except PayloadError as e:
+                self._malformed_payload(e.reason)
+
+        ids = self.router_map.resolve({router_id for router_id, _ in parsed}) if parsed else {}
+        temperatures, productions = [], []
+        for router_id, (measured_at, temperature, pv_power) in parsed:
+            client_id, ce_id = ids.get(router_id, (None, None))
+            if client_id is None:
+                self._count("unknown_routers")
+                continue
+            try:
+                self.state.update(router_id, client_id, ce_id, measured_at, temperature, pv_power)
+                ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(measured_at))
+            except (OverflowError, OSError, ValueError, TypeError) as e:
+                self._count("message_errors")
+                print(f"[ERROR] Skipping message from {router_id}: {e}")
+                continue
+            if temperature is not None:
+                if ce_id is None:
+                    # Router registered but its heater is not known yet: the reading is lost
+                    self._count("unknown_heaters")
+                else:
+                    temperatures.append((ce_id, temperature, ts))
+            if pv_power is not None:
+                productions.append((client_id, pv_power, ts))
+
+        # Independent inserts: a failed temperature insert must not lose the productions
+        self._insert("temperatures", temperatures)
+        self._insert("productions", productions)
+        with self._lock:
+            self._counters["batches"] += 1
+            self._flush_time_s += time.monotonic() - started
+
+    def _insert(self, table: str, rows: List[tuple]) -> bool:
+        """Insert rows into one table; on failure spill them for a retry. Returns True on success."""
+        if not rows:
+            return True
+        try:
+            inserted = self._inserters[table](rows)
+            error = "no database connection" if inserted != len(rows) else None
+        except Exception as e:
+            error = e
+        if error is None:
+            self._count(table, inserted)
+            return True
+        self._count("db_errors")
+        print(f"[ERROR] Insert of {len(rows)} {table} rows failed ({error}), spilling them for a retry")
+        self._spill_rows(table, rows)
+        return False
+
+    def _recover_claims(self) -> None:
+        """Put back the files this pipeline was replaying when its process died."""
+        if not os.path.isdir(self.spill_dir):
+            return
+        suffix = f".{self.name}{CLAIM_SUFFIX}"
+        for name in os.listdir(self.spill_dir):
+            if name.endswith(suffix):
+                path = os.path.join(self.spill_dir, name)
+                try:
+                    os.replace(path, path[:-len(suffix)])
+                except OSError as e:
+                    print(f"[ERROR] Could not recover spill file {path}: {e}")
+
+    def _replay_spill(self) -> bool:
+        """Claim one spilled file and ingest it; returns True if a file was replayed without a failed insert."""
+        if not os.path.isdir(self.spill_dir):
+            return False
+        with self._spill_lock:
+            if self._spill_file is not None:
+                # The queue is idle: rotate the file being written so it can be replayed
+                self._spill_file.close()
+                self._spill_file = None
+        for name in sorted(os.listdir(self.spill_dir)):
+            path = os.path.join(self.spill_dir, name)
+            if not name.endswith(SPILL_SUFFIX):
+                continue
+            claimed = f"{path}.{self.name}{CLAIM_SUFFIX}"
+            try:
+                os.replace(path, claimed)
+            except OSError:
+                continue  # claimed by another worker
+            try:
+                # Read the whole file before ingesting anything: a read error leaves nothing half replayed
+                with open(claimed, "r", encoding="utf-8") as f:
+                    lines = f.readlines()
+            except OSError as e:
+                print(f"[ERROR] Could not read spill file {claimed}: {e}")
+                os.replace(claimed, path)
+                return False
+            with self._lock:
+                db_errors = self._counters["db_errors"]
+            self._replay_lines(lines)
+            os.remove(claimed)
+            with self._lock:
+                # Database still failing: wait SPILL_RETRY_S instead of replaying the re-spilled rows at once
+                return self._counters["db_errors"] == db_errors
+        return False
+
+    def _replay_lines(self, lines: List[str]) -> None:
+        # Failed inserts are spilled again to a new file by _insert, so the claimed file can go
+        batch = []
+        for line in lines:
+            try:
+                item = json.loads(line)
+                if "k" in item:
+                    if item["k"] not in self._inserters:
+                        raise KeyError(item["k"])
+                    self._count("rows_retried", len(item["rows"]))
+                    self._insert(item["k"], [tuple(row) for row in item["rows"]])
+                    continue
+                batch.append((item["r"], item["p"].encode("utf-8"), item["t"]))
+            except (ValueError, KeyError, TypeError):
+                self._malformed_payload("bad_spill_line")
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                self._count("replayed", len(batch))
+                batch = []
+        if batch:
+            self.flush(batch)
+            self._count("replayed", len(batch))
+
+    # --- metrics ---------------------------------------------------------------
+
+    def _report(self) -> None:
+        """Log the stats, or hand them to ``reporter`` (e.g. the parent of a receiver process)."""
+        if self.reporter is None:
+            print(f"[INGEST] {self.name}: {self.stats()}")
+            return
+        try:
+            self.reporter(self.stats())
+        except Exception as e:
+            print(f"[ERROR] Ingestion report of {self.name} failed: {e}")
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[key] += n
+
+    def _malformed_payload(self, reason: str) -> None:
+        with self._lock:
+            self._counters["parse_errors"] += 1
+            self._malformed[reason] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["malformed"] = dict(self._malformed)
+            flush_time = self._flush_time_s
+        elapsed = max(time.monotonic() - self._started_at, 1e-9)
+        stats.update({
+            "queue_depth": self.queue.qsize(),
+            "queue_max_depth": self._max_depth,
+            "queue_capacity": self.queue.maxsize,
+            "rate_per_s": round(stats["received"] / elapsed, 1),
+            "avg_flush_ms": round(1000 * flush_time / stats["batches"], 1) if stats["batches"] else None,
+        })
+        return stats
@@ -4,31 +4,192 @@ main_receive.py
 Main entry point for the mqtt_receive module.
 It loads the MQTT config, starts the MQTT client, and enters an infinite loop
 to listen for incoming data from PV routers.
+
+With ``consumers > 1`` the receiver runs one process per consumer. Each
+consumer joins the MQTT v5 shared subscription ``$share/<shared_group>/+/DATA``
+and has its own ingestion pipeline. The broker splits the messages between
+them. The parent process restarts consumers that die and logs each
+consumer's message rate every ``report_s`` seconds. Each consumer also sends
+the routers whose state changed (data/router_state.py) to the parent every
+``state_sync_s`` seconds. The parent merges them into its own store, so an
+optimizer running in the parent process (main.py) still reads the latest
+readings from memory.
+
+End-to-end check of the shared subscription against a local broker:
+
+    python -m mqtt_receive.check_shared_subscription --host localhost --consumers 3
+
+Local test with mosquitto (>= 1.6 for MQTT v5):
+
+    mosquitto -p 1883 &
+    # config/mqtt_config_receive.txt: host = localhost, consumers = 4
+    python mqtt_receive/main_receive.py
 """
 
 import sys
 import os
+import queue
+import signal
+import struct
+import threading
+import time
+import multiprocessing
 
 # Ensure project root is in Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from mqtt_receive.config_loader import load_mqtt_config
 from mqtt_receive.mqtt_client import start_mqtt_client
+from mqtt_receive.ingestion import IngestionPipeline
+from data.router_state import ROUTER_STATE
+from data.router_map import ROUTER_MAP
 
-def receive():
+SNAPSHOT_DEFAULTS = {"state_snapshot": "cache/router_state.bin", "snapshot_s": 30}
+DEFAULT_STATE_SYNC_S = 2
+DEFAULT_SHARED_GROUP = "optimasol-rx"
+RESTART_DELAY_S = 5
+
+def run_consumer(config, index=None, shared_group=None, report_queue=None):
+    """
+    Runs one receiver (MQTT client + ingestion pipeline) until interrupted.
+    index / report_queue are set for the consumer processes of the multi-process mode.
+    """
+    name = "ingest" if index is None else f"ingest-{index}"
+    snapshot_path = config.get("state_snapshot") or SNAPSHOT_DEFAULTS["state_snapshot"]
+    if index is not None:
+        snapshot_path = f"{snapshot_path}.{index}"
+    reporter = None
+    if report_queue is not None:
+        pid = os.getpid()
+        reporter = lambda stats: report_queue.put_nowait(("stats", index, pid, time.monotonic(), stats))
     try:
-        config = load_mqtt_config("config/mqtt_config_receive.txt")
+        snapshot_s = float(config.get("snapshot_s") or SNAPSHOT_DEFAULTS["snapshot_s"])
+        state_sync_s = float(config.get("state_sync_s") or DEFAULT_STATE_SYNC_S)
+        pipeline = IngestionPipeline.from_config(config, name=name, reporter=reporter)
     except Exception as e:
-        print(f"[FATAL] Failed to load MQTT config: {e}")
+        print(f"[FATAL] Failed to start ingestion pipeline: {e}")
         return
 
     try:
-        client = start_mqtt_client(config)
+        # Warm restart: last readings known before the previous shutdown
+        print(f"[INFO] Loaded {ROUTER_STATE.load(snapshot_path)} router states from {snapshot_path}")
+    except (OSError, ValueError, struct.error) as e:
+        print(f"[WARN] Ignoring router state snapshot {snapshot_path}: {e}")
+    ROUTER_STATE.start_snapshots(snapshot_path, snapshot_s)
+    print(f"[INFO] Loaded {ROUTER_MAP.load()} router ids")
+    pipeline.start()
+    stop_sync = threading.Event()
+    if report_queue is not None:
+        threading.Thread(target=_forward_state, args=(index, report_queue, stop_sync, state_sync_s),
+                         name=f"{name}-state", daemon=True).start()
+
+    try:
+        client_id = f"{shared_group}-{index}-{os.getpid()}" if shared_group and index is not None else ""
+        client = start_mqtt_client(config, pipeline, shared_group=shared_group, client_id=client_id)
         client.loop_forever()
     except KeyboardInterrupt:
         print("\n[INFO] MQTT listener stopped manually.")
     except Exception as e:
         print(f"[FATAL] Error in MQTT client loop: {e}")
+    finally:
+        stop_sync.set()
+        pipeline.stop()
+        try:
+            ROUTER_STATE.stop_snapshots(snapshot_path)
+        except OSError as e:
+            print(f"[ERROR] Could not save router state snapshot: {e}")
+
+def _forward_state(index, report_queue, stop, interval_s):
+    """Sends the router states changed since the last sync to the parent process."""
+    since = 0.0
+    while not stop.wait(interval_s):
+        records = ROUTER_STATE.changed_since(since)
+        if not records:
+            continue
+        try:
+            report_queue.put_nowait(("state", index, records))
+        except queue.Full:
+            continue    # parent busy: sent again at the next sync
+        since = max(record[-1] for record in records)
+
+def _consumer_process(config, index, shared_group, report_queue):
+    # terminate() sends SIGTERM: leave through the finally block of run_consumer (flush, snapshot)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    run_consumer(config, index, shared_group, report_queue)
+
+def _start_consumer(config, index, shared_group, report_queue):
+    process = multiprocessing.Process(target=_consumer_process, args=(config, index, shared_group, report_queue),
+                                      name=f"MQTT-RX-{index}", daemon=True)
+    process.start()
+    return process
+
+def _log_rate(last, index, pid, at, stats):
+    previous = last.get(index)
+    last[index] = (pid, at, stats["received"])
+    if previous is not None and previous[0] == pid and at > previous[1]:
+        rate = (stats["received"] - previous[2]) / (at - previous[1])
+        print(f"[RECEIVE] consumer {index} (pid {pid}): {rate:.1f} msg/s, "
+              f"queue {stats['queue_depth']}/{stats['queue_capacity']}, "
+              f"dropped {stats['dropped']}, malformed {stats['parse_errors']}")
+
+def run_consumers(config, consumers, shared_group):
+    """Starts `consumers` receiver processes on a shared subscription and supervises them."""
+    report_queue = multiprocessing.Queue(maxsize=1000)
+    processes = [_start_consumer(config, i, shared_group, report_queue) for i in range(consumers)]
+    restart_at = {}
+    last = {}   # index -> (pid, instant, messages received)
+    if threading.current_thread() is threading.main_thread():
+        # Standalone receiver: stop the consumers cleanly on SIGTERM too
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"[INFO] Started {consumers} MQTT consumers on $share/{shared_group}/+/DATA")
+    print(f"[INFO] Router states are forwarded by the consumers every "
+          f"{config.get('state_sync_s') or DEFAULT_STATE_SYNC_S}s to this process (pid {os.getpid()})")
+    try:
+        while True:
+            try:
+                report = report_queue.get(timeout=1.0)
+            except queue.Empty:
+                pass
+            else:
+                if report[0] == "state":
+                    ROUTER_STATE.merge(report[2])
+                else:
+                    _log_rate(last, *report[1:])
+
+            now = time.monotonic()
+            for i, process in enumerate(processes):
+                if process.is_alive():
+                    continue
+                if i not in restart_at:
+                    print(f"[ERROR] MQTT consumer {i} exited with code {process.exitcode}, "
+                          f"restarting in {RESTART_DELAY_S}s")
+                    restart_at[i] = now + RESTART_DELAY_S
+                elif now >= restart_at[i]:
+                    del restart_at[i]
+                    processes[i] = _start_consumer(config, i, shared_group, report_queue)
+    except KeyboardInterrupt:
+        print("\n[INFO] MQTT consumers stopped manually.")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(10)
+
+def receive():
+    try:
+        config = load_mqtt_config("config/mqtt_config_receive.txt")
+        consumers = int(config.get("consumers") or 1)
+    except Exception as e:
+        print(f"[FATAL] Failed to load MQTT config: {e}")
+        return
+
+    shared_group = config.get("shared_group") or None
+    if consumers > 1:
+        # Without a shared subscription every consumer would receive every message
+        run_consumers(config, consumers, shared_group or DEFAULT_SHARED_GROUP)
+    else:
+        run_consumer(config, shared_group=shared_group)
 
 if __name__ == "__main__":
     receive()
@@ -3,38 +3,55 @@ mqtt_client.py
 
 Initializes and runs the MQTT client that listens to router data messages
 and delegates them to the message handler.
+
+With a ``shared_group``, the client connects with MQTT v5 and subscribes to
+``$share/<group>/+/DATA`` (and ``$share/<group>/creation``): the broker
+load-balances the messages between all the receivers of the group, so
+several consumers can split the fleet's telemetry (cf. main_receive.py).
 """
 
 import paho.mqtt.client as mqtt
 import json
-from mqtt_receive.message_handler import handle_message
-from typing import Dict
-from data.com_bdd import add_client
+from mqtt_receive.ingestion import IngestionPipeline
+from typing import Dict, List, Optional
+from data.router_map import ROUTER_MAP
+
+def subscription_topics(shared_group: Optional[str] = None) -> List[str]:
+    """Topics to subscribe to, prefixed with $share/<group>/ for a shared subscription."""
+    prefix = f"$share/{shared_group}/" if shared_group else ""
+    return [prefix + "+/DATA", prefix + "creation"]
 
-def start_mqtt_client(config: Dict) -> mqtt.Client:
+
+def start_mqtt_client(config: Dict, pipeline: IngestionPipeline, shared_group: Optional[str] = None,
+                      client_id: str = "") -> mqtt.Client:
     """
     Starts and returns a configured MQTT client that listens to all <client_id>/DATA topics
     and the creation topic for new client registration.
 
     Args:
         config (dict): MQTT configuration with keys: host, port, user, pass, refresh.
+        pipeline (IngestionPipeline): started pipeline receiving the DATA payloads.
+        shared_group (str): if set, join this MQTT v5 shared subscription group.
+        client_id (str): MQTT client id (random if empty).
 
     Returns:
         mqtt.Client: The initialized and connected MQTT client.
     """
-    client = mqtt.Client()
+    if shared_group:
+        client = mqtt.Client(client_id=client_id, protocol=mqtt.MQTTv5)
+    else:
+        client = mqtt.Client(client_id=client_id)
+    topics = subscription_topics(shared_group)
 
     if config.get("user") and config.get("pass"):
         client.username_pw_set(config["user"], config["pass"])
 
-    def on_connect(client, userdata, flags, rc):
+    def on_connect(client, userdata, flags, rc, properties=None):
         if rc == 0:
-            print("[INFO] Connected to MQTT broker.")
-            # Subscribe to all data topics (e.g. PV0001/DATA)
-            client.subscribe("+/DATA")
-            # Subscribe to creation topic for new client registration
-            client.subscribe("creation")
-            print("[INFO] Subscribed to topics: +/DATA, creation")
+            print(f"[INFO] Connected to MQTT broker{f' ({client_id})' if client_id else ''}.")
+            # All data topics (e.g. PV0001/DATA) and the creation topic for new client registration
+            client.subscribe([(topic, 0) for topic in topics])
+            print(f"[INFO] Subscribed to topics: {', '.join(topics)}")
         else:
             print(f"[ERROR] MQTT connection failed with code {rc}")
 
@@ -45,15 +62,15 @@ def start_mqtt_client(config: Dict) -> mqtt.Client:
             if topic == "creation":
                 # Handle client creation message
                 payload = json.loads(msg.payload.decode())
-                print(f"[INFO] Received creation message: {payload}")
                 r_id,password = payload.get("router_id"),payload.get("password")
-                add_client(router_id=r_id,pwd=password)  
+                # Idempotent: retained or repeated creation messages do not duplicate the client
+                registered_id, created = ROUTER_MAP.register(r_id, password)
+                if created:
+                    print(f"[INFO] Registered router {r_id} as client {registered_id}")
                 
             elif topic.endswith("/DATA"):
-                # Handle regular data message
-                payload = json.loads(msg.payload.decode())
-                client_id = topic.split("/")[0]
-                handle_message(client_id, payload)
+                # Queue only: decoding and DB writes happen in the ingestion workers
+                pipeline.submit(topic.split("/")[0], msg.payload)
                 
         except json.JSONDecodeError as e:
             print(f"[ERROR] Invalid JSON in message on topic {msg.topic}: {e}")
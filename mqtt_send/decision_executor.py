@@ -1,58 +1,115 @@
 """
 decision_executor.py - Exécute les décisions au bon moment
+
+Les plannings courants sont gardés en mémoire dans DECISION_INDEX
+(chauffe_eau_id -> Schedule) : « que doit faire le chauffe-eau X maintenant »
+est une simple lecture de dictionnaire. L'index est mis à jour directement
+par add_decision (hook de data.com_bdd) et relit la BDD seulement en cas
+d'absence.
 """
 
-from data.com_bdd import get_connection
-from datetime import datetime, timedelta
-import json
+from data.com_bdd import get_latest_decision, get_latest_decisions, register_change_hook
+from datetime import datetime
+import threading
 import time
 
-def get_current_decision(chauffe_eau_id):
-    """Récupère la décision actuelle à exécuter"""
-    conn = get_connection()
-    if not conn:
-        return None
-        
-    cur = conn.cursor()
-    
-    # Récup la dernière décision
-    cur.execute("""
-        SELECT statut, heure_decision 
-        FROM decision 
-        WHERE chauffe_eau_id = %s 
-        ORDER BY heure_decision DESC 
-        LIMIT 1
-    """, (chauffe_eau_id,))
-    
-    row = cur.fetchone()
-    conn.close()
-    
-    if not row or not row[0]:
-        return None
-    
-    try:
-        decision_data = json.loads(row[0])
-        start_time = datetime.strptime(decision_data["start_time"], "%Y-%m-%d %H:%M:%S")
-        step_min = decision_data["step_min"]
-        decisions = decision_data["decisions"]
-        
-        # Calculer l'index actuel
-        now = datetime.now()
-        elapsed_minutes = (now - start_time).total_seconds() / 60
-        current_index = int(elapsed_minutes // step_min)
-        
-        if 0 <= current_index < len(decisions):
-            return decisions[current_index]
+MISS_RETRY_S = 60  # délai avant de re-interroger la BDD pour un chauffe-eau sans décision
+
+
+class DecisionIndex:
+    """Index en mémoire chauffe_eau_id -> dernier Schedule."""
+
+    def __init__(self, miss_retry_s=MISS_RETRY_S):
+        self._schedules = {}
+        self._misses = {}        # ce_id -> instant (monotonic) du dernier échec de lecture
+        self._lock = threading.Lock()
+        self.miss_retry_s = miss_retry_s
+
+    def __len__(self):
+        return len(self._schedules)
+
+    def get(self, chauffe_eau_id):
+        """Dernier planning connu du chauffe-eau (lecture BDD seulement au premier accès)."""
+        schedule = self._schedules.get(chauffe_eau_id)
+        if schedule is not None:
+            return schedule
+        missed_at = self._misses.get(chauffe_eau_id)
+        if missed_at is not None and time.monotonic() - missed_at < self.miss_retry_s:
+            return None
+        schedule = get_latest_decision(chauffe_eau_id)
+        if schedule is None:
+            self._misses[chauffe_eau_id] = time.monotonic()
         else:
-            return None  # Hors de l'horizon
-            
-    except Exception as e:
-        print(f"Erreur parsing décision: {e}")
+            self.update(schedule)
+        return self._schedules.get(chauffe_eau_id)
+
+    def get_many(self, ce_ids):
+        """{chauffe_eau_id: Schedule} ; les absents de l'index sont lus en une seule requête."""
+        now = time.monotonic()
+        found, missing = {}, []
+        for ce_id in ce_ids:
+            schedule = self._schedules.get(ce_id)
+            if schedule is not None:
+                found[ce_id] = schedule
+            elif now - self._misses.get(ce_id, -self.miss_retry_s) >= self.miss_retry_s:
+                missing.append(ce_id)
+        if missing:
+            schedules = get_latest_decisions(missing)
+            with self._lock:
+                for ce_id in missing:
+                    if ce_id not in schedules:
+                        self._misses[ce_id] = now
+            for schedule in schedules.values():
+                self.update(schedule)
+                found[schedule.chauffe_eau_id] = self._schedules[schedule.chauffe_eau_id]
+        return found
+
+    def update(self, schedule):
+        """Remplace le planning d'un chauffe-eau s'il est plus récent que celui connu."""
+        with self._lock:
+            current = self._schedules.get(schedule.chauffe_eau_id)
+            if current is None or (schedule.start_time, schedule.id_decision or 0) >= \
+                    (current.start_time, current.id_decision or 0):
+                self._schedules[schedule.chauffe_eau_id] = schedule
+            self._misses.pop(schedule.chauffe_eau_id, None)
+
+    def warm(self, ce_ids=None):
+        """Charge en une requête les derniers plannings (de tous les chauffe-eaux par défaut)."""
+        schedules = get_latest_decisions(ce_ids)
+        for schedule in schedules.values():
+            self.update(schedule)
+        return len(schedules)
+
+    def discard(self, chauffe_eau_id):
+        with self._lock:
+            self._schedules.pop(chauffe_eau_id, None)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._schedules)
+
+
+DECISION_INDEX = DecisionIndex()
+
+
+def _on_change(table, chauffe_eau_id=None, schedule=None, **_):
+    if table == "decision" and schedule is not None:
+        DECISION_INDEX.update(schedule)
+
+
+register_change_hook(_on_change)
+
+
+def get_current_decision(chauffe_eau_id, now=None):
+    """Récupère la décision actuelle à exécuter (0/1), ou None hors horizon / sans décision."""
+    schedule = DECISION_INDEX.get(chauffe_eau_id)
+    if schedule is None:
         return None
+    return schedule.value_at(now or datetime.now())
 
 def format_command(decision_value):
     """Convertit 0/1 en commande SETMODE"""
     if decision_value == 0:
         return "SETMODE 10"  # OFF
-    else:           
-        return "SETMODE 12"  # ON
\ No newline at end of file
+    else:
+        return "SETMODE 12"  # ON
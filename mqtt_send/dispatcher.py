@@ -0,0 +1,198 @@
+"""
+dispatcher.py - Envoi des commandes aux changements de créneau.
+
+Un planning couvre tout l'horizon, mais une commande n'était envoyée qu'à
+l'arrivée d'une nouvelle décision : entre deux optimisations, le chauffe-eau
+ne suivait pas les passages 0 -> 1 / 1 -> 0 du plan.
+
+Le dispatcher garde le planning actif de chaque chauffe-eau et, dans un tas
+(heapq), l'instant du *prochain changement* de commande de chacun : les
+créneaux où la commande ne change pas ne coûtent rien. Un thread dort
+jusqu'à l'échéance la plus proche, envoie la nouvelle commande des seuls
+chauffe-eaux concernés (en un seul lot au publisher) et programme leur
+changement suivant. Le coût est proportionnel au nombre de changements
+d'état, pas à la taille du parc multipliée par une fréquence de scrutation.
+
+Un nouveau planning remplace l'entrée du chauffe-eau (les entrées périmées
+du tas sont ignorées grâce à un numéro de génération) et sa commande
+courante est renvoyée.
+
+Pour les routeurs de `schedule_push` (config/mqtt_config_send.txt), le
+planning complet est publié une fois (sender.send_schedule) et le routeur
+l'exécute lui-même : aucune échéance n'est programmée pour eux. discard()
+efface le planning retenu d'un chauffe-eau dont le planning est retiré.
+"""
+
+import heapq
+import threading
+from datetime import datetime
+
+from .decision_executor import DECISION_INDEX
+from .sender import clear_heater_schedule, send_schedule, send_setmode, send_setmodes
+
+MAX_SLEEP_S = 60  # réveil de sécurité (changement d'heure, horloge recalée)
+
+
+class SlotDispatcher:
+    def __init__(self, send=send_setmode, send_many=send_setmodes, push=send_schedule, clear=clear_heater_schedule):
+        self._send = send
+        self._send_many = send_many     # envoi groupé des changements d'une même échéance
+        self._push = push               # planning complet aux routeurs qui l'exécutent eux-mêmes
+        self._clear = clear             # effacement du planning retenu d'un chauffe-eau
+        self._pushed = set()            # chauffe-eaux dont le planning a été poussé au routeur
+        self._heap = []                 # (instant, génération, chauffe_eau_id)
+        self._active = {}               # chauffe_eau_id -> (Schedule, génération)
+        self._last_sent = {}            # chauffe_eau_id -> dernière commande envoyée (0/1)
+        self._generation = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self.running = False
+        self.stats = {"schedules": 0, "pushed": 0, "boundaries": 0, "sent": 0, "unchanged": 0}
+
+    def __len__(self):
+        return len(self._active)
+
+    # --- plannings -------------------------------------------------------------
+
+    def _push_next(self, ce_id, schedule, generation, index):
+        change = schedule.next_change(index)
+        if change is not None:
+            heapq.heappush(self._heap, (schedule.time_of(change), generation, ce_id))
+
+    def apply(self, schedule, now=None, resend=True):
+        """
+        Active un nouveau planning : envoie la commande du créneau courant
+        (même inchangée si resend) et programme le prochain changement.
+        Si le routeur exécute lui-même le planning, celui-ci lui est envoyé en
+        entier et aucun changement de créneau n'est programmé.
+        """
+        now = now or datetime.now()
+        ce_id = schedule.chauffe_eau_id
+        with self._cond:
+            current = self._active.get(ce_id)
+            if current is not None and (current[0].id_decision or 0) > (schedule.id_decision or 0):
+                return False
+            self._generation += 1
+            generation = self._generation
+            self._active[ce_id] = (schedule, generation)
+            self.stats["schedules"] += 1
+        # Hors verrou : publication et éventuel chargement de ROUTER_MAP ne bloquent pas le thread des échéances
+        pushed = self._push is not None and self._push(schedule)
+        with self._cond:
+            if self._active.get(ce_id, (None, None))[1] != generation:
+                return False            # remplacé entre-temps par un planning plus récent
+            if pushed:
+                # Les entrées du tas de l'ancien planning sont périmées (génération)
+                self._pushed.add(ce_id)
+                self._last_sent.pop(ce_id, None)
+                self.stats["pushed"] += 1
+                return True
+            self._pushed.discard(ce_id)
+            index = schedule.index_at(now)
+            self._push_next(ce_id, schedule, generation, index)
+            self._cond.notify()
+        value = schedule.value(index)
+        if value is None or (not resend and self._last_sent.get(ce_id) == value):
+            return False
+        return self._dispatch(ce_id, value)
+
+    def load(self, schedules=None, now=None):
+        """Active les plannings connus (tous ceux de DECISION_INDEX par défaut) ; retourne leur nombre."""
+        if schedules is None:
+            DECISION_INDEX.warm()
+            schedules = DECISION_INDEX.snapshot().values()
+        count = 0
+        for schedule in schedules:
+            self.apply(schedule, now)
+            count += 1
+        return count
+
+    def discard(self, chauffe_eau_id):
+        """
+        Oublie le planning d'un chauffe-eau (plus de commande à ses échéances) et,
+        s'il avait été poussé au routeur, efface le planning retenu par celui-ci.
+        """
+        with self._cond:
+            active = self._active.pop(chauffe_eau_id, None)
+            self._last_sent.pop(chauffe_eau_id, None)
+            pushed = chauffe_eau_id in self._pushed
+            self._pushed.discard(chauffe_eau_id)
+        if pushed and self._clear is not None:
+            self._clear(chauffe_eau_id)
+        return active is not None
+
+    def _dispatch(self, ce_id, value):
+        if self._send(ce_id, value):
+            self._last_sent[ce_id] = value
+            self.stats["sent"] += 1
+            return True
+        return False
+
+    # --- échéances ---------------------------------------------------------------
+
+    def _due(self, now):
+        """Dépile les changements échus : [(chauffe_eau_id, commande)]."""
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                boundary, generation, ce_id = heapq.heappop(self._heap)
+                active = self._active.get(ce_id)
+                if active is None or active[1] != generation:
+                    continue            # remplacé par un planning plus récent
+                schedule = active[0]
+                # Créneau de l'échéance (et non de `now`) : pas de dérive si le réveil est en retard
+                index = schedule.index_at(boundary)
+                self._push_next(ce_id, schedule, generation, index)
+                value = schedule.value(index)
+                if value is None:
+                    self._active.pop(ce_id, None)
+                    continue
+                due.append((ce_id, value))
+        return due
+
+    def run_pending(self, now=None):
+        """Envoie en un lot les commandes des changements échus ; retourne le nombre d'envois."""
+        commands = []
+        for ce_id, value in self._due(now or datetime.now()):
+            self.stats["boundaries"] += 1
+            if self._last_sent.get(ce_id) == value:
+                self.stats["unchanged"] += 1
+                continue
+            commands.append((ce_id, value))
+        if not commands:
+            return 0
+        if self._send_many is None:
+            return sum(self._dispatch(ce_id, value) for ce_id, value in commands)
+        values = dict(commands)
+        sent = self._send_many(commands)
+        for ce_id in sent:
+            self._last_sent[ce_id] = values[ce_id]
+        self.stats["sent"] += len(sent)
+        return len(sent)
+
+    def _run(self):
+        while self.running:
+            with self._cond:
+                delay = MAX_SLEEP_S
+                if self._heap:
+                    delay = min(delay, (self._heap[0][0] - datetime.now()).total_seconds())
+                if delay > 0:
+                    self._cond.wait(delay)
+            if self.running:
+                self.run_pending()
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="slot-dispatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -1,12 +1,12 @@
 """
-mqtt_send/main_send.py : Starts the watcher to monitor all decisions.txt files
+mqtt_send/main_send.py : Starts the watcher that sends a command for every new decision
 """
 
-from pathlib import Path
-from .watcher import run_watcher  
-from data.com_bdd import get_client_ids
+from .watcher import run_watcher
+from .sender import _BROKER
 
 def send() :
-    clients = get_client_ids() # liste des id des clients
-
-    run_watcher(clients)
+    run_watcher(
+        source=_BROKER.get("decision_source") or "events",
+        poll_interval=float(_BROKER.get("db_poll_s") or 5),
+    )
@@ -0,0 +1,215 @@
+"""
+publisher.py - Connexion MQTT persistante pour l'envoi des commandes.
+
+Une seule connexion au broker pour tout le processus, avec sa propre boucle
+réseau (loop_start) et reconnexion automatique (délai exponentiel entre
+reconnect_min_s et reconnect_max_s). Les publications passent par une file
+bornée : publish() retourne immédiatement, un thread d'envoi vide la file
+dès que la connexion est établie (les messages attendent pendant une
+coupure ; file pleine : le plus ancien est abandonné).
+
+Les publications QoS 1 sont suivies jusqu'au PUBACK (au plus max_inflight
+en vol) : stats() donne les compteurs et la latence publication -> ack.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+
+import paho.mqtt.client as mqtt
+
+DEFAULTS = {
+    "keepalive": 60,
+    "queue_size": 10_000,
+    "max_inflight": 1000,
+    "reconnect_min_s": 1,
+    "reconnect_max_s": 60,
+}
+LATENCY_WINDOW = 10_000  # dernières latences gardées pour les percentiles
+
+
+class Publisher:
+    def __init__(self, host, port=1883, user=None, password=None, client_id="", keepalive=DEFAULTS["keepalive"],
+                 queue_size=DEFAULTS["queue_size"], max_inflight=DEFAULTS["max_inflight"],
+                 reconnect_min_s=DEFAULTS["reconnect_min_s"], reconnect_max_s=DEFAULTS["reconnect_max_s"]):
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._client = mqtt.Client(client_id=client_id)
+        if user:
+            self._client.username_pw_set(user, password or "")
+        self._client.max_inflight_messages_set(max_inflight)
+        self._client.max_queued_messages_set(0)
+        self._client.reconnect_delay_set(reconnect_min_s, reconnect_max_s)
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_publish = self._on_publish
+
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._lock = threading.Lock()
+        self._inflight = {}          # mid -> instant de publication (monotonic)
+        self._early_acks = {}        # mid -> instant du PUBACK arrivé avant l'enregistrement
+        self._publishing = False     # publication QoS > 0 en cours dans _run (seule source d'acks précoces)
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._counters = dict.fromkeys(("queued", "published", "acked", "dropped", "errors", "connects",
+                                        "disconnects"), 0)
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config, client_id=""):
+        """Publisher à partir de config/mqtt_config_send.txt (clés absentes : DEFAULTS)."""
+        options = {key: type(default)(config.get(key) or default) for key, default in DEFAULTS.items()}
+        return cls(config.get("host", "localhost"), int(config.get("port", 1883)), config.get("user"),
+                   config.get("pass"), client_id=client_id, **options)
+
+    # --- cycle de vie ----------------------------------------------------------
+
+    def start(self):
+        """Connexion asynchrone (le broker peut être indisponible au démarrage) et thread d'envoi."""
+        if self._thread is not None:
+            return self
+        self._client.connect_async(self.host, self.port, keepalive=self.keepalive)
+        self._client.loop_start()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mqtt-publisher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """Vide la file (au plus timeout secondes) puis ferme la connexion."""
+        self.flush(timeout)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._client.disconnect()
+        self._client.loop_stop()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            self._count("connects")
+            self._connected.set()
+            print(f"[PUBLISHER] Connecté au broker {self.host}:{self.port}")
+        else:
+            print(f"[PUBLISHER] Connexion refusée (code {rc})")
+
+    def _on_disconnect(self, client, userdata, rc):
+        self._connected.clear()
+        self._count("disconnects")
+        if rc != 0:
+            # loop_start reconnecte automatiquement (reconnect_delay_set)
+            print(f"[PUBLISHER] Connexion perdue (code {rc}), reconnexion...")
+
+    # --- envoi -----------------------------------------------------------------
+
+    def publish(self, topic, payload, qos=1, retain=False):
+        """Met le message en file sans bloquer ; retourne False s'il a fallu abandonner un message."""
+        self._count("queued")
+        message = (topic, payload, qos, retain)
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except queue.Full:
+            pass
+        try:
+            self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            pass
+        self._count("dropped")
+        return False
+
+    def publish_many(self, messages, qos=1, retain=False):
+        """Met en file une liste de (topic, payload) ; retourne le nombre de messages acceptés."""
+        return sum(self.publish(topic, payload, qos, retain) for topic, payload in messages)
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self._connected.wait(0.5):
+                continue
+            try:
+                topic, payload, qos, retain = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if qos > 0:
+                # Au plus max_inflight messages sans PUBACK
+                while not self._slots.acquire(timeout=0.5):
+                    if self._stop.is_set():
+                        return
+            # Hors verrou : paho appelle on_publish en tenant ses propres verrous
+            with self._lock:
+                self._publishing = qos > 0
+            sent_at = time.monotonic()
+            info = self._client.publish(topic, payload, qos=qos, retain=retain)
+            with self._lock:
+                self._publishing = False
+                # Le PUBACK peut arriver avant le retour de publish() ; seul ce mid peut être en attente
+                acked_at = self._early_acks.pop(info.mid, None)
+                self._early_acks.clear()
+                if info.rc != mqtt.MQTT_ERR_SUCCESS and info.rc != mqtt.MQTT_ERR_NO_CONN:
+                    self._counters["errors"] += 1
+                    if qos > 0:
+                        self._slots.release()
+                    continue
+                self._counters["published"] += 1
+                if qos == 0:
+                    continue
+                if acked_at is None:
+                    # NO_CONN : paho garde le message QoS 1 et le renvoie à la reconnexion
+                    self._inflight[info.mid] = sent_at
+                    continue
+                self._counters["acked"] += 1
+                self._latencies.append(acked_at - sent_at)
+            self._slots.release()
+
+    def _on_publish(self, client, userdata, mid):
+        now = time.monotonic()
+        with self._lock:
+            sent_at = self._inflight.pop(mid, None)
+            if sent_at is None:
+                # PUBACK reçu avant que _run n'ait enregistré le message ; QoS 0 : rien à suivre
+                if self._publishing:
+                    self._early_acks[mid] = now
+                return
+            self._counters["acked"] += 1
+            self._latencies.append(now - sent_at)
+        self._slots.release()
+
+    def flush(self, timeout=5.0):
+        """Attend que la file soit vide et les publications acquittées ; retourne True si c'est le cas."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                pending = len(self._inflight)
+            if not pending and self.queue.empty():
+                return True
+            time.sleep(0.01)
+        return False
+
+    # --- métriques -------------------------------------------------------------
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._counters[key] += n
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["inflight"] = len(self._inflight)
+            latencies = sorted(self._latencies)
+        stats["connected"] = self._connected.is_set()
+        stats["queue_depth"] = self.queue.qsize()
+        if latencies:
+            stats["ack_latency_ms"] = {
+                "p50": round(1000 * latencies[len(latencies) // 2], 1),
+                "p95": round(1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+                "max": round(1000 * latencies[-1], 1),
+            }
+        return stats
@@ -9,13 +9,27 @@ The broker parameters are stored in a simple key-value text file
     port = 1883
     user =                # optional
     pass =                # optional
+
+Commands go through one persistent connection (mqtt_send/publisher.py)
+instead of a connect / publish / disconnect per command. send_commands()
+resolves a whole list of clients from the in-memory caches and queues all
+their commands in one call.
+
+Routers listed in `schedule_push` receive the whole plan instead, as one
+retained binary message on <router_id>/SCHEDULE (format in
+data/decision_codec.py), and execute it locally; the others keep getting
+one SETMODE per slot change. Before the first SETMODE to a router, this
+process clears any retained schedule it may still hold (empty retained
+payload), e.g. after the router was removed from `schedule_push`.
 """
 # Auteur @lilya_sudo
 
+from datetime import datetime
 from pathlib import Path
-import paho.mqtt.client as mqtt
-from data.com_bdd import get_client, get_immediate_decision_by_client,get_CE_by_client
-from decision_executor import get_current_decision, format_command
+import threading
+from mqtt_send.decision_executor import DECISION_INDEX, get_current_decision, format_command
+from mqtt_send.publisher import Publisher
+from data.router_map import ROUTER_MAP
 
 # ──────────────────────────────────────────────    
 # 1)  Load broker configuration **once** at import
@@ -44,22 +58,50 @@ def _read_conf(path: Path) -> dict:
 _BROKER = _read_conf(_CONF_FILE)
 
 
+def _read_schedule_routers(value):
+    """schedule_push : vide / off -> aucun routeur, all -> tous, sinon liste de router_id séparés par des virgules."""
+    value = (value or "").strip()
+    if value.lower() in ("", "off", "no", "false", "0"):
+        return frozenset()
+    if value.lower() in ("all", "*"):
+        return None
+    return frozenset(router.strip() for router in value.split(",") if router.strip())
+
+
+# Routeurs qui exécutent eux-mêmes le planning complet (None : tous)
+_SCHEDULE_ROUTERS = _read_schedule_routers(_BROKER.get("schedule_push"))
+# Routeurs dont le planning retenu a déjà été effacé par ce processus avant un SETMODE
+_SCHEDULE_CLEARED = set()
+
+
 # ──────────────────────────────────────────────
-# 2)  Helper that publishes a single MQTT message
+# 2)  Persistent publisher shared by every send
 # ──────────────────────────────────────────────
 
+_PUBLISHER = None
+_PUBLISHER_LOCK = threading.Lock()
+
+
+def get_publisher() -> Publisher:
+    """Long-lived MQTT connection (started on first use, see publisher.py)."""
+    global _PUBLISHER
+    with _PUBLISHER_LOCK:
+        if _PUBLISHER is None:
+            _PUBLISHER = Publisher.from_config(_BROKER).start()
+        return _PUBLISHER
+
+
+def _publish_many(messages) -> None:
+    """Queue a list of (topic, payload) on the persistent connection in one call."""
+    dropped = len(messages) - get_publisher().publish_many(messages, qos=1, retain=False)
+    if dropped:
+        print(f"File d'envoi MQTT pleine : {dropped} commande(s) plus ancienne(s) abandonnée(s)")
+
+
 def _publish(topic: str, payload: str) -> None:
-    """Open a short-lived MQTT connection and publish `payload`."""
-    client = mqtt.Client()
-    if _BROKER.get("user"):
-        client.username_pw_set(_BROKER["user"], _BROKER.get("pass", ""))
-    client.connect(
-        _BROKER.get("host", "localhost"),
-        int(_BROKER.get("port", 1883)),
-        keepalive=60,
-    )
-    client.publish(topic, payload, qos=1, retain=False)
-    client.disconnect()
+    """Queue `payload` on the persistent connection (QoS 1, non-blocking)."""
+    if not get_publisher().publish(topic, payload, qos=1, retain=False):
+        print("File d'envoi MQTT pleine : commande la plus ancienne abandonnée")
 
 
 # ──────────────────────────────────────────────
@@ -67,29 +109,144 @@ def _publish(topic: str, payload: str) -> None:
 # ──────────────────────────────────────────────
 
 
+def build_commands(client_ids, now=None):
+    """
+    Commandes du créneau courant d'une liste de clients, en une passe :
+    [(client_id, topic, payload)].
+
+    Routeur et chauffe-eau viennent du cache data/router_map.py, les plannings
+    de DECISION_INDEX (une seule requête pour les plannings absents) : aucune
+    lecture BDD par client.
+    """
+    now = now or datetime.now()
+    ids = ROUTER_MAP.resolve_clients(client_ids)
+    schedules = DECISION_INDEX.get_many({ce_id for _, ce_id in ids.values() if ce_id is not None})
+    commands = []
+    for client_id in client_ids:
+        router_id, ce_id = ids.get(client_id, (None, None))
+        schedule = schedules.get(ce_id)
+        value = schedule.value_at(now) if schedule is not None else None
+        if value is None:
+            continue
+        commands.append((client_id, f"{router_id}/SETMODE", format_command(value)))
+    return commands
+
+
+def send_commands(client_ids, now=None):
+    """
+    Envoie la commande actuelle d'une liste de clients ; retourne le nombre de commandes mises en file.
+    Les routeurs qui exécutent le planning complet (pushes_schedule) ne reçoivent pas de SETMODE.
+    """
+    client_ids = list(client_ids)
+    commands = build_commands(client_ids, now)
+    if len(commands) < len(client_ids):
+        print(f"{len(client_ids) - len(commands)} client(s) sans routeur, chauffe-eau ou décision valide")
+    messages = [(topic, payload) for _, topic, payload in commands if not pushes_schedule(topic.split("/", 1)[0])]
+    if not _publish_setmodes(messages):
+        return 0
+    return len(messages)
+
+
 def send_command(client_id):
     """Envoie la commande actuelle pour un client"""
-    # Récupérer le chauffe-eau du client
-    ce_id = get_CE_by_client(client_id)
-    client = get_client(client_id)
-    routeur_id = client.get("router_id")
-    if not ce_id:
-        print(f"Client {client_id} sans chauffe-eau")
-        return
-
-    current_decision = get_current_decision(ce_id)
-    
-    if current_decision is None:
-        print(f"Aucune décision valide pour client {client_id}")
-        return
+    return send_commands([client_id]) == 1
+
 
-    command = format_command(current_decision)
-    print(f"Envoi commande client {client_id}: {command}")
-    topic = f"{router_id}/SETMODE" # ???
+def send_setmode(chauffe_eau_id, decision_value):
+    """Envoie SETMODE 10/12 au routeur du chauffe-eau (routeur résolu par le cache data/router_map.py)"""
+    router_id = ROUTER_MAP.router_of_ce(chauffe_eau_id)
+    if not router_id:
+        print(f"Chauffe-eau {chauffe_eau_id} sans routeur connu")
+        return False
     try:
-        # Envoi effectif de la commande via MQTT
-        _publish(topic, command)
-        print(f"Commande envoyée avec succès sur le topic: {topic}")
+        _clear_stale_schedule(router_id)
+        _publish(f"{router_id}/SETMODE", format_command(decision_value))
     except Exception as e:
         print(f"Erreur lors de l'envoi MQTT: {e}")
-    
+        return False
+    return True
+
+
+def send_setmodes(commands):
+    """
+    Envoie en un lot des SETMODE [(chauffe_eau_id, 0/1)] ; retourne la liste
+    des chauffe-eaux dont la commande a été mise en file.
+    """
+    queued, messages = [], []
+    for chauffe_eau_id, decision_value in commands:
+        router_id = ROUTER_MAP.router_of_ce(chauffe_eau_id)
+        if not router_id:
+            print(f"Chauffe-eau {chauffe_eau_id} sans routeur connu")
+            continue
+        queued.append(chauffe_eau_id)
+        messages.append((f"{router_id}/SETMODE", format_command(decision_value)))
+    return queued if _publish_setmodes(messages) else []
+
+
+def _publish_setmodes(messages):
+    """Met en file des SETMODE [(topic, payload)] après avoir effacé les plannings retenus périmés de leurs routeurs."""
+    if not messages:
+        return True
+    try:
+        for router_id in {topic.split("/", 1)[0] for topic, _ in messages}:
+            _clear_stale_schedule(router_id)
+        _publish_many(messages)
+    except Exception as e:
+        print(f"Erreur lors de l'envoi MQTT: {e}")
+        return False
+    return True
+
+
+def pushes_schedule(router_id):
+    """True si le routeur reçoit le planning complet au lieu des SETMODE par créneau."""
+    return _SCHEDULE_ROUTERS is None or router_id in _SCHEDULE_ROUTERS
+
+
+def send_schedule(schedule):
+    """
+    Publie le planning complet du chauffe-eau sur <router_id>/SCHEDULE (retenu :
+    un routeur qui se reconnecte le reçoit aussitôt) si son routeur sait
+    l'exécuter ; retourne False sinon (repli sur les SETMODE par créneau).
+    """
+    if _SCHEDULE_ROUTERS == frozenset():
+        return False
+    router_id = ROUTER_MAP.router_of_ce(schedule.chauffe_eau_id)
+    if not router_id or not pushes_schedule(router_id):
+        return False
+    try:
+        get_publisher().publish(f"{router_id}/SCHEDULE", schedule.to_payload(), qos=1, retain=True)
+        _SCHEDULE_CLEARED.discard(router_id)
+    except Exception as e:
+        print(f"Erreur lors de l'envoi MQTT: {e}")
+        return False
+    return True
+
+
+def clear_schedule(router_id):
+    """Efface le planning retenu sur <router_id>/SCHEDULE (payload vide retenu) : le routeur revient aux SETMODE."""
+    get_publisher().publish(f"{router_id}/SCHEDULE", b"", qos=1, retain=True)
+    _SCHEDULE_CLEARED.add(router_id)
+
+
+def clear_heater_schedule(chauffe_eau_id):
+    """clear_schedule pour le routeur d'un chauffe-eau ; retourne False si le routeur est inconnu."""
+    router_id = ROUTER_MAP.router_of_ce(chauffe_eau_id)
+    if not router_id:
+        return False
+    clear_schedule(router_id)
+    return True
+
+
+def _clear_stale_schedule(router_id):
+    # Un routeur qui reçoit des SETMODE ne doit plus exécuter un ancien planning retenu
+    if router_id not in _SCHEDULE_CLEARED:
+        clear_schedule(router_id)
+
+
+def send_heater_command(chauffe_eau_id):
+    """Envoie la commande actuelle d'un chauffe-eau"""
+    current_decision = get_current_decision(chauffe_eau_id)
+    if current_decision is None:
+        print(f"Aucune décision valide pour le chauffe-eau {chauffe_eau_id}")
+        return False
+    return send_setmode(chauffe_eau_id, current_decision)
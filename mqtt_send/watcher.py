@@ -1,73 +1,164 @@
+"""
+watcher.py - Envoi des commandes dès qu'une nouvelle décision est enregistrée.
+
+Deux sources de décisions, combinables (clé decision_source de
+config/mqtt_config_send.txt) :
+
+- events : add_decision notifie le hook de data.com_bdd, qui pousse le
+  chauffe-eau sur une file en mémoire ; le thread d'envoi la consomme
+  immédiatement (optimiseur et émetteur dans le même processus, cf. main.py) ;
+- db : pour un optimiseur dans un autre processus, relecture périodique des
+  décisions d'id_decision supérieur au dernier vu (clé primaire, donc une
+  lecture d'index et non un parcours de la table).
+
+events est la source par défaut : main.py fait tourner l'optimiseur et
+l'envoi dans le même processus, sans aucune requête périodique. db et both
+ne servent que si l'optimiseur tourne dans un autre processus ; avec les
+deux (both), une décision déjà envoyée par la file n'est pas renvoyée par
+la relecture BDD.
+
+Chaque nouveau planning est confié au SlotDispatcher (dispatcher.py), qui
+envoie la commande courante puis suit les changements de créneau.
+"""
+
+import queue
+import threading
 import time
 from datetime import datetime
-import threading
-from .sender import send_command
-from data.com_bdd import get_connection
 
+from .decision_executor import DECISION_INDEX
+from .dispatcher import SlotDispatcher
+from data.com_bdd import get_decisions_since, get_max_decision_id, register_change_hook
 
-class DecisionsDBHandler:
-    """Surveille les changements dans la table decision de la BDD"""
-    
-    def __init__(self, check_interval=5):
-        self.check_interval = check_interval
-        self.last_check = datetime.now()
-        self.running = True
-    
-    def check_database_changes(self):
-        """Vérifie les nouvelles décisions dans la base de données"""
+SOURCES = ("events", "db", "both")
+EVENT_QUEUE_SIZE = 100_000
+DB_BATCH = 1000
+
+
+class DecisionWatcher:
+    """Envoie la commande d'un chauffe-eau à chaque nouveau planning"""
+
+    def __init__(self, source="events", poll_interval=5, dispatcher=None):
+        if source not in SOURCES:
+            raise ValueError(f"decision_source invalide {source!r} (attendu : {', '.join(SOURCES)})")
+        self.source = source
+        self.poll_interval = poll_interval
+        self.dispatcher = dispatcher or SlotDispatcher()
+        self.events = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self.watermark = None           # dernier id_decision lu en BDD
+        self.running = False
+        self._sent = {}                 # chauffe_eau_id -> id_decision de la dernière commande envoyée
+        self._lock = threading.Lock()
+        self._threads = []
+        self.stats = {"events": 0, "db_decisions": 0, "sent": 0, "skipped": 0, "overflow": 0}
+
+    # --- file en mémoire ------------------------------------------------------
+
+    def _on_change(self, table, chauffe_eau_id=None, schedule=None, **_):
+        if table != "decision" or schedule is None:
+            return
+        try:
+            self.events.put_nowait(schedule)
+        except queue.Full:
+            # Perdu en source events seule ; la relecture BDD (source both) le rattrape
+            self.stats["overflow"] += 1
+
+    def _consume_events(self):
         while self.running:
-            conn = None
             try:
-                conn = get_connection()
-                cur = conn.cursor()
-                
-                cur.execute("""
-                    SELECT DISTINCT client_id 
-                    FROM decision 
-                    WHERE timestamp_creation > %s
-                    ORDER BY timestamp_creation DESC
-                """, (self.last_check,))
-                
-                new_clients = cur.fetchall()
-                self.last_check = datetime.now()
-                
-                for (client_id,) in new_clients:
-                    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] Nouvelle décision détectée pour client {client_id}")
-                    try:
-                        send_command(str(client_id))
-                    except Exception as exc:
-                        print(f"[DB Watcher] Erreur d’envoi pour client {client_id}: {exc}")
-            
+                schedules = [self.events.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            # Regrouper ce qui est déjà en attente : un seul envoi par chauffe-eau
+            while len(schedules) < DB_BATCH:
+                try:
+                    schedules.append(self.events.get_nowait())
+                except queue.Empty:
+                    break
+            self.stats["events"] += len(schedules)
+            self._dispatch(schedules)
+
+    # --- relecture BDD ----------------------------------------------------------
+
+    def _poll_database(self):
+        while self.running:
+            try:
+                if self.watermark is None:
+                    # Au démarrage : seules les décisions à venir sont suivies
+                    self.watermark = get_max_decision_id()
+                else:
+                    while True:
+                        self.watermark, schedules = get_decisions_since(self.watermark, DB_BATCH)
+                        if not schedules:
+                            break
+                        for schedule in schedules:
+                            DECISION_INDEX.update(schedule)
+                        self.stats["db_decisions"] += len(schedules)
+                        self._dispatch(schedules)
+                        if len(schedules) < DB_BATCH:
+                            break
             except Exception as exc:
                 print(f"[DB Watcher] Erreur base de données: {exc}")
-            
-            finally:
-                if conn:
-                    conn.close()
-            
-            time.sleep(self.check_interval)
-    
+            time.sleep(self.poll_interval)
+
+    # --- envoi ------------------------------------------------------------------
+
+    def _dispatch(self, schedules):
+        latest = {}
+        for schedule in schedules:
+            current = latest.get(schedule.chauffe_eau_id)
+            if current is None or (schedule.id_decision or 0) > (current.id_decision or 0):
+                latest[schedule.chauffe_eau_id] = schedule
+
+        for ce_id, schedule in latest.items():
+            with self._lock:
+                if schedule.id_decision is not None and schedule.id_decision <= self._sent.get(ce_id, 0):
+                    self.stats["skipped"] += 1
+                    continue
+                self._sent[ce_id] = schedule.id_decision or 0
+            print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] Nouvelle décision pour le chauffe-eau {ce_id}")
+            try:
+                if self.dispatcher.apply(schedule):
+                    self.stats["sent"] += 1
+            except Exception as exc:
+                print(f"[Watcher] Erreur d’envoi pour le chauffe-eau {ce_id}: {exc}")
+
+    # --- cycle de vie -------------------------------------------------------------
+
     def start(self):
         """Démarrer la surveillance en arrière-plan"""
-        thread = threading.Thread(target=self.check_database_changes)
-        thread.daemon = True
-        thread.start()
-    
+        self.running = True
+        # Plannings en cours : commande courante renvoyée, puis suivi des changements de créneau
+        print(f"[Watcher] {self.dispatcher.load()} plannings actifs")
+        self.dispatcher.start()
+        targets = []
+        if self.source in ("events", "both"):
+            register_change_hook(self._on_change)
+            targets.append(self._consume_events)
+        if self.source in ("db", "both"):
+            targets.append(self._poll_database)
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
     def stop(self):
         """Arrêter la surveillance"""
         self.running = False
+        self.dispatcher.stop()
 
 
-def run_db_watcher(check_interval: int = 5) -> None:
-    """Lancer la surveillance de la BDD"""
-    db_handler = DecisionsDBHandler(check_interval=check_interval)
-    db_handler.start()
+def run_watcher(source="events", poll_interval=5) -> None:
+    """Lancer la surveillance des décisions"""
+    watcher = DecisionWatcher(source=source, poll_interval=poll_interval)
+    watcher.start()
 
-    print(f"[DB Watcher] Surveillance BDD toutes les {check_interval}s (Ctrl-C pour arrêter)")
+    print(f"[Watcher] Décisions suivies par {source} (relecture BDD toutes les {poll_interval}s) "
+          f"(Ctrl-C pour arrêter)")
 
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        print("\n[DB Watcher] Arrêt demandé, fermeture propre...")
-        db_handler.stop()
+        print("\n[Watcher] Arrêt demandé, fermeture propre...")
+        watcher.stop()
@@ -1,18 +1,33 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Mapping, Optional, Sequence, Tuple
 
-def aggregate_forecasts(forecast_dicts: List[Dict[str, Any]]) -> Dict[str, Any]:
+import numpy as np
+
+EMPTY_FORECAST = {"times": [], "irradiance": [], "temperature": []}
+
+
+def aggregate_forecasts(forecast_dicts: List[Dict[str, Any]], step_min: Optional[int] = None,
+                        weights: Optional[Mapping[str, float]] = None) -> Dict[str, Any]:
     """
-    Aggregates a list of forecast dictionaries by averaging irradiance and temperature per hour.
+    Aggregates a list of forecast dictionaries on a common time index.
+
+    Every source is placed on a UTC index (its local "times" shifted by its
+    "utc_offset_seconds"), resampled to a grid of *step_min* minutes covering
+    all sources, then combined by a weighted mean that ignores missing values.
 
     Parameters:
         forecast_dicts (List[Dict[str, Any]]): A list of standardized forecast outputs,
-        each containing keys: "times", "irradiance", and optionally "temperature".
+        each containing keys: "times", "irradiance", and optionally "temperature",
+        "utc_offset_seconds" and "provider".
+        step_min (int, optional): resolution of the result in minutes; defaults to
+        the native step of the first valid source.
+        weights (Mapping[str, float], optional): weight of each provider (default 1).
 
     Returns:
         Dict[str, Any]: A single dictionary containing:
-            - "times": hourly timestamps (ISO format),
-            - "irradiance": averaged irradiance values per hour,
-            - "temperature": averaged temperature values per hour (or empty list if unavailable).
+            - "times": timestamps (ISO format, local time of the first valid source),
+            - "irradiance": averaged irradiance values per step (None where no source has data),
+            - "temperature": averaged temperature values per step (or empty list if unavailable),
+            - "utc_offset_seconds": offset of "times" from UTC.
     """
     # Filter out empty or invalid forecast sources
     valid = [f for f in forecast_dicts if f["irradiance"] and f["times"]]
@@ -20,25 +35,200 @@ def aggregate_forecasts(forecast_dicts: List[Dict[str, Any]]) -> Dict[str, Any]:
     # If no valid forecasts are available, return an empty result
     if not valid:
         print("[Aggregator] No valid forecast sources.")
-        return {"times": [], "irradiance": [], "temperature": []}
+        return dict(EMPTY_FORECAST)
+
+    if step_min is None:
+        step_min = native_step_min(valid[0])
+    utc_offset = int(valid[0].get("utc_offset_seconds") or 0)
+
+    grid, irradiance, temperature = align_forecasts(valid, step_min)
+    source_weights = provider_weights(valid, weights)
+    avg_irr = weighted_mean(irradiance, source_weights[:, None], axis=0)
+    avg_temp = weighted_mean(temperature, source_weights[:, None], axis=0)
+
+    return {
+        "times": format_times(grid, utc_offset),
+        "irradiance": to_list(avg_irr),
+        "temperature": to_list(avg_temp) if not np.isnan(avg_temp).all() else [],
+        "utc_offset_seconds": utc_offset,
+    }
+
+
+def aggregate_fleet(fleet_forecasts: Mapping[Any, Sequence[Dict[str, Any]]], step_min: int,
+                    weights: Optional[Mapping[str, float]] = None,
+                    start: Optional[np.datetime64] = None,
+                    end: Optional[np.datetime64] = None) -> Dict[str, Any]:
+    """
+    Aggregates the forecasts of a whole fleet in one pass.
+
+    All sources of all clients are resampled on the same UTC grid and stacked
+    in a (clients x sources x steps) array, padded with NaN; the per-client
+    weighted mean is then a single reduction over the sources axis.
 
-    # Assume that all forecasts use the same hourly timestamps
-    times = valid[0]["times"]
+    Parameters:
+        fleet_forecasts (Mapping): client_id -> list of standardized forecasts.
+        step_min (int): resolution of the grid in minutes.
+        weights (Mapping[str, float], optional): weight of each provider (default 1).
+        start, end (datetime64, optional): UTC bounds of the grid; default to the
+        span of all sources.
+
+    Returns:
+        Dict[str, Any]: {
+            "client_ids": list of client ids (row order),
+            "times_utc": datetime64[s] array of the grid (UTC),
+            "irradiance": 2-D float array (clients x steps), NaN where missing,
+            "temperature": 2-D float array (clients x steps), NaN where missing,
+        }
+    """
+    client_ids = list(fleet_forecasts)
+    sources = [[f for f in fleet_forecasts[c] if f["irradiance"] and f["times"]] for c in client_ids]
+    series = [forecast_to_arrays(f) for client_sources in sources for f in client_sources]
+    grid = utc_grid([times for times, _, _ in series], step_min, start, end)
 
-    # Collect irradiance lists from each valid source
-    irr_lists = [f["irradiance"] for f in valid]
-    avg_irr = average_lists(irr_lists)
+    n_sources = max((len(s) for s in sources), default=0)
+    irradiance = np.full((len(client_ids), n_sources, len(grid)), np.nan)
+    temperature = np.full_like(irradiance, np.nan)
+    source_weights = np.zeros((len(client_ids), n_sources))
 
-    # Collect temperature lists if present
-    temp_lists = [f["temperature"] for f in valid if f["temperature"]]
-    avg_temp = average_lists(temp_lists) if temp_lists else []
+    k = 0
+    for i, client_sources in enumerate(sources):
+        source_weights[i, :len(client_sources)] = provider_weights(client_sources, weights)
+        for j in range(len(client_sources)):
+            times, irr, temp = series[k]
+            irradiance[i, j] = resample(times, irr, grid, step_min)
+            temperature[i, j] = resample(times, temp, grid, step_min)
+            k += 1
 
     return {
-        "times": times,
-        "irradiance": avg_irr,
-        "temperature": avg_temp
+        "client_ids": client_ids,
+        "times_utc": grid.astype("datetime64[s]"),
+        "irradiance": weighted_mean(irradiance, source_weights[:, :, None], axis=1),
+        "temperature": weighted_mean(temperature, source_weights[:, :, None], axis=1),
     }
 
+
+def forecast_to_arrays(forecast: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Converts a standardized forecast to arrays sorted by time.
+
+    Returns:
+        (times, irradiance, temperature): UTC epoch seconds (int64) and float
+        values, NaN where the source has no value.
+    """
+    local = np.array(forecast["times"], dtype="datetime64[s]").astype(np.int64)
+    times = local - int(forecast.get("utc_offset_seconds") or 0)
+    irradiance = _values(forecast.get("irradiance"), len(times))
+    temperature = _values(forecast.get("temperature"), len(times))
+    order = np.argsort(times, kind="stable")
+    return times[order], irradiance[order], temperature[order]
+
+
+def _values(values: Optional[Sequence[Optional[float]]], n: int) -> np.ndarray:
+    out = np.full(n, np.nan)
+    if values:
+        values = np.array(values[:n], dtype=float)  # None -> nan
+        out[:len(values)] = values
+    return out
+
+
+def native_step_min(forecast: Dict[str, Any]) -> int:
+    """Time step of a source in minutes (median spacing, 60 if undefined)."""
+    times = np.array(forecast["times"], dtype="datetime64[m]").astype(np.int64)
+    if len(times) < 2:
+        return 60
+    return max(1, int(np.median(np.diff(np.sort(times)))))
+
+
+def utc_grid(times_list: Sequence[np.ndarray], step_min: int,
+             start: Optional[np.datetime64] = None, end: Optional[np.datetime64] = None) -> np.ndarray:
+    """Regular UTC grid (epoch seconds) of *step_min* covering all series, or [start, end)."""
+    step_s = step_min * 60
+    non_empty = [t for t in times_list if len(t)]
+    if start is None:
+        if not non_empty:
+            return np.empty(0, dtype=np.int64)
+        first = min(int(t[0]) for t in non_empty)
+    else:
+        first = int(np.datetime64(start, "s").astype(np.int64))
+    if end is None:
+        if not non_empty:
+            return np.empty(0, dtype=np.int64)
+        stop = max(int(t[-1]) for t in non_empty) + 1
+    else:
+        stop = int(np.datetime64(end, "s").astype(np.int64))
+    first -= first % step_s
+    return np.arange(first, stop, step_s, dtype=np.int64)
+
+
+def resample(times: np.ndarray, values: np.ndarray, grid: np.ndarray, step_min: int) -> np.ndarray:
+    """
+    Resamples a series (sorted UTC seconds) on *grid*.
+
+    Finer grids are linearly interpolated; coarser grids take the mean of the
+    source points falling in each step. Steps outside the source span, or
+    depending on a missing source value, are NaN.
+    """
+    if len(times) == 0 or len(grid) == 0:
+        return np.full(len(grid), np.nan)
+
+    step_s = step_min * 60
+    source_step = np.median(np.diff(times)) if len(times) > 1 else step_s
+    if step_s <= source_step:
+        return np.interp(grid, times, values, left=np.nan, right=np.nan)
+
+    slot = (times - grid[0]) // step_s
+    ok = (slot >= 0) & (slot < len(grid)) & ~np.isnan(values)
+    sums = np.bincount(slot[ok], values[ok], minlength=len(grid))
+    counts = np.bincount(slot[ok], minlength=len(grid))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def align_forecasts(forecast_dicts: Sequence[Dict[str, Any]], step_min: int,
+                    start: Optional[np.datetime64] = None,
+                    end: Optional[np.datetime64] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Resamples several sources on a common UTC grid.
+
+    Returns:
+        (grid, irradiance, temperature): grid in UTC epoch seconds and two
+        (sources x steps) arrays, NaN where a source has no value.
+    """
+    series = [forecast_to_arrays(f) for f in forecast_dicts]
+    grid = utc_grid([times for times, _, _ in series], step_min, start, end)
+    irradiance = np.array([resample(t, irr, grid, step_min) for t, irr, _ in series]).reshape(len(series), len(grid))
+    temperature = np.array([resample(t, temp, grid, step_min) for t, _, temp in series]).reshape(len(series), len(grid))
+    return grid, irradiance, temperature
+
+
+def provider_weights(forecast_dicts: Sequence[Dict[str, Any]],
+                     weights: Optional[Mapping[str, float]] = None) -> np.ndarray:
+    """Weight of each source, looked up by its "provider" key (default 1)."""
+    weights = weights or {}
+    return np.array([float(weights.get(f.get("provider"), 1.0)) for f in forecast_dicts])
+
+
+def weighted_mean(values: np.ndarray, weights: np.ndarray, axis: int) -> np.ndarray:
+    """Weighted mean along *axis*, ignoring NaN; NaN where no source has a value."""
+    mask = ~np.isnan(values)
+    w = np.where(mask, weights, 0.0)
+    total = w.sum(axis=axis)
+    weighted = np.where(mask, values, 0.0) * w
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total > 0, weighted.sum(axis=axis) / total, np.nan)
+
+
+def format_times(grid: np.ndarray, utc_offset: int = 0) -> List[str]:
+    """UTC epoch seconds -> local ISO timestamps ("%Y-%m-%dT%H:%M")."""
+    local = (grid + utc_offset).astype("datetime64[s]").astype("datetime64[m]")
+    return [str(t) for t in local]
+
+
+def to_list(values: np.ndarray) -> List[Optional[float]]:
+    """Float array -> list, NaN as None."""
+    return [None if v != v else v for v in values.tolist()]
+
+
 def average_lists(list_of_lists: List[List[float]]) -> List[float]:
     """
     Computes the element-wise average of multiple aligned lists.
@@ -1,19 +1,18 @@
 # apis/open_meteo.py
 
-import requests
 from datetime import date, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, List, Sequence, Tuple
 
-def get_forecast(latitude: float, longitude: float) -> Dict[str, Any]:
-    """
-    Get 24h solar irradiance and temperature forecast from Open-Meteo.
-    """
-    url = "https://api.open-meteo.com/v1/forecast"
+from weather.http_session import RateLimited, check_rate_limit, get_session
+
+PROVIDER = "open_meteo"
+URL = "https://api.open-meteo.com/v1/forecast"
+MAX_BATCH = 100  # locations per request
 
+def _params(latitude, longitude) -> Dict[str, Any]:
     today = date.today()
     tomorrow = today + timedelta(days=1)
-
-    params = {
+    return {
         "latitude": latitude,
         "longitude": longitude,
         "start_date": today.isoformat(),
@@ -22,17 +21,67 @@ def get_forecast(latitude: float, longitude: float) -> Dict[str, Any]:
         "timezone": "auto"
     }
 
+def _parse(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "times": data["hourly"]["time"],
+        "irradiance": data["hourly"]["shortwave_radiation"],
+        "temperature": data["hourly"]["temperature_2m"],
+        "utc_offset_seconds": data.get("utc_offset_seconds", 0),
+        "provider": PROVIDER
+    }
+
+def get_forecast(latitude: float, longitude: float, timeout: float = 10) -> Dict[str, Any]:
+    """
+    Get 24h solar irradiance and temperature forecast from Open-Meteo.
+
+    Uses the pooled Open-Meteo session; *timeout* applies to the connection
+    and to each read. Raises RateLimited on HTTP 429.
+    """
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = get_session(PROVIDER).get(URL, params=_params(latitude, longitude), timeout=timeout)
+        check_rate_limit(PROVIDER, response)
         response.raise_for_status()
-        data = response.json()
-
-        return {
-            "times": data["hourly"]["time"],
-            "irradiance": data["hourly"]["shortwave_radiation"],
-            "temperature": data["hourly"]["temperature_2m"]
-        }
+        return _parse(response.json())
 
+    except RateLimited:
+        raise
     except Exception as e:
         print(f"[Open-Meteo] Error → {e}")
         return {"times": [], "irradiance": [], "temperature": []}
+
+def get_forecast_batch(points: Sequence[Tuple[float, float]], batch_size: int = MAX_BATCH,
+                       timeout: float = 10) -> List[Dict[str, Any]]:
+    """
+    Get the forecasts of several locations with one request per *batch_size* points.
+
+    Open-Meteo accepts comma-separated latitude/longitude lists and answers
+    with one forecast per location, in order. Returns the standard dicts in
+    the order of *points*. If a batch request fails, its points are retried
+    one by one, so a single bad point cannot take its whole batch down.
+    HTTP 429 is not retried: RateLimited is raised to the caller.
+    """
+    results: List[Dict[str, Any]] = []
+    batch_size = max(1, min(batch_size, MAX_BATCH))
+    for i in range(0, len(points), batch_size):
+        chunk = points[i:i + batch_size]
+        if len(chunk) == 1:
+            results.append(get_forecast(*chunk[0], timeout=timeout))
+            continue
+        params = _params(",".join(f"{lat:.5f}" for lat, _ in chunk),
+                         ",".join(f"{lon:.5f}" for _, lon in chunk))
+        try:
+            response = get_session(PROVIDER).get(URL, params=params, timeout=timeout)
+            check_rate_limit(PROVIDER, response)
+            response.raise_for_status()
+            data = response.json()
+            if not isinstance(data, list) or len(data) != len(chunk):
+                raise ValueError(f"expected {len(chunk)} locations, got {len(data) if isinstance(data, list) else 1}")
+            parsed = [_parse(item) for item in data]
+        except RateLimited:
+            raise
+        except Exception as e:
+            print(f"[Open-Meteo] Batch of {len(chunk)} failed ({e}), retrying points individually")
+            results.extend(get_forecast(lat, lon, timeout=timeout) for lat, lon in chunk)
+            continue
+        results.extend(parsed)
+    return results
@@ -1,53 +1,107 @@
 # client_weather_processor.py - VERSION FINALE CORRIGÉE
-from .client_api_fetcher import get_client_production
-from .apis.open_meteo import get_forecast as get_open_meteo
+from .apis.open_meteo import PROVIDER as OPEN_METEO, MAX_BATCH as OPEN_METEO_MAX_BATCH
 from .aggregator import aggregate_forecasts
+from .providers import client_providers, get_provider, guarded_fetch, provider_options
+from .forecast_cache import ForecastCache
+from .pv_model import fleet_production
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 import os
 import sys
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from data.com_bdd import get_client, add_prevision_production
+from data.com_bdd import get_client, add_previsions_production
 
-def process_client_weather(client_id: str) -> None:
-    print(f"[Processor] Processing client: {client_id}")
 
-    client_data = get_client(client_id)
-    if not client_data:
-        print(f"[Processor] Client {client_id} non trouvé")
-        return
+def fetch_locations_forecasts(locations: Sequence[Tuple[float, float]], timeout: float = 10,
+                              cache: Optional[ForecastCache] = None,
+                              batch_size: int = OPEN_METEO_MAX_BATCH,
+                              provider_name: str = OPEN_METEO) -> List[Optional[Dict[str, Any]]]:
+    """
+    Network stage: raw forecasts of one shared provider for several locations.
+    Does not touch the database, so it can run in a worker thread.
+
+    Provider responses are looked up in *cache* first; the remaining
+    locations are requested *batch_size* at a time (if the provider supports
+    batches) through its circuit breaker, and stored in the cache.
+    Returns one forecast per location, in order; None where the provider
+    is unavailable.
+    """
+    provider = get_provider(provider_name)
+    meteo = [cache.get(provider_name, lat, lon) if cache is not None else None for lat, lon in locations]
+    missing = [i for i, m in enumerate(meteo) if m is None]
+    if missing:
+        fetched = guarded_fetch(provider, [(float(locations[i][0]), float(locations[i][1])) for i in missing],
+                                timeout, batch_size)
+        for i, forecast in zip(missing, fetched):
+            meteo[i] = forecast
+            if cache is not None and forecast and forecast["irradiance"]:
+                cache.put(provider_name, locations[i][0], locations[i][1], forecast)
+    return meteo
 
+
+def fetch_location_forecast(latitude: float, longitude: float, timeout: float = 10,
+                            cache: Optional[ForecastCache] = None,
+                            provider_name: str = OPEN_METEO) -> Dict[str, Any]:
+    """Fetch and aggregate the forecast of a single location from one shared provider."""
+    forecast = fetch_locations_forecasts([(latitude, longitude)], timeout, cache, 1, provider_name)[0]
+    return aggregate_forecasts([forecast] if forecast else [])
+
+
+def fetch_client_forecast(client_data: Dict[str, Any], timeout: float = 10,
+                          cache: Optional[ForecastCache] = None,
+                          default_providers: Sequence[str] = (OPEN_METEO,)) -> Optional[Dict[str, Any]]:
+    """
+    Fetch the forecast at the client's own position from each of its providers,
+    one after the other, and aggregate them with the configured weights.
+    Returns None if the client has no GPS coordinates.
+    """
     latitude = client_data.get('latitude')
     longitude = client_data.get('longitude')
-    
+
     if latitude is None or longitude is None:
-        print(f"[Processor] Client {client_id} n'a pas de coordonnées GPS")
+        print(f"[Processor] Client {client_data.get('client_id')} n'a pas de coordonnées GPS")
+        return None
+
+    configs = client_providers(client_data, default_providers)
+    sources = []
+    for config in configs:
+        provider = get_provider(config["provider"])
+        if provider.shared:
+            forecast = fetch_locations_forecasts([(latitude, longitude)], timeout, cache, 1, provider.name)[0]
+        else:
+            forecast = guarded_fetch(provider, [(latitude, longitude)], timeout, 1, provider_options(config))[0]
+        if forecast:
+            sources.append(forecast)
+    return aggregate_forecasts(sources, weights=provider_weights(configs))
+
+
+def provider_weights(configs: Sequence[Dict[str, Any]]) -> Dict[str, float]:
+    """{provider: weight} of a client's provider configuration (default weight 1)."""
+    return {config["provider"]: float(config.get("weight", 1)) for config in configs}
+
+
+def store_client_production(client_id, previsions: List[Tuple[str, float]]) -> int:
+    """DB stage: save a client's production forecast [(timestamp, kW), ...] in one transaction."""
+    if not previsions:
+        print(f"[Processor] Aucune donnée de prévision à sauvegarder pour client {client_id}")
+        return 0
+
+    saved = add_previsions_production(client_id, previsions)
+    print(f"[Processor] {saved} prévisions sauvegardées pour client {client_id}")
+    return saved
+
+
+def process_client_weather(client_id: str, step_min: int = 15) -> None:
+    print(f"[Processor] Processing client: {client_id}")
+
+    client_data = get_client(client_id)
+    if not client_data:
+        print(f"[Processor] Client {client_id} non trouvé")
         return
 
-    print(f"[Processor] Localisation: {latitude}, {longitude}")
-
-    forecast_mode = "default"
-    forecast = {}
-
-    if forecast_mode == "custom":
-        print("[Processor] Using custom forecast API...")
-        api_config = {}
-        forecast = get_client_production(api_config)
-    else:
-        print("[Processor] Using default weather sources...")
-        sources = []
-        meteo = get_open_meteo(latitude, longitude)
-        if meteo["irradiance"]:
-            sources.append(meteo)
-
-        forecast = aggregate_forecasts(sources)
-
-    if forecast and forecast["irradiance"]:
-        for i, (timestamp, irradiance) in enumerate(zip(forecast["times"], forecast["irradiance"])):
-            puissance_kw = irradiance / 1000
-            
-            add_prevision_production(client_id, puissance_kw, timestamp)
-        
-        print(f"[Processor] {len(forecast['irradiance'])} prévisions sauvegardées pour client {client_id}")
-    else:
-        print(f"[Processor] Aucune donnée de prévision à sauvegarder pour client {client_id}")
\ No newline at end of file
+    print(f"[Processor] Localisation: {client_data.get('latitude')}, {client_data.get('longitude')}")
+    forecast = fetch_client_forecast(client_data)
+    if forecast is not None:
+        production = fleet_production([client_data], {client_data["client_id"]: forecast}, step_min)
+        store_client_production(client_id, production.get(client_data["client_id"], []))
@@ -0,0 +1,181 @@
+"""
+forecast_cache.py
+
+Persistent on-disk forecast cache shared by all runs of the weather job.
+
+Entries are keyed by provider, location (grid cell center) and forecast
+date, and stored one file per key under ``<cache_dir>/<provider>/<date>/``.
+Each file is a small binary record: a fixed header followed by three
+float64 arrays (timestamps, irradiance, temperature), read back through
+``mmap``. Entries older than the TTL are ignored, and the oldest files are
+evicted once the cache grows past its size budget.
+
+The cache is consulted before any network call, so a restart or a
+redeploy right after a refresh does not re-fetch the whole fleet.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# magic, format version, utc offset (s), number of points
+_HEADER = struct.Struct("<4sHxxiI")
+_MAGIC = b"OFC1"
+_VERSION = 1
+_TIME_FORMAT = "%Y-%m-%dT%H:%M"
+_SUFFIX = ".bin"
+
+
+def _to_epoch(timestamp: str) -> float:
+    """Naive ISO timestamp (provider local time) -> seconds, treated as UTC."""
+    return datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
+
+
+def _from_epoch(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).strftime(_TIME_FORMAT)
+
+
+def encode_forecast(forecast: Dict[str, Any]) -> bytes:
+    """Standard forecast dict -> binary record (missing values stored as NaN)."""
+    times = forecast["times"]
+    n = len(times)
+    temperature = forecast.get("temperature") or []
+    values = array("d", (_to_epoch(t) for t in times))
+    values.extend(float("nan") if v is None else float(v) for v in forecast["irradiance"][:n])
+    values.extend(float("nan") if v is None else float(v) for v in temperature[:n])
+    values.extend(float("nan") for _ in range(3 * n - len(values)))
+    header = _HEADER.pack(_MAGIC, _VERSION, int(forecast.get("utc_offset_seconds", 0)), n)
+    return header + values.tobytes()
+
+
+def decode_forecast(buffer) -> Optional[Dict[str, Any]]:
+    """Binary record -> standard forecast dict, or None if the record is not valid."""
+    if len(buffer) < _HEADER.size:
+        return None
+    magic, version, utc_offset, n = _HEADER.unpack_from(buffer, 0)
+    if magic != _MAGIC or version != _VERSION or len(buffer) < _HEADER.size + 24 * n:
+        return None
+    values = memoryview(buffer)[_HEADER.size:_HEADER.size + 24 * n].cast("d")
+    try:
+        times = [_from_epoch(t) for t in values[:n]]
+        irradiance = [None if v != v else v for v in values[n:2 * n]]
+        temperature = [None if v != v else v for v in values[2 * n:]]
+    finally:
+        values.release()
+    if all(v is None for v in temperature):
+        temperature = []
+    return {
+        "times": times,
+        "irradiance": irradiance,
+        "temperature": temperature,
+        "utc_offset_seconds": utc_offset,
+    }
+
+
+class ForecastCache:
+    """Thread-safe file cache with TTL and size-based (oldest first) eviction."""
+
+    def __init__(self, cache_dir, ttl_s: float = 3 * 3600, max_bytes: int = 200 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[Path, tuple]] = None   # path -> (size, mtime)
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, provider: str, latitude: float, longitude: float, day: date) -> Path:
+        name = f"{latitude:.5f}_{longitude:.5f}{_SUFFIX}"
+        return self.cache_dir / provider / day.isoformat() / name
+
+    def _load_index(self) -> None:
+        """Scan the cache directory once; later puts/evictions keep the index current."""
+        if self._index is not None:
+            return
+        self._index = {}
+        self._total = 0
+        if self.cache_dir.is_dir():
+            for path in self.cache_dir.rglob(f"*{_SUFFIX}"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                self._index[path] = (stat.st_size, stat.st_mtime)
+                self._total += stat.st_size
+
+    def get(self, provider: str, latitude: float, longitude: float, day: Optional[date] = None):
+        """Return the cached forecast, or None if absent, expired or unreadable."""
+        path = self._path(provider, latitude, longitude, day or date.today())
+        try:
+            stat = path.stat()
+            if time.time() - stat.st_mtime > self.ttl_s or stat.st_size == 0:
+                raise FileNotFoundError(path)
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                forecast = decode_forecast(mm)
+            if forecast is not None:
+                forecast["provider"] = provider
+        except (OSError, ValueError):
+            forecast = None
+        with self._lock:
+            if forecast is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return forecast
+
+    def put(self, provider: str, latitude: float, longitude: float, forecast: Dict[str, Any],
+            day: Optional[date] = None) -> None:
+        """Store a forecast (atomic write), then evict the oldest files if over budget."""
+        if not forecast or not forecast.get("times"):
+            return
+        path = self._path(provider, latitude, longitude, day or date.today())
+        data = encode_forecast(forecast)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._load_index()
+            old = self._index.get(path)
+            if old is not None:
+                self._total -= old[0]
+            self._index[path] = (len(data), time.time())
+            self._total += len(data)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Delete the oldest entries until the cache is back under 90 % of its budget."""
+        target = self.max_bytes * 0.9
+        for path, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            del self._index[path]
+            self._total -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._index) if self._index is not None else None,
+                "bytes": self._total if self._index is not None else None,
+            }
@@ -0,0 +1,53 @@
+"""
+geo_grid.py
+
+Snap client coordinates to a regular grid so that nearby clients share a
+single weather request.
+
+Cells are ``cell_m`` metres high; their width in degrees of longitude is
+widened with the latitude of the cell row so that cells stay roughly square
+everywhere. A cell is identified by its integer (row, column) indices.
+"""
+
+import math
+from typing import Any, Dict, Iterable, Tuple
+
+METERS_PER_DEGREE = 111_320.0
+
+
+def snap_to_grid(latitude: float, longitude: float, cell_m: float) -> Tuple[Tuple[int, int], float, float]:
+    """
+    Return ``((row, col), center_latitude, center_longitude)`` of the cell
+    containing the point. With ``cell_m <= 0`` every point is its own cell.
+    """
+    if cell_m <= 0:
+        return (latitude, longitude), latitude, longitude
+
+    dlat = cell_m / METERS_PER_DEGREE
+    row = math.floor(latitude / dlat)
+    center_lat = (row + 0.5) * dlat
+
+    dlon = cell_m / (METERS_PER_DEGREE * max(math.cos(math.radians(center_lat)), 1e-6))
+    col = math.floor(longitude / dlon)
+    center_lon = (col + 0.5) * dlon
+    return (row, col), round(center_lat, 5), round(center_lon, 5)
+
+
+def group_by_cell(clients: Iterable[Dict[str, Any]], cell_m: float) -> Dict[Tuple, Dict[str, Any]]:
+    """
+    Group clients (dicts with client_id, latitude, longitude) by grid cell.
+
+    Returns ``{cell: {"latitude": ..., "longitude": ..., "client_ids": [...]}}``
+    where latitude/longitude are the cell center. Clients without
+    coordinates are left out.
+    """
+    cells: Dict[Tuple, Dict[str, Any]] = {}
+    for client in clients:
+        latitude, longitude = client.get("latitude"), client.get("longitude")
+        if latitude is None or longitude is None:
+            print(f"[Grid] Client {client.get('client_id')} n'a pas de coordonnées GPS")
+            continue
+        cell, lat, lon = snap_to_grid(float(latitude), float(longitude), cell_m)
+        entry = cells.setdefault(cell, {"latitude": lat, "longitude": lon, "client_ids": []})
+        entry["client_ids"].append(client["client_id"])
+    return cells
@@ -0,0 +1,61 @@
+"""
+http_session.py
+
+Connection-pooled ``requests`` sessions, one per weather provider.
+
+Reusing a session keeps TCP/TLS connections to the provider alive between
+calls, so a fleet refresh pays the handshake once per pooled connection
+instead of once per client. ``requests.Session`` is safe to share between
+the fetch threads for simple GET calls.
+"""
+
+import threading
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_MAXSIZE = 32
+
+_sessions: Dict[str, requests.Session] = {}
+_lock = threading.Lock()
+
+
+class RateLimited(Exception):
+    """HTTP 429 from a provider; *retry_after* in seconds when the provider sent one."""
+
+    def __init__(self, provider: str, retry_after: Optional[float] = None):
+        super().__init__(f"{provider} rate limited (Retry-After: {retry_after})")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+def check_rate_limit(provider: str, response: requests.Response) -> None:
+    """Raise RateLimited if *response* is an HTTP 429."""
+    if response.status_code == 429:
+        retry_after = response.headers.get("Retry-After", "")
+        raise RateLimited(provider, float(retry_after) if retry_after.strip().isdigit() else None)
+
+
+def get_session(provider: str) -> requests.Session:
+    """Return the shared session of *provider*, creating it on first use."""
+    session = _sessions.get(provider)
+    if session is not None:
+        return session
+    with _lock:
+        session = _sessions.get(provider)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[provider] = session
+    return session
+
+
+def close_sessions() -> None:
+    """Close every pooled session (connections are reopened on next use)."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,309 @@
+"""
+providers.py
+
+Registry of weather providers, with a circuit breaker and metrics per provider.
+
+Each provider is registered under a name and fetches standard forecast
+dicts ({"times", "irradiance", "temperature", ...}) for a list of
+locations. Clients choose their providers in ``clients.weather_providers``
+(JSON list, e.g. ``[{"provider": "open_meteo"}, {"provider": "solcast",
+"site_url": "...", "api_key": "...", "weight": 2}]``); clients without
+configuration use ``default_providers`` from weather_frequency.txt.
+
+*Shared* providers only depend on the location, so they are fetched once
+per grid cell and their results are reused by every client of the cell.
+The others take per-client options (API keys, site URLs) and are fetched
+per client.
+
+Calls go through ``guarded_fetch``: a provider that fails (or answers
+slower than ``slow_call_s``) ``failure_threshold`` times in a row is
+skipped for ``reset_timeout_s``, then probed again with a single call.
+Providers with a rate limit take one token per HTTP request from their
+bucket (see rate_limit.py) and pause on HTTP 429.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .apis import open_meteo, openweather_api, solcast_standard_api
+from .client_api_fetcher import get_client_production
+from .http_session import RateLimited
+from .rate_limit import TokenBucket
+
+EMPTY_FORECAST = {"times": [], "irradiance": [], "temperature": []}
+LATENCY_WINDOW = 1000  # latencies kept per provider for the percentiles
+RATE_LIMIT_WAIT_S: Optional[float] = None  # longest wait for a token (None: no limit)
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open (one probe) -> closed."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 300,
+                 slow_call_s: Optional[float] = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.slow_call_s = slow_call_s
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """True if a call may be made now."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout_s:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """End a call that neither succeeded nor failed (rate limited, no token)."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, success: bool, latency_s: float) -> None:
+        """Report the outcome of a call; a slow call counts as a failure."""
+        if self.slow_call_s and latency_s > self.slow_call_s:
+            success = False
+        with self._lock:
+            self._probing = False
+            if success:
+                self.failures = 0
+                self.state = "closed"
+                return
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class ProviderMetrics:
+    """Call counts and latencies of one provider (thread-safe)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.points = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, success: bool, latency_s: float, n_points: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.points += n_points
+            self.latencies.append(latency_s)
+            if not success:
+                self.errors += 1
+
+    def reject(self, n_points: int) -> None:
+        with self._lock:
+            self.rejected += n_points
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            calls, errors, rejected, points = self.calls, self.errors, self.rejected, self.points
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+
+        return {
+            "calls": calls,
+            "points": points,
+            "errors": errors,
+            "error_rate": errors / calls if calls else 0.0,
+            "rejected": rejected,
+            "latency_p50_s": percentile(0.5),
+            "latency_p95_s": percentile(0.95),
+            "latency_max_s": round(latencies[-1], 3) if latencies else None,
+        }
+
+
+class Provider:
+    """
+    A registered weather provider.
+
+    fetch(latitude, longitude, timeout, **options) -> forecast dict
+    fetch_batch(points, batch_size, timeout) -> list of forecast dicts (shared providers only)
+    """
+
+    def __init__(self, name: str, fetch: Callable[..., Dict[str, Any]],
+                 fetch_batch: Optional[Callable[..., List[Dict[str, Any]]]] = None,
+                 shared: bool = True, max_batch: int = 1):
+        self.name = name
+        self.fetch = fetch
+        self.fetch_batch = fetch_batch
+        self.shared = shared
+        self.max_batch = max_batch if fetch_batch is not None else 1
+        self.breaker = CircuitBreaker()
+        self.metrics = ProviderMetrics()
+        self.bucket: Optional[TokenBucket] = None
+
+
+PROVIDERS: Dict[str, Provider] = {}
+
+
+def register_provider(provider: Provider) -> Provider:
+    PROVIDERS[provider.name] = provider
+    return provider
+
+
+def get_provider(name: str) -> Optional[Provider]:
+    return PROVIDERS.get(name)
+
+
+def configure_breakers(failure_threshold: int, reset_timeout_s: float, slow_call_s: Optional[float]) -> None:
+    """Apply the breaker settings of weather_frequency.txt to every provider."""
+    for provider in PROVIDERS.values():
+        provider.breaker.failure_threshold = failure_threshold
+        provider.breaker.reset_timeout_s = reset_timeout_s
+        provider.breaker.slow_call_s = slow_call_s or None
+
+
+def configure_rate_limits(limits: Dict[str, float], max_wait_s: Optional[float] = None) -> None:
+    """
+    Give each provider of *limits* ({name: requests per minute}) a token bucket.
+    Calls wait at most *max_wait_s* for a token, then are skipped.
+    """
+    global RATE_LIMIT_WAIT_S
+    RATE_LIMIT_WAIT_S = max_wait_s
+    for name, rate_per_min in limits.items():
+        provider = PROVIDERS.get(name)
+        if provider is None:
+            print(f"[Providers] Rate limit for unknown provider {name!r} ignored")
+        elif provider.bucket is None or provider.bucket.rate_per_min != rate_per_min:
+            provider.bucket = TokenBucket(rate_per_min)
+
+
+def _take_tokens(provider: Provider, n_requests: int) -> bool:
+    """Take *n_requests* tokens within one RATE_LIMIT_WAIT_S deadline for the whole batch."""
+    if provider.bucket is None:
+        return True
+    if RATE_LIMIT_WAIT_S is None:
+        return all(provider.bucket.acquire() for _ in range(n_requests))
+    deadline = time.monotonic() + RATE_LIMIT_WAIT_S
+    return all(provider.bucket.acquire(max(0.0, deadline - time.monotonic())) for _ in range(n_requests))
+
+
+def guarded_fetch(provider: Provider, points: Sequence[Tuple[float, float]], timeout: float,
+                  batch_size: int = 1, options: Optional[Dict[str, Any]] = None) -> List[Optional[Dict[str, Any]]]:
+    """
+    Fetch *points* from *provider* through its circuit breaker and rate limiter.
+
+    Returns one forecast per point, or None for every point if the breaker
+    is open, no token came in time or the provider answered HTTP 429 (its
+    bucket is then paused). A call returning no irradiance at all counts
+    as a failure.
+    """
+    if not provider.breaker.allow():
+        provider.metrics.reject(len(points))
+        return [None] * len(points)
+
+    batched = provider.fetch_batch is not None and len(points) > 1
+    n_requests = -(-len(points) // max(1, min(batch_size, provider.max_batch))) if batched else len(points)
+    if not _take_tokens(provider, n_requests):
+        provider.breaker.release()
+        provider.metrics.reject(len(points))
+        return [None] * len(points)
+
+    started = time.monotonic()
+    try:
+        if batched:
+            results = provider.fetch_batch(points, batch_size=batch_size, timeout=timeout)
+        else:
+            results = [provider.fetch(lat, lon, timeout, **(options or {})) for lat, lon in points]
+    except RateLimited as e:
+        pause = provider.bucket.penalize(e.retry_after) if provider.bucket is not None else 0
+        print(f"[Providers] {provider.name} rate limited, paused {pause:.0f}s")
+        provider.breaker.release()
+        provider.metrics.reject(len(points))
+        return [None] * len(points)
+    except Exception as e:
+        print(f"[Providers] {provider.name} → {e}")
+        results = [dict(EMPTY_FORECAST) for _ in points]
+    latency = time.monotonic() - started
+
+    success = any(r.get("irradiance") for r in results)
+    if provider.bucket is not None:
+        provider.bucket.record_ok()
+    provider.breaker.record(success, latency)
+    provider.metrics.record(success, latency, len(points))
+    for r in results:
+        r.setdefault("provider", provider.name)
+    return results
+
+
+def client_providers(client: Dict[str, Any], default: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Provider configuration of a client: list of {"provider", "weight", **options}.
+    Unknown providers are dropped with a warning.
+    """
+    raw = client.get("weather_providers")
+    if isinstance(raw, (str, bytes)):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            print(f"[Providers] Client {client.get('client_id')}: invalid weather_providers, using defaults")
+            raw = None
+    entries = raw or list(default)
+
+    configs = []
+    for entry in entries:
+        config = {"provider": entry} if isinstance(entry, str) else dict(entry)
+        if config.get("provider") not in PROVIDERS:
+            print(f"[Providers] Client {client.get('client_id')}: unknown provider {config.get('provider')!r}")
+            continue
+        configs.append(config)
+    return configs
+
+
+def provider_options(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Options passed to Provider.fetch (the config without its reserved keys)."""
+    return {k: v for k, v in config.items() if k not in ("provider", "weight")}
+
+
+def provider_stats() -> Dict[str, Dict[str, Any]]:
+    """Metrics, breaker state and quota usage of every provider that has been called."""
+    stats = {}
+    for name, provider in PROVIDERS.items():
+        s = provider.metrics.stats()
+        if s["calls"] or s["rejected"]:
+            s["breaker"] = provider.breaker.state
+            if provider.bucket is not None:
+                s["quota"] = provider.bucket.stats()
+            stats[name] = s
+    return stats
+
+
+# --- Built-in providers ------------------------------------------------------
+
+def _openweather(latitude, longitude, timeout, api_key=""):
+    return openweather_api.get_forecast(latitude, longitude, api_key)
+
+
+def _solcast(latitude, longitude, timeout, site_url="", api_key=""):
+    forecast = solcast_standard_api.get_forecast(site_url, api_key)
+    forecast["times"] = [t[:16] for t in forecast["times"]]  # "...T10:30:00.0000000Z" -> UTC minutes
+    forecast["utc_offset_seconds"] = 0
+    return forecast
+
+
+def _custom(latitude, longitude, timeout, **api_config):
+    return get_client_production(api_config)
+
+
+register_provider(Provider(open_meteo.PROVIDER, open_meteo.get_forecast, open_meteo.get_forecast_batch,
+                           shared=True, max_batch=open_meteo.MAX_BATCH))
+register_provider(Provider("openweather", _openweather, shared=False))
+register_provider(Provider("solcast", _solcast, shared=False))
+register_provider(Provider("custom", _custom, shared=False))
@@ -0,0 +1,186 @@
+"""
+pv_model.py
+
+Vectorized PV production model for the whole fleet.
+
+Global horizontal irradiance (GHI) forecasts are turned into AC power per
+client in one pass over (clients x steps) NumPy arrays:
+
+1. solar position (NOAA approximation) for every client and time step;
+2. GHI split into direct and diffuse parts (Erbs correlation);
+3. transposition to the plane of array with the client's tilt and azimuth
+   (isotropic sky, ground reflection);
+4. power = peak power x POA / 1000, corrected for cell temperature and
+   system losses.
+
+Pure NumPy, no network access. Azimuths are in degrees clockwise from
+north (180 = south), tilts in degrees from horizontal.
+"""
+
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from .aggregator import aggregate_fleet, format_times
+
+SOLAR_CONSTANT = 1367.0      # W/m²
+ALBEDO = 0.2
+NOCT = 45.0                  # °C, nominal operating cell temperature
+GAMMA_P = -0.004             # power temperature coefficient, 1/°C
+SYSTEM_LOSSES = 0.14         # inverter, wiring, soiling, mismatch
+DEFAULT_PEAK_POWER_KW = 1.0  # when clients.peak_power_kw is not set
+DEFAULT_TILT = 0.0
+DEFAULT_AZIMUTH = 180.0
+DEFAULT_AIR_TEMPERATURE = 20.0
+MIN_COS_ZENITH = 0.065       # sun below ~86°: all irradiance treated as diffuse
+
+
+def solar_position(times_utc: np.ndarray, latitude: np.ndarray,
+                   longitude: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Solar zenith and azimuth (degrees) for every location and time.
+
+    Args:
+        times_utc: (T,) datetime64 array, UTC.
+        latitude, longitude: (N,) arrays, degrees.
+
+    Returns:
+        (zenith, azimuth): two (N, T) arrays; azimuth clockwise from north.
+    """
+    seconds = np.asarray(times_utc, dtype="datetime64[s]")
+    day_start = seconds.astype("datetime64[D]")
+    year_start = seconds.astype("datetime64[Y]").astype("datetime64[D]")
+    day_of_year = (day_start - year_start).astype(np.int64) + 1
+    minutes = (seconds - day_start).astype(np.int64) / 60.0
+
+    gamma = 2 * np.pi / 365 * (day_of_year - 1 + (minutes / 60 - 12) / 24)
+    eq_time = 229.18 * (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+                        - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma))
+    declination = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma)
+                   - 0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma)
+                   - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+
+    lat = np.radians(np.asarray(latitude, dtype=float))[:, None]
+    lon = np.asarray(longitude, dtype=float)[:, None]
+    true_solar_time = minutes + eq_time + 4 * lon
+    hour_angle = np.radians(true_solar_time / 4 - 180)
+
+    cos_zenith = (np.sin(lat) * np.sin(declination)
+                  + np.cos(lat) * np.cos(declination) * np.cos(hour_angle))
+    zenith = np.degrees(np.arccos(np.clip(cos_zenith, -1, 1)))
+    azimuth = np.degrees(np.arctan2(np.sin(hour_angle),
+                                    np.cos(hour_angle) * np.sin(lat) - np.tan(declination) * np.cos(lat))) + 180
+    return zenith, azimuth % 360
+
+
+def extraterrestrial_irradiance(times_utc: np.ndarray) -> np.ndarray:
+    """Normal irradiance at the top of the atmosphere (W/m²), (T,) array."""
+    days = np.asarray(times_utc, dtype="datetime64[D]")
+    day_of_year = (days - days.astype("datetime64[Y]").astype("datetime64[D]")).astype(np.int64) + 1
+    return SOLAR_CONSTANT * (1 + 0.033 * np.cos(2 * np.pi * day_of_year / 365))
+
+
+def decompose_ghi(ghi: np.ndarray, zenith: np.ndarray, extra: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split GHI into direct normal (DNI) and diffuse horizontal (DHI) irradiance
+    with the Erbs correlation on the clearness index.
+    """
+    cos_zenith = np.cos(np.radians(zenith))
+    day = cos_zenith > MIN_COS_ZENITH
+    with np.errstate(invalid="ignore", divide="ignore"):
+        kt = np.where(day, ghi / (extra * cos_zenith), 0.0)
+    kt = np.clip(kt, 0, 1)
+    kd = np.where(kt <= 0.22, 1 - 0.09 * kt,
+                  np.where(kt <= 0.8,
+                           0.9511 - 0.1604 * kt + 4.388 * kt ** 2 - 16.638 * kt ** 3 + 12.336 * kt ** 4,
+                           0.165))
+    kd = np.where(day, kd, 1.0)
+    dhi = kd * ghi
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dni = np.where(day, (ghi - dhi) / cos_zenith, 0.0)
+    return dni, dhi
+
+
+def plane_of_array(ghi: np.ndarray, zenith: np.ndarray, sun_azimuth: np.ndarray, extra: np.ndarray,
+                   tilt: np.ndarray, azimuth: np.ndarray) -> np.ndarray:
+    """Irradiance on the panel plane (W/m²), isotropic sky model; tilt/azimuth are (N,)."""
+    dni, dhi = decompose_ghi(ghi, zenith, extra)
+    beta = np.radians(np.asarray(tilt, dtype=float))[:, None]
+    panel_azimuth = np.radians(np.asarray(azimuth, dtype=float))[:, None]
+    z = np.radians(zenith)
+    cos_aoi = np.cos(z) * np.cos(beta) + np.sin(z) * np.sin(beta) * np.cos(np.radians(sun_azimuth) - panel_azimuth)
+    beam = dni * np.clip(cos_aoi, 0, None)
+    sky = dhi * (1 + np.cos(beta)) / 2
+    ground = ghi * ALBEDO * (1 - np.cos(beta)) / 2
+    return np.clip(beam + sky + ground, 0, None)
+
+
+def pv_power(poa: np.ndarray, air_temperature: np.ndarray, peak_power_kw: np.ndarray) -> np.ndarray:
+    """AC power (kW) from plane-of-array irradiance, (N, T); peak_power_kw is (N,)."""
+    air = np.where(np.isnan(air_temperature), DEFAULT_AIR_TEMPERATURE, air_temperature)
+    cell_temperature = air + poa * (NOCT - 20) / 800
+    power = (np.asarray(peak_power_kw, dtype=float)[:, None] * poa / 1000
+             * (1 + GAMMA_P * (cell_temperature - 25)) * (1 - SYSTEM_LOSSES))
+    return np.clip(power, 0, None)
+
+
+def _client_column(clients: Sequence[Dict[str, Any]], key: str, default: float) -> np.ndarray:
+    return np.array([default if c.get(key) is None else float(c[key]) for c in clients])
+
+
+def fleet_power(clients: Sequence[Dict[str, Any]], times_utc: np.ndarray,
+                ghi: np.ndarray, air_temperature: np.ndarray) -> np.ndarray:
+    """
+    AC power (kW) of every client at every time step.
+
+    Args:
+        clients: N dicts with latitude, longitude, tilt, azimuth and peak_power_kw
+            (missing orientation: horizontal, facing south; missing peak power:
+            DEFAULT_PEAK_POWER_KW).
+        times_utc: (T,) datetime64 array, UTC.
+        ghi, air_temperature: (N, T) arrays, NaN where missing.
+
+    Returns:
+        (N, T) array, NaN where the irradiance is missing.
+    """
+    zenith, sun_azimuth = solar_position(times_utc,
+                                         _client_column(clients, "latitude", 0.0),
+                                         _client_column(clients, "longitude", 0.0))
+    extra = extraterrestrial_irradiance(times_utc)
+    poa = plane_of_array(ghi, zenith, sun_azimuth, extra,
+                         _client_column(clients, "tilt", DEFAULT_TILT),
+                         _client_column(clients, "azimuth", DEFAULT_AZIMUTH))
+    return pv_power(poa, air_temperature, _client_column(clients, "peak_power_kw", DEFAULT_PEAK_POWER_KW))
+
+
+def fleet_production(clients: Sequence[Dict[str, Any]], forecasts: Mapping[Any, Dict[str, Any]],
+                     step_min: int) -> Dict[Any, List[Tuple[str, float]]]:
+    """
+    previsions_production series of the whole fleet, at step_min resolution.
+
+    Args:
+        clients: rows of get_clients_locations() (client_id, latitude, longitude,
+            tilt, azimuth, peak_power_kw).
+        forecasts: {client_id: aggregated forecast} from the fetch stage.
+        step_min: optimizer time step, in minutes.
+
+    Returns:
+        {client_id: [(local timestamp, kW), ...]}, timestamps in the local time
+        of the client's forecast; steps without irradiance are left out.
+    """
+    by_id = {c["client_id"]: c for c in clients}
+    client_ids = [cid for cid, f in forecasts.items() if cid in by_id and f and f["irradiance"]]
+    if not client_ids:
+        return {}
+
+    fleet = aggregate_fleet({cid: [forecasts[cid]] for cid in client_ids}, step_min)
+    power = fleet_power([by_id[cid] for cid in client_ids], fleet["times_utc"],
+                        fleet["irradiance"], fleet["temperature"])
+    grid = fleet["times_utc"].astype(np.int64)
+
+    production = {}
+    for i, cid in enumerate(client_ids):
+        times = format_times(grid, int(forecasts[cid].get("utc_offset_seconds") or 0))
+        ok = ~np.isnan(power[i])
+        production[cid] = [(times[k], round(float(power[i, k]), 3)) for k in np.flatnonzero(ok)]
+    return production
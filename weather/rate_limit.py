@@ -0,0 +1,105 @@
+"""
+rate_limit.py
+
+Token buckets keeping each weather provider under its request quota.
+
+A bucket refills at ``rate_per_min`` tokens per minute and holds at most
+``burst`` tokens, so calls are spread evenly instead of leaving in a burst.
+Callers block in ``acquire`` until a token is available (or give up after
+``timeout``). When a provider answers HTTP 429 the bucket is paused for
+the provider's Retry-After delay, or for an exponential backoff if none
+is given.
+
+Limits are read from ``rate_limits`` in weather_frequency.txt, e.g.
+``rate_limits = open_meteo:500, solcast:0.5`` (requests per minute).
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+BACKOFF_BASE_S = 5.0
+BACKOFF_MAX_S = 600.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket with a 429 pause."""
+
+    def __init__(self, rate_per_min: float, burst: Optional[float] = None):
+        self.rate_per_min = rate_per_min
+        self.rate = rate_per_min / 60.0
+        self.burst = burst if burst is not None else max(1.0, self.rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.consecutive_429 = 0
+        self.granted = 0
+        self.timeouts = 0
+        self.throttled = 0
+        self.waited_s = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take one token, waiting at most *timeout* seconds; False if none came in time."""
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.granted += 1
+                    self.waited_s += now - started
+                    return True
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate if self.rate > 0 else 1.0)
+                if deadline is not None and now + wait > deadline:
+                    self.timeouts += 1
+                    return False
+            time.sleep(min(wait, 1.0))
+
+    def penalize(self, retry_after_s: Optional[float] = None) -> float:
+        """Pause the bucket after an HTTP 429; returns the pause length in seconds."""
+        with self._lock:
+            self.throttled += 1
+            self.consecutive_429 += 1
+            if retry_after_s is None:
+                retry_after_s = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (self.consecutive_429 - 1))
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after_s)
+            self.tokens = 0.0
+            return retry_after_s
+
+    def record_ok(self) -> None:
+        """Reset the backoff after a call that was not rate limited."""
+        with self._lock:
+            self.consecutive_429 = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit_per_min": self.rate_per_min,
+                "granted": self.granted,
+                "timeouts": self.timeouts,
+                "throttled_429": self.throttled,
+                "waited_s": round(self.waited_s, 1),
+                "paused_s": round(max(0.0, self.paused_until - time.monotonic()), 1),
+            }
+
+
+def parse_rate_limits(value: str) -> Dict[str, float]:
+    """``"open_meteo:500, solcast:0.5"`` -> {"open_meteo": 500.0, "solcast": 0.5}."""
+    limits = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, rate = item.partition(":")
+        try:
+            limits[name.strip()] = float(rate)
+        except ValueError:
+            raise ValueError(f"Malformed rate limit {item!r} (expected provider:requests_per_minute)")
+    return limits
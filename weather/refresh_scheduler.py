@@ -0,0 +1,79 @@
+"""
+refresh_scheduler.py
+
+Spreads the weather refresh of the fleet over the refresh interval.
+
+Instead of refreshing every client at once every ``interval_s``, the main
+loop calls ``RefreshScheduler.select`` every ``tick_s`` seconds and
+refreshes the clients it returns:
+
+- clients whose forecast covers less than ``min_coverage_h`` hours ahead
+  (new clients, repeated failed refreshes) come first: the optimizer would
+  run on them with missing production. A client whose refresh keeps
+  failing (no GPS position, provider down or breaker open) is retried
+  with an exponential backoff, one tick doubled at each failure up to
+  ``max_backoff_s``, so it does not take the rate budget of healthy
+  clients on every tick;
+- then the stalest forecasts, about ``n_clients * tick_s / interval_s``
+  per tick, so that every client is refreshed once per interval with a
+  steady request rate.
+
+Provider quotas are enforced separately by the token buckets of
+rate_limit.py; this module only decides *who* is refreshed *when*.
+"""
+
+import math
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from data.com_bdd import get_client_ids, get_forecast_status
+
+
+class RefreshScheduler:
+    def __init__(self, interval_s: float, tick_s: float = 60, min_coverage_h: float = 12,
+                 max_backoff_s: Optional[float] = None):
+        self.interval_s = interval_s
+        self.tick_s = min(tick_s, interval_s)
+        self.min_coverage = timedelta(hours=min_coverage_h)
+        self.max_backoff_s = max_backoff_s if max_backoff_s is not None else interval_s
+        # client_id -> (failed attempts, earliest retry) while the client stays urgent
+        self._backoff: Dict = {}
+
+    def _retry_allowed(self, client_id, now: datetime) -> bool:
+        """Records an urgent selection; False while the client is backing off."""
+        previous = self._backoff.get(client_id)
+        failures = 0
+        if previous is not None:
+            # Selected before and still urgent: the last refresh did not fix its forecast
+            if now < previous[1]:
+                return False
+            failures = previous[0] + 1
+        delay = 0 if failures == 0 else min(self.max_backoff_s, self.tick_s * 2 ** failures)
+        self._backoff[client_id] = (failures, now + timedelta(seconds=delay))
+        return True
+
+    def select(self, now: Optional[datetime] = None) -> List:
+        """Client ids to refresh at this tick, most urgent first."""
+        now = now or datetime.now()
+        client_ids = get_client_ids() or []
+        status = get_forecast_status()
+
+        urgent, due = [], []
+        for client_id in client_ids:
+            created, until = status.get(client_id, (None, None))
+            if created is None or until is None or until < now + self.min_coverage:
+                if self._retry_allowed(client_id, now):
+                    urgent.append((created or datetime.min, client_id))
+                continue
+            self._backoff.pop(client_id, None)
+            if (now - created).total_seconds() >= self.interval_s / 2:
+                due.append((created, client_id))
+
+        share = math.ceil(len(client_ids) * self.tick_s / self.interval_s)
+        urgent.sort(key=lambda item: item[0])
+        due.sort(key=lambda item: item[0])
+        return [client_id for _, client_id in urgent] + [client_id for _, client_id in due[:max(0, share - len(urgent))]]
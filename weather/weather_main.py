@@ -1,22 +1,192 @@
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 
-from weather.client_weather_processor import process_client_weather
-from data.com_bdd import get_client_ids
+from weather.client_weather_processor import fetch_locations_forecasts, provider_weights, store_client_production
+from weather.aggregator import aggregate_forecasts
+from weather.providers import client_providers, configure_breakers, configure_rate_limits, get_provider, \
+    guarded_fetch, provider_options, provider_stats
+from weather.rate_limit import parse_rate_limits
+from weather.pv_model import fleet_production
+from weather.geo_grid import group_by_cell
+from weather.forecast_cache import ForecastCache
+from data.com_bdd import get_clients_locations
+from config_weather_loader import load_weather_fetch_config
+from optimizer_config_loader import config_optimizer_loader
 
-def main_weather():
-    
-   
-    print("[Main] Starting weather forecast processing...\n")
-    clients = get_client_ids()
-    for client_id in clients:
+BASE_DIR = Path(__file__).resolve().parent.parent
+CONFIG_DIR = BASE_DIR / "config"
+CACHE_DIR = BASE_DIR / "cache" / "forecasts"
+STEP_MINUTES = config_optimizer_loader(CONFIG_DIR)
+
+_forecast_cache = None
+
+
+def get_forecast_cache(config):
+    """Process-wide on-disk forecast cache (created on first use)."""
+    global _forecast_cache
+    if _forecast_cache is None:
+        _forecast_cache = ForecastCache(
+            CACHE_DIR,
+            ttl_s=config["forecast_cache_ttl"],
+            max_bytes=config["forecast_cache_max_mb"] * 1024 * 1024,
+        )
+    return _forecast_cache
+
+
+def fetch_forecasts(clients, max_workers=16, request_timeout=10, deadline=600, grid_cell_m=500,
+                    cache=None, batch_size=50, default_providers=("open_meteo",)):
+    """
+    Fetch stage: query every client's providers in parallel under one deadline.
+
+    Clients are snapped to cells of *grid_cell_m* metres. Shared providers
+    (location only) are fetched once per cell at its center, *batch_size*
+    cells per HTTP call when the provider supports it; the other providers
+    are fetched per client with its options. Each provider has its own pool
+    of *max_workers* threads, so a slow provider cannot hold the workers of
+    the others. Network calls only, no database access; *cache*
+    (ForecastCache) is consulted before each shared provider call. Calls
+    that have not finished when *deadline* (seconds) expires are reported
+    and skipped; clients are aggregated from the sources that did answer.
+
+    Returns {client_id: forecast}.
+    """
+    forecasts = {}
+    cells = group_by_cell(clients, grid_cell_m)
+    if not cells:
+        return forecasts
+
+    n_clients = sum(len(cell["client_ids"]) for cell in cells.values())
+    print(f"[Main] {n_clients} clients in {len(cells)} grid cells "
+          f"(dedup ratio {n_clients / len(cells):.1f}x)")
+
+    by_id = {client["client_id"]: client for client in clients}
+    configs = {cid: client_providers(by_id[cid], default_providers)
+               for cell in cells.values() for cid in cell["client_ids"]}
+
+    pools = {}
+
+    def submit(provider_name, fn, *args):
+        if provider_name not in pools:
+            pools[provider_name] = ThreadPoolExecutor(max_workers=max_workers,
+                                                      thread_name_prefix=f"weather-{provider_name}")
+        return pools[provider_name].submit(fn, *args)
+
+    futures = {}
+    shared = {config["provider"] for cfgs in configs.values() for config in cfgs
+              if get_provider(config["provider"]).shared}
+    for name in shared:
+        provider = get_provider(name)
+        keys = [k for k, cell in cells.items()
+                if any(config["provider"] == name for cid in cell["client_ids"] for config in configs[cid])]
+        size = max(1, min(batch_size, provider.max_batch))
+        for i in range(0, len(keys), size):
+            batch = keys[i:i + size]
+            points = [(cells[k]["latitude"], cells[k]["longitude"]) for k in batch]
+            futures[submit(name, fetch_locations_forecasts, points, request_timeout, cache, size, name)] = (name, batch)
+
+    for cid, cfgs in configs.items():
+        client = by_id[cid]
+        for config in cfgs:
+            provider = get_provider(config["provider"])
+            if not provider.shared:
+                point = [(float(client["latitude"]), float(client["longitude"]))]
+                futures[submit(provider.name, guarded_fetch, provider, point, request_timeout, 1,
+                               provider_options(config))] = (provider.name, cid)
+
+    done, not_done = wait(futures, timeout=deadline)
+    for future in not_done:
+        future.cancel()
+    for pool in pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    shared_results, client_results = {}, {}
+    for future in done:
+        name, target = futures[future]
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"[Main] {name} failed: {e}")
+            continue
+        if isinstance(target, list):
+            for key, forecast in zip(target, results):
+                shared_results[(name, key)] = forecast
+        else:
+            client_results[(name, target)] = results[0]
+
+    for key, cell in cells.items():
+        for cid in cell["client_ids"]:
+            sources = []
+            for config in configs[cid]:
+                name = config["provider"]
+                if get_provider(name).shared:
+                    forecast = shared_results.get((name, key))
+                else:
+                    forecast = client_results.get((name, cid))
+                if forecast:
+                    sources.append(forecast)
+            if sources:
+                forecasts[cid] = aggregate_forecasts(sources, weights=provider_weights(configs[cid]))
+
+    if not_done:
+        late = {}
+        for future in not_done:
+            late[futures[future][0]] = late.get(futures[future][0], 0) + 1
+        print(f"[Main] Fetch deadline ({deadline}s) reached, unfinished calls: {late}")
+    return forecasts
+
+
+def store_production(production):
+    """DB stage: save the production forecasts, one transaction per client."""
+    for client_id, previsions in production.items():
         try:
-            print(f"→ Processing {client_id}")
-            process_client_weather(client_id)
+            store_client_production(client_id, previsions)
         except Exception as e:
-            print(f"[Main] Failed to process {client_id}: {e}")
+            print(f"[Main] Failed to store {client_id}: {e}")
+
+
+def main_weather(client_ids=None, deadline=None):
+    """
+    Refresh the production forecasts of *client_ids* (default: whole fleet).
+    *deadline* overrides fetch_deadline, e.g. to fit a scheduler tick.
+    """
+    print("[Main] Starting weather forecast processing...\n")
+    config = load_weather_fetch_config(CONFIG_DIR)
+    clients = get_clients_locations(client_ids)
+    cache = get_forecast_cache(config) if config["forecast_cache_ttl"] > 0 else None
+    deadline = config["fetch_deadline"] if deadline is None else deadline
+    configure_breakers(config["breaker_failures"], config["breaker_reset_s"], config["slow_call_s"])
+    configure_rate_limits(parse_rate_limits(config["rate_limits"]), max_wait_s=deadline)
+
+    started = time.monotonic()
+    forecasts = fetch_forecasts(
+        clients,
+        max_workers=config["max_workers"],
+        request_timeout=config["request_timeout"],
+        deadline=deadline,
+        grid_cell_m=config["grid_cell_m"],
+        cache=cache,
+        batch_size=config["batch_size"],
+        default_providers=[p.strip() for p in config["default_providers"].split(",") if p.strip()],
+    )
+    fetched = time.monotonic()
+    print(f"[Main] Fetched {len(forecasts)}/{len(clients)} forecasts in {fetched - started:.1f}s")
+    if cache is not None:
+        print(f"[Main] Forecast cache: {cache.stats()}")
+    for name, stats in provider_stats().items():
+        print(f"[Main] Provider {name}: {stats}")
+
+    production = fleet_production(clients, forecasts, STEP_MINUTES)
+    modelled = time.monotonic()
+    print(f"[Main] PV model: {len(production)} clients at {STEP_MINUTES} min in {modelled - fetched:.2f}s")
+
+    store_production(production)
+    print(f"[Main] Stored in {time.monotonic() - modelled:.1f}s")
 
     print("\n[Main] Forecast processing completed.")
 